@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+## @package frame_buffers
+#  Triple buffered cairo surfaces used to pass frames from layout to a rendering plugin. Layout draws into a back buffer
+#  and publishes it, the rendering plugin always copies the last published frame. Buffers are swapped under a short lock,
+#  neither side waits for the other one to finish drawing or copying. acquire and publish are called by one thread only
+#  (layout), take and release by the rendering plugin.
+
+import cairo
+import threading
+import time
+
+
+## Class with cairo surfaces used as frame buffers
+class frame_buffers():
+    ## @var extra
+    # Module name used for logging and prefixing data
+    extra = {'module_name': __qualname__}
+    ## @var BUFFERS
+    # Number of buffers. Three buffers allow layout to draw a frame while the renderer copies another one.
+    BUFFERS = 3
+
+    ## The constructor
+    #  @param self The python object self
+    #  @param similar Surface used to create buffers with cairo.ImageSurface.create_similar
+    #  @param width Width of the buffers
+    #  @param height Height of the buffers
+    #  @param scheduler render_scheduler instance notified after publishing a frame
+    #  @param image_format cairo image format of the buffers, i.e. cairo.FORMAT_RGB16_565. If None buffers are created
+    #  similar to the similar surface with alpha channel.
+    def __init__(self, similar, width, height, scheduler, image_format=None):
+        ## @var width
+        #  Width of the buffers
+        self.width = width
+        ## @var height
+        #  Height of the buffers
+        self.height = height
+        ## @var scheduler
+        #  render_scheduler instance notified after publishing a frame
+        self.scheduler = scheduler
+        ## @var surfaces
+        #  List with buffer surfaces
+        self.surfaces = list()
+        ## @var contexts
+        #  List with cairo contexts of buffer surfaces
+        self.contexts = list()
+        for i in range(self.BUFFERS):
+            if image_format is None:
+                surface = cairo.ImageSurface.create_similar(similar, cairo.CONTENT_COLOR_ALPHA, width, height)
+            else:
+                surface = cairo.ImageSurface(image_format, width, height)
+            ctx = cairo.Context(surface)
+            ctx.set_source_rgba(0.0, 0.0, 0.0, 1.0)
+            ctx.paint()
+            self.surfaces.append(surface)
+            self.contexts.append(ctx)
+        ## @var lock
+        #  Lock protecting buffer indexes and damage lists
+        self.lock = threading.Lock()
+        ## @var back
+        #  Index of the buffer used by layout, None if layout is not drawing
+        self.back = None
+        ## @var latest
+        #  Index of the last published buffer, None if nothing has been published yet
+        self.latest = None
+        ## @var front
+        #  Index of the buffer being copied by the renderer, None if renderer is not copying
+        self.front = None
+        ## @var stale
+        #  For each buffer list with rectangles (x, y, w, h) changed by frames published after the buffer content was drawn.
+        #  None means the whole buffer is out of date.
+        self.stale = [list() for i in range(self.BUFFERS)]
+        ## @var damage
+        #  List with rectangles changed since the renderer took the last frame, None means the whole screen
+        self.damage = None
+        ## @var acquire_time
+        #  Time of the last acquire call
+        self.acquire_time = 0.0
+        ## @var render_times
+        #  For each buffer time in seconds between acquire and publish of the frame in the buffer
+        self.render_times = [0.0] * self.BUFFERS
+
+    ## Adds rectangles to a damage list. None means the whole screen.
+    #  @param self The python object self
+    #  @param damage Damage list
+    #  @param rects List with rectangles or None
+    def merge_damage(self, damage, rects):
+        if damage is None or rects is None:
+            return None
+        return damage + rects
+
+    ## Returns cairo context of a back buffer for drawing a new frame. The buffer content is brought up to date with
+    #  the last published frame, so only changed regions need to be redrawn. Stale regions are copied from the latest
+    #  buffer after releasing the lock, so the renderer isn't blocked by the copy. It's safe, because only publish
+    #  changes the latest buffer and it's called by the same thread after acquire. The renderer only reads the latest
+    #  buffer and acquire never selects it as the back buffer.
+    #  @param self The python object self
+    def acquire(self):
+        with self.lock:
+            if self.back is None:
+                self.back = [i for i in range(self.BUFFERS) if i not in (self.latest, self.front)][0]
+            back = self.back
+            latest = self.latest
+            stale = self.stale[back]
+            self.stale[back] = list()
+            self.acquire_time = time.perf_counter()
+        ctx = self.contexts[back]
+        if latest is not None and latest != back and stale != []:
+            ctx.save()
+            if stale is not None:
+                for r in stale:
+                    ctx.rectangle(*r)
+                ctx.clip()
+            ctx.set_operator(cairo.OPERATOR_SOURCE)
+            ctx.set_source_surface(self.surfaces[latest], 0, 0)
+            ctx.paint()
+            ctx.restore()
+        return ctx
+
+    ## Publishes the back buffer as the latest frame and wakes up the renderer
+    #  @param self The python object self
+    #  @param damage List with rectangles (x, y, w, h) changed in the frame, None means the whole screen
+    def publish(self, damage):
+        with self.lock:
+            if self.back is None:
+                return
+            for i in range(self.BUFFERS):
+                if i != self.back:
+                    self.stale[i] = self.merge_damage(self.stale[i], damage)
+            self.render_times[self.back] = time.perf_counter() - self.acquire_time
+            self.latest = self.back
+            self.back = None
+            self.damage = self.merge_damage(self.damage, damage)
+        self.scheduler.frame_ready()
+
+    ## Marks the whole screen as damaged without a new frame, i.e. after overlay change
+    #  @param self The python object self
+    def invalidate(self):
+        with self.lock:
+            self.damage = None
+        self.scheduler.frame_ready()
+
+    ## Returns surface with the latest frame and list with damaged rectangles since the last call (None means the whole
+    #  screen). The surface is not reused by layout until release is called. Returns (None, []) if there is no frame.
+    #  @param self The python object self
+    def take(self):
+        with self.lock:
+            if self.latest is None:
+                return None, list()
+            self.front = self.latest
+            damage = self.damage
+            self.damage = list()
+        return self.surfaces[self.front], damage
+
+    ## Returns time in seconds spent by layout on drawing the frame returned by take, measured from acquire to publish
+    #  @param self The python object self
+    def get_render_time(self):
+        with self.lock:
+            if self.front is None:
+                return None
+            return self.render_times[self.front]
+
+    ## Releases the surface returned by take
+    #  @param self The python object self
+    def release(self):
+        with self.lock:
+            self.front = None
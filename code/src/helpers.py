@@ -4,6 +4,8 @@
 ## @package helpers
 # Different helper classes used by pyplum and plugins
 
+import datetime
+import functools
 import math
 
 
@@ -32,6 +34,158 @@ class num():
             pass
         return value
 
+    ## Returns value converted to float. Markers of missing values written by sanitise ('-'), empty strings and None
+    #  are converted to not-a-number. Raises ValueError if the value is not a number or a marker.
+    #  @param value Number or string
+    def to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            if value is None or value.strip() in ('-', ''):
+                return num.NAN
+            raise ValueError("Value {} is not a number".format(value))
+
+    ## Returns numpy array of floats from a column of values, i.e. read from a ride log. Values are converted with
+    #  to_float.
+    #  @param values Sequence or numpy array with numbers or strings
+    def to_array(values):
+        import numpy
+        try:
+            # Numbers and strings with numbers only
+            return numpy.array(values, dtype=float)
+        except (TypeError, ValueError):
+            pass
+        return numpy.fromiter(map(num.to_float, values), dtype=float, count=len(values))
+
+    ## Array version of sanitise. Returns numpy array of objects with infinity and not-a-number replaced with '-'.
+    #  @param values Sequence or numpy array with numbers
+    def sanitise_array(values):
+        import numpy
+        values = numpy.asarray(values, dtype=float)
+        sanitised = values.astype(object)
+        sanitised[~numpy.isfinite(values)] = '-'
+        return sanitised
+
+    ## Returns percentile of values using nearest-rank method, not-a-number if values is empty
+    #  @param values List of numbers
+    #  @param fraction Percentile as a fraction, i.e. 0.95 for p95
+    def percentile(values, fraction):
+        if not values:
+            return num.NAN
+        s = sorted(values)
+        i = max(0, min(len(s) - 1, math.ceil(fraction * len(s)) - 1))
+        return s[i]
+
+
+## Value formatter used by layout and data_log. Format string is compiled once to a function. The last formatted
+#  value and the result are remembered, so a value that doesn't change between frames or log entries is not formatted
+#  again. Supported format strings: hhmmss.s, hhmmss, time, date and python % formatting (i.e. %.1f).
+class formatter():
+    ## @var compiled
+    # Dict with format strings as keys and compiled formatting functions as values, shared by all formatters
+    compiled = {}
+
+    ## The constructor
+    #  @param self The python object self
+    #  @param format_string Format string
+    def __init__(self, format_string):
+        ## @var format_string
+        #  Format string
+        self.format_string = format_string
+        ## @var function
+        #  Compiled formatting function
+        self.function = formatter.compile(format_string)
+        ## @var last
+        #  Tuple with the last value, its type and the formatted value
+        self.last = (None, None, None)
+
+    ## Returns formatted value. Values that can't be formatted are returned unchanged, apart from python % formatting
+    #  where they are converted to strings.
+    #  @param self The python object self
+    #  @param value Value to be formatted
+    def __call__(self, value):
+        last_value, last_type, result = self.last
+        # Zero is always formatted, -0.0 == 0.0 but they are formatted differently
+        if value and type(value) is last_type and value == last_value:
+            return result
+        result = self.function(value)
+        self.last = (value, type(value), result)
+        return result
+
+    ## Returns function formatting values with a format string. Functions are compiled once per format string.
+    #  @param format_string Format string
+    def compile(format_string):
+        try:
+            return formatter.compiled[format_string]
+        except KeyError:
+            pass
+        if format_string == "hhmmss.s":
+            function = formatter.format_hhmmss_s
+        elif format_string == "hhmmss":
+            function = formatter.format_hhmmss
+        elif format_string == "time":
+            function = formatter.format_time
+        elif format_string == "date":
+            function = formatter.format_date
+        else:
+            function = functools.partial(formatter.format_printf, format_string)
+        formatter.compiled[format_string] = function
+        return function
+
+    ## Formats time in seconds as hh:mm:ss.s
+    #  @param value Value to be formatted
+    def format_hhmmss_s(value):
+        try:
+            if not math.isfinite(value):
+                # inf, i.e. reset value_min, is returned unchanged, sanitise replaces it with '-'
+                return value
+            minutes, seconds = divmod(value, 60)
+            hours, minutes = divmod(minutes, 60)
+            value = "{:02.0f}:{:02.0f}:{:02.1f}".format(hours, minutes, seconds)
+        except (TypeError, ValueError):
+            pass
+        return value
+
+    ## Formats time in seconds as hh:mm:ss, fractions of seconds are truncated
+    #  @param value Value to be formatted
+    def format_hhmmss(value):
+        try:
+            minutes, seconds = divmod(int(value), 60)
+            hours, minutes = divmod(minutes, 60)
+            value = "{:02.0f}:{:02.0f}:{:02.0f}".format(hours, minutes, seconds)
+        except (TypeError, ValueError, OverflowError):
+            pass
+        return value
+
+    ## Formats timestamp as local time, hh:mm:ss
+    #  @param value Value to be formatted
+    def format_time(value):
+        try:
+            value = datetime.datetime.fromtimestamp(int(value)).strftime('%H:%M:%S')
+        except (TypeError, ValueError, OverflowError):
+            # ValueError: invalid literal for int() with base 10: ''
+            pass
+        return value
+
+    ## Formats timestamp as local date, YYYY-MM-DD
+    #  @param value Value to be formatted
+    def format_date(value):
+        try:
+            value = datetime.datetime.fromtimestamp(int(value)).strftime('%Y-%m-%d')
+        except (TypeError, ValueError, OverflowError):
+            pass
+        return value
+
+    ## Formats number with python % format string, values that are not numbers are converted to strings
+    #  @param format_string Format string
+    #  @param value Value to be formatted
+    def format_printf(format_string, value):
+        try:
+            return format_string % float(value)
+        except (TypeError, ValueError, OverflowError):
+            # OverflowError: integer formats of infinite values
+            return format(value)
+
 
 ##  Class providing scalar version of Kalman filter.
 class kalman():
@@ -73,6 +227,8 @@ class kalman():
             self.K = K
         else:
             self.K = 0.245657137142
+        # P reached steady state, P and K don't change any more. Doesn't depend on measurements.
+        self.steady = False
 
     def set_initial_value(self, value_unfiltered):
         # First estimate
@@ -91,141 +247,349 @@ class kalman():
         z = self.value_unfiltered
         # Save previous value
         self.value_estimate_previous = self.value_estimate
+        if not self.steady:
+            self.update_gain()
+        # Calculate new estimate
+        self.value_estimate = self.value_estimate_previous + self.K * (z - self.value_estimate_previous)
+
+    ## Calculates gain K and error P for the next measurement. Sets steady when P doesn't change any more.
+    #  @param self The python object self
+    def update_gain(self):
+        P = self.P
         # Save previous error
         self.P_previous = self.P + self.Q
         # Calculate current gain
         self.K = self.P_previous / (self.P_previous + self.R)
-        # Calculate new estimate
-        self.value_estimate = self.value_estimate_previous + self.K * (z - self.value_estimate_previous)
         # Calculate new error estimate
         self.P = (1 - self.K) * self.P_previous
+        self.steady = self.P == P
 
-
-## Unit converter class
-#  Allows conversion of a value from a source unit to a target unit.
-class unit_converter():
+    ## Returns list with gains for the next measurements, up to number of samples. The list is shorter if P reaches
+    #  steady state, gain for the remaining measurements is K. Filter state is updated as if update was called for
+    #  all samples.
+    #  @param self The python object self
+    #  @param samples Number of measurements
+    def get_gains(self, samples):
+        gains = list()
+        while not self.steady and len(gains) < samples:
+            self.update_gain()
+            gains.append(self.K)
+        return gains
+
+    ## Batch mode. Filters numpy array (or a sequence) of measurements and returns numpy array with estimates. Results
+    #  are the same as from calling update_unfiltered_value and update for each measurement. Filter state is updated,
+    #  so streaming or batch filtering can be continued.
+    #  @param self The python object self
+    #  @param values Measurements
+    def filter(self, values):
+        import numpy
+        measurements = numpy.asarray(values, dtype=float).tolist()
+        if not measurements:
+            return numpy.empty(0)
+        gains = self.get_gains(len(measurements))
+        estimates = list()
+        append = estimates.append
+        value_estimate = self.value_estimate
+        value_estimate_previous = self.value_estimate_previous
+        for K, z in zip(gains, measurements):
+            value_estimate_previous = value_estimate
+            value_estimate = value_estimate_previous + K * (z - value_estimate_previous)
+            append(value_estimate)
+        # Steady state, constant gain
+        K = self.K
+        for z in measurements[len(gains):]:
+            value_estimate_previous = value_estimate
+            value_estimate = value_estimate_previous + K * (z - value_estimate_previous)
+            append(value_estimate)
+        self.value_unfiltered = measurements[-1]
+        self.value_estimate_previous = value_estimate_previous
+        self.value_estimate = value_estimate
+        return numpy.array(estimates)
+
+
+## Bank of independent scalar Kalman filters, i.e. pressure, heart rate, speed and cadence. Each channel has its own
+#  Q and R. Estimates of all channels are updated with numpy operations, results are the same as from separate
+#  kalman filters. Vectorisation pays off for many channels, i.e. when re-filtering many ride logs at once.
+class kalman_bank():
+    ## @var extra
+    # Module name used for logging and prefixing data
+    extra = {'module_name': __qualname__}
+    ## @var VECTORISE_CHANNELS
+    # Minimal number of channels filtered with numpy operations by filter. Fewer channels are filtered one by one with
+    # kalman.filter, numpy overhead for each sample is bigger than the gain.
+    VECTORISE_CHANNELS = 8
 
     ## The constructor
     #  @param self The python object self
-    def __init__(self):
-        self.distance = {"m": 1.0, "km": 1000.0, "mi": 1609.344, "yd": 0.9144, "ft": 0.3048, "in": 0.0254, "cm": 0.01, "mm": 0.001}
-        self.temperature = {"C", "F"}
-        self.speed = {"m/s": 1.0, "km/h": 0.2777778, "mi/h": 0.44704}
-        self.mass = {"kg": 1.0, "st": 6.350293, "lb": 0.4535924}
-        self.slope = {"%", "m/m"}
-        self.pressure = {"Pa": 1.0, "hPa": 100.0, "kPa": 1000.0, "mmHg": 133.322, "inHg": 3386.375258}
+    #  @param Q Sequence with process noise covariance of each channel
+    #  @param R Sequence with measurement noise covariance of each channel
+    #  @param P Sequence with initial error of each channel, optional
+    #  @param P_previous Sequence with initial previous error of each channel, optional
+    #  @param K Sequence with initial gain of each channel, optional
+    def __init__(self, Q, R, P=None, P_previous=None, K=None):
+        import numpy
+        channels = len(Q)
+        ## @var filters
+        #  List with kalman filters used to calculate gains of each channel
+        self.filters = list()
+        for c in range(channels):
+            self.filters.append(kalman(Q=Q[c], R=R[c],
+                                       P=None if P is None else P[c],
+                                       P_previous=None if P_previous is None else P_previous[c],
+                                       K=None if K is None else K[c]))
+        ## @var value_estimate
+        #  numpy array with the current estimate of each channel
+        self.value_estimate = numpy.full(channels, num.NAN)
+        ## @var value_estimate_previous
+        #  numpy array with the previous estimate of each channel
+        self.value_estimate_previous = numpy.full(channels, num.NAN)
+
+    ## Sets the first estimate of each channel
+    #  @param self The python object self
+    #  @param values_unfiltered Sequence with a measurement for each channel
+    def set_initial_value(self, values_unfiltered):
+        import numpy
+        self.value_estimate = numpy.array(values_unfiltered, dtype=float)
+        self.value_estimate_previous = self.value_estimate.copy()
+        for f, value in zip(self.filters, self.value_estimate.tolist()):
+            f.set_initial_value(value)
+
+    ## Returns numpy array with the current gain of each channel
+    #  @param self The python object self
+    def get_gain(self):
+        import numpy
+        return numpy.array([f.K for f in self.filters])
 
-    ## Main convert function. Returns value in target units
+    ## Filters one measurement of each channel. Returns numpy array with estimates.
+    #  @param self The python object self
+    #  @param values_unfiltered Sequence with a measurement for each channel
+    def update(self, values_unfiltered):
+        import numpy
+        for f in self.filters:
+            if not f.steady:
+                f.update_gain()
+        self.value_estimate_previous = self.value_estimate
+        self.value_estimate = self.value_estimate_previous + self.get_gain() * (numpy.asarray(values_unfiltered, dtype=float) - self.value_estimate_previous)
+        return self.value_estimate
+
+    ## Batch mode. Filters numpy array with measurements, one row per sample and one column per channel. Returns numpy
+    #  array of the same shape with estimates.
+    #  @param self The python object self
+    #  @param values Measurements, shape (samples, channels)
+    def filter(self, values):
+        import numpy
+        values = numpy.asarray(values, dtype=float)
+        samples = len(values)
+        estimates = numpy.empty(values.shape)
+        if samples == 0:
+            return estimates
+        if len(self.filters) < self.VECTORISE_CHANNELS:
+            return self.filter_channels(values)
+        # Gains of all channels until all of them reach steady state
+        channel_gains = [f.get_gains(samples) for f in self.filters]
+        transient = max(len(g) for g in channel_gains)
+        gains = numpy.empty((transient, len(self.filters)))
+        for c, g in enumerate(channel_gains):
+            gains[:len(g), c] = g
+            gains[len(g):, c] = self.filters[c].K
+        value_estimate = self.value_estimate
+        value_estimate_previous = self.value_estimate_previous
+        for i in range(transient):
+            value_estimate_previous = value_estimate
+            value_estimate = value_estimate_previous + gains[i] * (values[i] - value_estimate_previous)
+            estimates[i] = value_estimate
+        K = self.get_gain()
+        for i in range(transient, samples):
+            value_estimate_previous = value_estimate
+            value_estimate = value_estimate_previous + K * (values[i] - value_estimate_previous)
+            estimates[i] = value_estimate
+        self.value_estimate_previous = value_estimate_previous
+        self.value_estimate = value_estimate
+        for f, value in zip(self.filters, values[-1].tolist()):
+            f.update_unfiltered_value(value)
+        return estimates
+
+    ## Filters measurements channel by channel with kalman.filter. Returns numpy array with estimates.
+    #  @param self The python object self
+    #  @param values numpy array with measurements, shape (samples, channels)
+    def filter_channels(self, values):
+        import numpy
+        estimates = numpy.empty(values.shape)
+        for c, f in enumerate(self.filters):
+            f.value_estimate = self.value_estimate[c]
+            f.value_estimate_previous = self.value_estimate_previous[c]
+            estimates[:, c] = f.filter(values[:, c])
+        self.value_estimate = numpy.array([f.value_estimate for f in self.filters])
+        self.value_estimate_previous = numpy.array([f.value_estimate_previous for f in self.filters])
+        return estimates
+
+
+## Conversion from a source unit to a target unit, see unit_converter.get_conversion. Target value is
+#  (value + offset_in) * numerator / denominator + offset_out. Offsets are skipped if they are 0, so results are the same
+#  as from the conversion functions of unit_converter.
+class unit_conversion():
+    __slots__ = ('source_unit', 'target_unit', 'transform', 'convert')
+
+    ## The constructor
     #  @param self The python object self
-    #  @param value value in source units
     #  @param source_unit source unit
     #  @param target_unit target unit
-    def convert(self, value, source_unit, target_unit):
+    #  @param transform Tuple (offset_in, numerator, denominator, offset_out), None for identity or if the units can't be
+    #  converted
+    def __init__(self, source_unit, target_unit, transform):
+        self.source_unit = source_unit
+        self.target_unit = target_unit
+        self.transform = transform
+        ## @var convert
+        #  Function converting a single value, selected for the transform
         if source_unit == target_unit:
-            return value
+            self.convert = self.convert_identity
+        elif transform is None:
+            self.convert = self.convert_none
+        elif transform[0] == 0.0 and transform[3] == 0.0:
+            self.convert = self.convert_scale
+        else:
+            self.convert = self.convert_affine
+
+    ## Returns value unchanged, source and target units are the same
+    #  @param self The python object self
+    #  @param value value in source units
+    def convert_identity(self, value):
+        return value
+
+    ## Returns None, units can't be converted
+    #  @param self The python object self
+    #  @param value value in source units
+    def convert_none(self, value):
+        return None
+
+    ## Returns value in target units, conversion without offsets
+    #  @param self The python object self
+    #  @param value value in source units
+    def convert_scale(self, value):
         if value is None:
             return value
-        if source_unit is None or target_unit is None:
-            return None
         try:
-            value = float(value)
+            return float(value) * self.transform[1] / self.transform[2]
         except TypeError:
-            print("Can't convert value: {} to float".format(value))
-        if ((source_unit in self.distance) and (target_unit in self.distance)):
-            return self.convert_distance(value, source_unit, target_unit)
-        if ((source_unit in self.temperature) and (target_unit in self.temperature)):
-            return self.convert_temperature(value, source_unit, target_unit)
-        if ((source_unit in self.speed) and (target_unit in self.speed)):
-            return self.convert_speed(value, source_unit, target_unit)
-        if ((source_unit in self.mass) and (target_unit in self.mass)):
-            return self.convert_mass(value, source_unit, target_unit)
-        if ((source_unit in self.slope) and (target_unit in self.slope)):
-            return self.convert_slope(value, source_unit, target_unit)
-        if ((source_unit in self.pressure) and (target_unit in self.pressure)):
-            return self.convert_pressure(value, source_unit, target_unit)
-
-    def convert_distance(self, value, source_unit, target_unit):
-        result = num.NAN
+            return num.NAN
+
+    ## Returns value in target units
+    #  @param self The python object self
+    #  @param value value in source units
+    def convert_affine(self, value):
+        if value is None:
+            return value
+        offset_in, numerator, denominator, offset_out = self.transform
         try:
-            result = value * self.distance[source_unit] / self.distance[target_unit]
+            value = float(value)
         except TypeError:
-            print("Failed to convert distance value {}, source unit: {}, target_unit: {}".format(value, source_unit, target_unit))
-        return result
+            return num.NAN
+        if offset_in != 0.0:
+            value = value + offset_in
+        value = value * numerator / denominator
+        if offset_out != 0.0:
+            value = value + offset_out
+        return value
 
-    ## Temperature conversion
+    ## Returns numpy array with a whole column of values converted to target units. Missing values (None) are
+    #  converted to not-a-number.
+    #  @param self The python object self
+    #  @param values Sequence or numpy array with numbers
+    def convert_column(self, values):
+        import numpy
+        values = numpy.array(values, dtype=float)
+        if self.source_unit == self.target_unit:
+            return values
+        if self.transform is None:
+            values.fill(num.NAN)
+            return values
+        offset_in, numerator, denominator, offset_out = self.transform
+        if offset_in != 0.0:
+            values += offset_in
+        values *= numerator
+        values /= denominator
+        if offset_out != 0.0:
+            values += offset_out
+        return values
+
+
+## Unit converter class
+#  Allows conversion of a value from a source unit to a target unit.
+class unit_converter():
+
+    ## The constructor
+    #  @param self The python object self
+    def __init__(self):
+        self.distance = {"m": 1.0, "km": 1000.0, "mi": 1609.344, "yd": 0.9144, "ft": 0.3048, "in": 0.0254, "cm": 0.01, "mm": 0.001}
+        self.temperature = {"C", "F"}
+        self.speed = {"m/s": 1.0, "km/h": 0.2777778, "mi/h": 0.44704}
+        self.mass = {"kg": 1.0, "st": 6.350293, "lb": 0.4535924}
+        self.slope = {"%", "m/m"}
+        self.pressure = {"Pa": 1.0, "hPa": 100.0, "kPa": 1000.0, "mmHg": 133.322, "inHg": 3386.375258}
+        ## @var transforms
+        #  Dict with tuples (source_unit, target_unit) as keys and transforms (offset_in, numerator, denominator,
+        #  offset_out) as values, see unit_conversion
+        self.transforms = dict()
+        for units in (self.distance, self.speed, self.mass, self.pressure):
+            for source_unit, source_factor in units.items():
+                for target_unit, target_factor in units.items():
+                    self.transforms[(source_unit, target_unit)] = (0.0, source_factor, target_factor, 0.0)
+        self.transforms[("C", "F")] = (0.0, 1.8, 1.0, 32.0)
+        self.transforms[("F", "C")] = (-32.0, 1.0, 1.8, 0.0)
+        self.transforms[("m/m", "%")] = (0.0, 100.0, 1.0, 0.0)
+        self.transforms[("%", "m/m")] = (0.0, 0.01, 1.0, 0.0)
+        ## @var conversions
+        #  Dict with tuples (source_unit, target_unit) as keys and unit_conversion instances as values, filled by
+        #  get_conversion
+        self.conversions = dict()
+
+    ## Returns unit_conversion from source to target units. Conversions are created once for each pair of units.
     #  @param self The python object self
-    #  @param value value in source units
     #  @param source_unit source unit
     #  @param target_unit target unit
-    def convert_temperature(self, value, source_unit, target_unit):
-        result = num.NAN
+    def get_conversion(self, source_unit, target_unit):
+        key = (source_unit, target_unit)
         try:
-            if source_unit == target_unit:
-                result = value
-            elif target_unit == "C":
-                result = (value - 32) / 1.8
-            elif target_unit == "F":
-                result = (value * 1.8) + 32
-        except TypeError:
-            print("Failed to convert temperature value {}, source unit: {}, target_unit: {}".format(value, source_unit, target_unit))
-        return result
+            return self.conversions[key]
+        except KeyError:
+            pass
+        conversion = unit_conversion(source_unit, target_unit, self.transforms.get(key))
+        self.conversions[key] = conversion
+        return conversion
 
-    ## Speed conversion
+    ## Returns function converting a value from source to target units, i.e. to be cached by a layout field
     #  @param self The python object self
-    #  @param value value in source units
     #  @param source_unit source unit
     #  @param target_unit target unit
-    def convert_speed(self, value, source_unit, target_unit):
-        result = num.NAN
-        try:
-            result = value * self.speed[source_unit] / self.speed[target_unit]
-        except TypeError:
-            print("Failed to convert speed value {}, source unit: {}, target_unit: {}".format(value, source_unit, target_unit))
-        return result
+    def get_converter(self, source_unit, target_unit):
+        return self.get_conversion(source_unit, target_unit).convert
 
-    ## Mass conversion
+    ## Main convert function. Returns value in target units
     #  @param self The python object self
     #  @param value value in source units
     #  @param source_unit source unit
     #  @param target_unit target unit
-    def convert_mass(self, value, source_unit, target_unit):
-        result = num.NAN
-        try:
-            result = value * self.mass[source_unit] / self.mass[target_unit]
-        except TypeError:
-            print("Failed to convert mass value {}, source unit: {}, target_unit: {}".format(value, source_unit, target_unit))
-        return result
+    def convert(self, value, source_unit, target_unit):
+        return self.get_conversion(source_unit, target_unit).convert(value)
 
-    ## Slope conversion
+    ## Returns numpy array with a whole column of values converted from source to target units
     #  @param self The python object self
-    #  @param value value in source units
+    #  @param values Sequence or numpy array with numbers
     #  @param source_unit source unit
     #  @param target_unit target unit
-    def convert_slope(self, value, source_unit, target_unit):
-        result = num.NAN
-        try:
-            if source_unit == target_unit:
-                result = value
-            elif target_unit == "%":
-                result = 100 * value
-            elif target_unit == "m/m":
-                result = 0.01 * value
-        except TypeError:
-            print("Failed to convert slope value {}, source unit: {}, target_unit: {}".format(value, source_unit, target_unit))
-        return result
+    def convert_column(self, values, source_unit, target_unit):
+        return self.get_conversion(source_unit, target_unit).convert_column(values)
 
-    ## Pressure conversion
+    ## Batch conversion for post-processing of ride logs. Returns numpy array of floats with values converted from
+    #  source to target units. Values can be numbers or strings, missing values ('-', see num.sanitise) are returned
+    #  as not-a-number. Use num.sanitise_array to get the markers back.
     #  @param self The python object self
-    #  @param value value in source units
+    #  @param values Sequence or numpy array with numbers or strings
     #  @param source_unit source unit
     #  @param target_unit target unit
-    def convert_pressure(self, value, source_unit, target_unit):
-        result = num.NAN
-        try:
-            result = value * self.pressure[source_unit] / self.pressure[target_unit]
-        except TypeError:
-            print("Failed to convert mass value {}, source unit: {}, target_unit: {}".format(value, source_unit, target_unit))
-        return result
+    def convert_array(self, values, source_unit, target_unit):
+        return self.convert_column(num.to_array(values), source_unit, target_unit)
 
 
 if __name__ == '__main__':
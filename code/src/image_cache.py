@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+## @package image_cache
+#  LRU cache for decoded images (cairo surfaces) with a memory budget. Images used by the current page can be pinned,
+#  they are never evicted. Memory used by an image is calculated as stride * height of the surface.
+
+import collections
+import logging
+import threading
+
+
+## Class with LRU cache for decoded images
+class image_cache():
+    ## @var extra
+    # Module name used for logging and prefixing data
+    extra = {'module_name': __qualname__}
+    ## @var BUDGET
+    # Default maximum size of cached images in bytes
+    BUDGET = 16 * 1024 * 1024
+
+    ## The constructor
+    #  @param self The python object self
+    #  @param budget Maximum size of cached images in bytes. Pinned images are kept even if the budget is exceeded.
+    def __init__(self, budget=BUDGET):
+        ## @var log
+        # System logger handle
+        self.log = logging.getLogger('system')
+        ## @var budget
+        #  Maximum size of cached images in bytes
+        self.budget = budget
+        ## @var images
+        #  Ordered dict with image paths as keys and tuples (image, size in bytes) as values. The least recently used
+        #  image is the first one.
+        self.images = collections.OrderedDict()
+        ## @var pinned
+        #  Set with paths of images that can't be evicted
+        self.pinned = frozenset()
+        ## @var size
+        #  Size of cached images in bytes
+        self.size = 0
+        ## @var hits
+        #  Number of images found in the cache
+        self.hits = 0
+        ## @var misses
+        #  Number of images loaded by get
+        self.misses = 0
+        ## @var evictions
+        #  Number of images removed from the cache to stay within the budget
+        self.evictions = 0
+        ## @var lock
+        #  Lock protecting the cache, images are loaded by layout and layout_loader prefetch threads
+        self.lock = threading.RLock()
+
+    ## Returns memory used by an image in bytes
+    #  @param self The python object self
+    #  @param image cairo.ImageSurface, tuple with cairo.ImageSurface frames of a sprite sheet or None
+    def get_image_size(self, image):
+        if type(image) is tuple:
+            return sum(self.get_image_size(frame) for frame in image)
+        try:
+            return image.get_stride() * image.get_height()
+        except AttributeError:
+            # Image not loaded
+            return 0
+
+    ## Returns cached image or image loaded with loader. Failed loads (None) are cached as well, so broken images are
+    #  not loaded again on each frame.
+    #  @param self The python object self
+    #  @param image_path Image path
+    #  @param loader Function loading image, called with image_path as the only argument
+    #  @param cold If True the image is added as the least recently used one and is the first one to be evicted,
+    #  i.e. overlay images shown only once
+    def get(self, image_path, loader, cold=False):
+        with self.lock:
+            try:
+                image, size = self.images[image_path]
+                self.images.move_to_end(image_path, last=not cold)
+                self.hits += 1
+                return image
+            except KeyError:
+                pass
+            image = loader(image_path)
+            size = self.get_image_size(image)
+            self.misses += 1
+            self.images[image_path] = (image, size)
+            self.size += size
+            if cold:
+                self.images.move_to_end(image_path, last=False)
+            self.evict(image_path)
+            return image
+
+    ## Removes least recently used images that are not pinned until the cache is within the budget
+    #  @param self The python object self
+    #  @param keep Path of an image that can't be removed, i.e. the one just loaded
+    def evict(self, keep=None):
+        with self.lock:
+            if self.size <= self.budget:
+                return
+            for image_path in list(self.images):
+                if self.size <= self.budget:
+                    break
+                if image_path in self.pinned or image_path == keep:
+                    continue
+                image, size = self.images.pop(image_path)
+                self.size -= size
+                self.evictions += 1
+                self.log.debug("Image {} evicted, {} bytes freed".format(image_path, size), extra=self.extra)
+
+    ## Sets images that can't be evicted, i.e. images used by the current page. Previously pinned images can be evicted.
+    #  @param self The python object self
+    #  @param image_paths Iterable with image paths
+    def pin(self, image_paths):
+        with self.lock:
+            self.pinned = frozenset(image_paths)
+            self.evict()
+
+    ## Removes all images from the cache. Statistics are not reset.
+    #  @param self The python object self
+    def clear(self):
+        with self.lock:
+            self.images.clear()
+            self.size = 0
+
+    ## Checks if an image is cached
+    #  @param self The python object self
+    #  @param image_path Image path
+    def __contains__(self, image_path):
+        return image_path in self.images
+
+    ## Returns dict with cache statistics: number of images, size in bytes, budget, hits, misses and evictions
+    #  @param self The python object self
+    def get_stats(self):
+        with self.lock:
+            return dict(images=len(self.images), size=self.size, budget=self.budget, pinned=len(self.pinned),
+                        hits=self.hits, misses=self.misses, evictions=self.evictions)
@@ -4,7 +4,7 @@
 #   Module responsible for rendering layouts. Needs heavy cleaning...
 
 import cairo
-import datetime
+import collections
 import logging
 import math
 import queue
@@ -15,6 +15,7 @@ from helpers import num
 import helpers
 import layout_loader
 import pyplum
+import startup_profiler
 
 
 ## Class for handling layouts
@@ -29,8 +30,18 @@ class layout(threading.Thread):
     ## @var DEFAULT_OVERLAY_TIME
     # Default time of overlay visibility
     DEFAULT_OVERLAY_TIME = 3.0
-
-    def __init__(self):
+    ## @var DAMAGE_MARGIN
+    # Margin in pixels added to field bounding boxes, covers antialiasing
+    DAMAGE_MARGIN = 2
+    ## @var TEXT_EXTENTS_CACHE_SIZE
+    # Maximum number of entries in the text extents cache
+    TEXT_EXTENTS_CACHE_SIZE = 1024
+
+    ## The constructor
+    #  @param self The python object self
+    #  @param start_thread If False the event loop thread is not started and frames are rendered only by direct
+    #  refresh_display calls, i.e. in benchmarks
+    def __init__(self, start_thread=True):
         super().__init__()
         ## @var log
         # System logger handle
@@ -41,15 +52,24 @@ class layout(threading.Thread):
         ## @var pm
         #  PYthon PLUgin Manager instance
         self.pm = pyplum.pyplum()
+        ## @var profiler
+        #  Startup profiler instance
+        self.profiler = startup_profiler.startup_profiler()
         ## @var width
         #  Window/screen width
         self.width = self.pm.parameters['display_size']["value"][0]
         ## @var height
         #  Window/screen height
         self.height = self.pm.parameters['display_size']["value"][1]
+        ## @var buffers
+        #  Handle to frame_buffers registered by the rendering plugin
+        self.buffers = self.pm.render['buffers']
         ## @var ctx
-        #  Handle to cairo context
-        self.ctx = self.pm.render['ctx']
+        #  Handle to cairo context of the back buffer, valid while a frame is being drawn
+        self.ctx = None
+        ## @var damage
+        #  List with rectangles (x, y, w, h) changed in the frame being drawn, None means the whole screen
+        self.damage = list()
         ## @var octx
         #  Handle to cairo context overlay
         self.octx = self.pm.overlay['ctx']
@@ -67,24 +87,60 @@ class layout(threading.Thread):
         ## @var page
         #  Current page provided by layout_loader
         self.page = None
+        ## @var frame
+        #  Snapshot of parameters used to render the current frame, see pyplum.snapshot
+        self.frame = dict()
+        ## @var full_redraw
+        #  If True the next frame repaints the whole screen, otherwise only fields with changed content are repainted
+        self.full_redraw = True
+        ## @var field_states
+        #  Dict with state and bounding box of fields rendered in the previous frame, see get_field_state
+        self.field_states = dict()
+        ## @var field_rect
+        #  Bounding box of the field being rendered
+        self.field_rect = None
+        ## @var static_layer
+        #  Surface with background and static fields of the current page, see render_static_layer
+        self.static_layer = None
+        ## @var static_layer_key
+        #  States of fields painted on static_layer, None if the layer has to be painted again
+        self.static_layer_key = None
+        ## @var font_size
+        #  Font size set in the current cairo context, see set_font_size
+        self.font_size = None
+        ## @var text_extents_cache
+        #  LRU cache with (font face, font size, text) as keys and cairo text extents as values
+        self.text_extents_cache = collections.OrderedDict()
+        ## @var text_extents_hits
+        #  Number of text extents found in the cache
+        self.text_extents_hits = 0
+        ## @var text_extents_misses
+        #  Number of text extents measured with cairo
+        self.text_extents_misses = 0
+        ## @var measure_only
+        #  If True fields are not painted, only their bounding boxes are calculated
+        self.measure_only = False
         ## @var ll
         #  Layout loader instance
         self.ll = layout_loader.layout_loader()
-        ## @var pages
-        #  Copy of all pages loaded by layout_loader
-        self.pages = self.ll.pages.copy()
         self.use_page()
         ## @var schedule_display_refresh
         #  Control variable of the display refresh event. Set to True to stop calling generate_refresh_event
         self.schedule_display_refresh = True
-        self.start()
+        if start_thread:
+            self.start()
         #FIXME timer and layout module are unstoppable ;-) to be fixed
 
     def use_page(self, page_id="page_0"):
         self.log.debug("switching to page {}".format(page_id), extra=self.extra)
-        self.pm.render['refresh'] = True
+        self.full_redraw = True
+        self.static_layer_key = None
         try:
-            self.page = self.pages[page_id]
+            self.page = self.ll.get_page(page_id)
+            # Load pages that can be reached from this page in background and keep their images in the image cache
+            neighbours = [self.page.get(direction) for direction in ('left', 'right', 'up', 'down')]
+            self.ll.pin_pages([page_id] + neighbours)
+            self.ll.prefetch_pages(neighbours)
         except KeyError:
             if page_id == 'page_0':
                 self.log.critical("Cannot load default page_0. Quitting.".format(page_id), extra=self.extra)
@@ -120,11 +176,11 @@ class layout(threading.Thread):
                 if ev_type == 'show_main_page':
                     self.use_main_page()
                 if ev_type == 'reload_layout':
-                    self.ll.load_layout()
+                    self.ll.load_layout_from_location()
                     self.use_page()
                 if ev_type == 'preload_image':
                     image_file = event[1]
-                    self.ll.load_image(image_file)
+                    self.ll.get_image(image_file)
                 if ev_type == 'open_editor':
                     self.editor_fields = event[1]
                     self.open_editor()
@@ -145,6 +201,9 @@ class layout(threading.Thread):
                         self.timer = threading.Timer(self.DISPLAY_REFRESH, self.generate_refresh_event)
                         self.timer.start()
                 if ev_type == 'quit':
+                    self.ll.flush_layout_cache()
+                    self.log.debug("Text extents cache stats: {}".format(self.get_text_extents_stats()), extra=self.extra)
+                    self.log.debug("Image cache stats: {}".format(self.ll.images.get_stats()), extra=self.extra)
                     self.schedule_display_refresh = False
                     self.running = False
             except queue.Empty:
@@ -155,18 +214,30 @@ class layout(threading.Thread):
             except IndexError:
                 self.log.critical("Invalid event: {}".format(event), extra=self.extra)
 
+    ## Draws the current page into a back buffer and publishes it to the rendering plugin. The back buffer is kept
+    #  for the next frame if nothing has changed.
+    #  @param self The python object self
     def refresh_display(self):
-        # Check if cairo context has changed
-        if self.ctx != self.pm.render['ctx']:
-            self.ctx = self.pm.render['ctx']
-        if not self.font_face_set and self.ctx is not None:
-            self.ctx.set_font_face(self.ll.font_face)
+        # Check if frame buffers have changed
+        if self.buffers != self.pm.render['buffers']:
+            self.buffers = self.pm.render['buffers']
+            self.full_redraw = True
+            self.static_layer = None
+            self.static_layer_key = None
+        if self.buffers is None:
+            return
+        self.ctx = self.buffers.acquire()
+        # Each buffer has its own context, font face has to be set on all of them
+        self.ctx.set_font_face(self.ll.font_face)
+        self.font_size = None
+        if not self.font_face_set:
             self.font_face_set = True
             self.font_extents = self.ctx.font_extents()
-        if not self.pm.render['hold'] and self.ctx is not None:
-            self.pm.render['hold'] = True
+        self.damage = list()
+        with self.profiler.span("render page", 'rendering'):
             self.render_page()
-            self.pm.render['hold'] = False
+        if self.damage != []:
+            self.buffers.publish(self.damage)
 
     def use_main_page(self):
         self.use_page()
@@ -177,157 +248,240 @@ class layout(threading.Thread):
             g = self.page['background_colour'][1]
             b = self.page['background_colour'][2]
             self.ctx.set_source_rgb(r, g, b)
-        if self.page['background_image'] is not None:
-            self.ctx.set_source_surface(self.page['background_image'], 0, 0)
+        if self.page['background_image_file'] is not None:
+            background_image = self.ll.get_image(self.page['background_image_file'])
+            if background_image is not None:
+                self.ctx.set_source_surface(background_image, 0, 0)
         self.ctx.rectangle(0, 0, self.width, self.height)
         self.ctx.fill()
 
+    ## Renders the current page. Each frame starts from the static layer, only fields showing parameter values are
+    #  drawn. If a full redraw is not required only fields with changed content are repainted and the damaged
+    #  rectangles are collected in self.damage.
+    #  @param self The python object self
     def render_page(self):
-        self.render_background()
         # LAYOUT DEBUG FUNCION
         #self.render_all_buttons()
-        if self.page['fields'] is not None:
-            self.render_layout()
-        self.pm.render['refresh'] = True
-
-    def get_value(self, parameter, vtype):
-        v = self.pm.parameters[parameter][vtype]
-        ru = self.pm.parameters[parameter]["raw_unit"]
-        u = self.pm.parameters[parameter]["unit"]
-        value = self.uc.convert(v, ru, u)
-        self.value = num.sanitise(value)
-
-    def render_layout(self):
-        for meta_name, field in self.page['fields'].items():
-            self.value = None
-            parameter = field['parameter']
-            self.pos_x, self.pos_y = field['origin']
-            # Get "show" field and get parameter value using it
-            try:
-                show = field["show"]
-            except KeyError:
-                # Show value of parameter by default
-                show = "value"
-            self.get_parameter_value(show, parameter)
-            # Try to use field 'text' if there is no value determined so far
-            if self.value is None:
-                try:
-                    self.value = field['text']
-                except KeyError:
-                    self.value = ""
-            # Get format field and format parameter using it
-            try:
-                format_field = field['format']
-            except KeyError:
-                format_field = None
-            self.value, format_string = self.ll.format_parameter(format_field, parameter, self.value)
-
-            variable = None
-            # Get icon image
-            try:
-                image_path = field['file']
-            except KeyError:
-                image_path = None
-            # Get icon image for parameter current value
-            try:
-                variable = field['variable']
-                p = variable["name"]
-                # Get current value of the parameter
-                v = self.pm.parameters[p]["value"]
-                # Get number of frames
-                frames = field['variable']['frames']
-                if v > frames:
-                    self.log.error("Variable {} value {} is greater than number of frames ({}) for image file {}".format(p, v, frames, image_path), extra=self.extra)
-                    v = frames
-                image_path = self.make_image_key(image_path, v)
-            except (KeyError, TypeError):
-                pass
-            if image_path is not None and image_path not in self.ll.images:
-                self.ll.images[image_path] = self.ll.load_image(image_path)
-            try:
-                image = self.ll.images[image_path]
-                self.image_to_surface(image, self.pos_x, self.pos_y)
-            except KeyError:
-                pass
-            # Get font size or if it's not defined fall back to the page font size
-            try:
-                self.fs = field['font_size']
-            except KeyError:
-                # Fall back to page font size
-                self.fs = self.page['font_size']
-            self.ctx.set_font_size(self.fs)
-
-            # Get text alignment or if it's not defined use center
-            try:
-                align = field["align"]
-            except KeyError:
-                align = "center"
-            shift_x = self.calculate_x_shift(align, self.value)
-
-            try:
-                self.text_colour = field["text_colour"]
-            except KeyError:
-                self.text_colour = self.page['text_colour']
-
-            # 18 is font size for which font_extents has height. So far no scaled_font_extents function
-            self.shift_y = 0.5 * self.font_extents[2] * self.fs / 18
-            if align == 'point':
-                self.render_point_aligned_text()
-            elif format_string == "zoomed_digit":
-                self.scale = 1.4
-                self.render_zoomed_digit_text()
-            else:
-                self.text_to_surface(self.value, self.pos_x + shift_x, self.pos_y + self.shift_y, self.text_colour)
-
-    def get_parameter_value(self, show, parameter):
-        if show == "value":
-            # For editors use parameter value from editor_fields
-            if self.page["type"] == "editor":
-                try:
-                    self.value = self.editor_fields[parameter]
-                    if type(self.value) is tuple:
-                        self.value = self.value[0]
-                except (KeyError, TypeError):
-                    self.value = None
+        # All fields are rendered using values from the same moment
+        self.frame = self.pm.snapshot()
+        static_fields, dynamic_fields = self.get_field_states()
+        static_layer_key = tuple(static_fields.items())
+        if self.static_layer is None or static_layer_key != self.static_layer_key:
+            self.render_static_layer(static_fields)
+            self.static_layer_key = static_layer_key
+            self.full_redraw = True
+        # Editors are always fully redrawn, the edited value is not a part of field state
+        if self.full_redraw or self.page['type'] == 'editor':
+            self.full_redraw = False
+            self.field_states = dict()
+            self.paint_static_layer()
+            self.render_layout(dynamic_fields)
+            self.add_damage(None)
+        else:
+            self.render_layout_damage(dynamic_fields)
+
+    ## Returns two dicts with meta names of fields as keys and field states (see get_field_state) as values. The first one
+    #  contains static fields, that don't show parameter values: labels, icons and units. The second one contains all
+    #  other fields. Fields of editors are never static, they show values from editor_fields.
+    #  @param self The python object self
+    def get_field_states(self):
+        static_fields = collections.OrderedDict()
+        dynamic_fields = collections.OrderedDict()
+        editor = self.page['type'] == 'editor'
+        for meta_name, op in self.page['ops'].items():
+            state = self.get_field_state(op)
+            if not editor and op.variable_name is None and \
+                    (op.show == 'unit' or op.parameter not in self.frame):
+                static_fields[meta_name] = state
             else:
-                try:
-                    self.get_value(parameter, 'value')
-                except (KeyError, TypeError):
-                    self.value = None
-        elif show == "date":
-            try:
-                self.get_value(parameter, 'value')
-                self.value = datetime.datetime.fromtimestamp(int(self.value)).strftime('%Y-%m-%d')
-            except (ValueError, TypeError):
-                pass
-        elif show == "time":
-            try:
-                self.get_value(parameter, 'value')
-                self.value = datetime.datetime.fromtimestamp(int(self.value)).strftime('%H:%M:%S')
-            except (TypeError, ValueError):
-                # ValueError: invalid literal for int() with base 10: ''
-                pass
-        elif show == "tenths":
-            try:
-                self.get_value(parameter, 'value')
-                tenths_string = "{}".format(self.value - int(self.value))
-                self.value = format(tenths_string)[2:3]
-            except (KeyError, TypeError, ValueError):
-                self.value = None
-        elif show == "unit":
-            try:
-                self.value = self.pm.parameters[parameter]["unit"]
-            except KeyError:
-                self.value = None
-        elif show in ('min', 'avg', 'max'):
+                dynamic_fields[meta_name] = state
+        return static_fields, dynamic_fields
+
+    ## Paints background and static fields of the current page on static_layer. The layer is painted again after page
+    #  switch, layout reload or a change of any static field, i.e. unit change.
+    #  @param self The python object self
+    #  @param static_fields Dict with states of static fields, see get_field_states
+    def render_static_layer(self, static_fields):
+        with self.profiler.span("render static layer", 'rendering'):
+            if self.static_layer is None:
+                self.static_layer = cairo.ImageSurface.create_similar(self.ctx.get_target(), cairo.CONTENT_COLOR_ALPHA, self.width, self.height)
+            ctx = self.ctx
+            font_size = self.font_size
+            self.ctx = cairo.Context(self.static_layer)
+            self.ctx.set_font_face(self.ll.font_face)
+            self.font_size = None
+            self.render_background()
+            for meta_name, state in static_fields.items():
+                self.render_field(self.page['ops'][meta_name], state)
+            self.ctx = ctx
+            self.font_size = font_size
+
+    ## Copies static_layer to the current context, respecting the current clip
+    #  @param self The python object self
+    def paint_static_layer(self):
+        self.ctx.save()
+        self.ctx.set_operator(cairo.OPERATOR_SOURCE)
+        self.ctx.set_source_surface(self.static_layer, 0, 0)
+        self.ctx.paint()
+        self.ctx.restore()
+
+    ## Adds damaged rectangle to the frame being drawn. The list is passed to frame_buffers.publish at the end of
+    #  the frame. None means the whole screen is damaged.
+    #  @param self The python object self
+    #  @param rect Damaged rectangle (x, y, w, h) or None
+    def add_damage(self, rect):
+        if rect is None:
+            self.damage = None
+        elif self.damage is not None:
+            self.damage.append(rect)
+
+    ## Returns tuple describing rendered output of a field: text, image, font size, alignment, colour and format.
+    #  The field is repainted only if the state is different from the state of the previous frame.
+    #  @param self The python object self
+    #  @param op Compiled field (layout_loader.render_op) from the current page
+    def get_field_state(self, op):
+        value = op.get_value(self.frame, self.editor_fields)
+        if value is None:
+            # Use field 'text' if there is no value
+            value = op.text
+        value, format_string = op.format_value(value, self.frame)
+        return (value, op.get_image_key(self.frame), op.font_size, op.align, op.text_colour, format_string)
+
+    ## Draws a field with given state. Returns bounding box (x, y, w, h) of the painted area or None if nothing was painted.
+    #  With measure_only set nothing is painted, only the bounding box is calculated.
+    #  @param self The python object self
+    #  @param op Compiled field (layout_loader.render_op) from the current page
+    #  @param state Field state returned by get_field_state
+    def render_field(self, op, state):
+        self.value, image_path, self.fs, align, self.text_colour, format_string = state
+        self.pos_x, self.pos_y = op.origin
+        self.field_rect = None
+        if image_path is not None:
+            image = self.ll.get_image(image_path)
+            if image is not None:
+                self.image_to_surface(image, self.pos_x, self.pos_y)
+        self.set_font_size(self.fs)
+        # 18 is font size for which font_extents has height. So far no scaled_font_extents function
+        self.shift_y = 0.5 * self.font_extents[2] * self.fs / 18
+        if align == 'point':
+            self.render_point_aligned_text()
+        elif format_string == "zoomed_digit":
+            self.scale = 1.4
+            self.render_zoomed_digit_text()
+        else:
+            shift_x = op.shift_x(self.get_text_extents(self.value).width)
+            self.text_to_surface(self.value, self.pos_x + shift_x, self.pos_y + self.shift_y, self.text_colour)
+        return self.field_rect
+
+    ## Renders fields and remembers their state and bounding box
+    #  @param self The python object self
+    #  @param field_states Dict with states of fields to be rendered, see get_field_states
+    def render_layout(self, field_states):
+        for meta_name, state in field_states.items():
+            self.field_states[meta_name] = (state, self.render_field(self.page['ops'][meta_name], state))
+
+    ## Repaints static layer and fields only in the areas covered by fields with changed state
+    #  @param self The python object self
+    #  @param field_states Dict with states of fields to be rendered, see get_field_states
+    def render_layout_damage(self, field_states):
+        damage = list()
+        for meta_name, state in field_states.items():
+            op = self.page['ops'][meta_name]
             try:
-                self.get_value(parameter, 'value_' + show)
+                previous_state, previous_rect = self.field_states[meta_name]
             except KeyError:
-                self.value = None
+                previous_state, previous_rect = None, None
+            if state == previous_state:
+                continue
+            self.measure_only = True
+            rect = self.render_field(op, state)
+            self.measure_only = False
+            self.field_states[meta_name] = (state, rect)
+            if rect is not None:
+                damage.append(rect)
+            if previous_rect is not None and previous_rect != rect:
+                damage.append(previous_rect)
+        if not damage:
+            return
+        self.ctx.save()
+        for r in damage:
+            self.ctx.rectangle(*r)
+        self.ctx.clip()
+        self.paint_static_layer()
+        for meta_name in field_states:
+            state, rect = self.field_states[meta_name]
+            if rect is not None and any(self.rects_overlap(rect, r) for r in damage):
+                self.render_field(self.page['ops'][meta_name], state)
+        self.ctx.restore()
+        for r in damage:
+            self.add_damage(r)
+
+    ## Checks if two rectangles (x, y, w, h) overlap
+    #  @param self The python object self
+    #  @param rect_a First rectangle
+    #  @param rect_b Second rectangle
+    def rects_overlap(self, rect_a, rect_b):
+        return rect_a[0] < rect_b[0] + rect_b[2] and rect_b[0] < rect_a[0] + rect_a[2] and \
+            rect_a[1] < rect_b[1] + rect_b[3] and rect_b[1] < rect_a[1] + rect_a[3]
+
+    ## Extends field_rect with a painted area. The area is rounded out to full pixels with DAMAGE_MARGIN for antialiasing.
+    #  @param self The python object self
+    #  @param x Left edge of the area
+    #  @param y Top edge of the area
+    #  @param w Width of the area
+    #  @param h Height of the area
+    def extend_field_rect(self, x, y, w, h):
+        x0 = max(0, math.floor(x) - self.DAMAGE_MARGIN)
+        y0 = max(0, math.floor(y) - self.DAMAGE_MARGIN)
+        x1 = min(self.width, math.ceil(x + w) + self.DAMAGE_MARGIN)
+        y1 = min(self.height, math.ceil(y + h) + self.DAMAGE_MARGIN)
+        if x1 <= x0 or y1 <= y0:
+            return
+        if self.field_rect is not None:
+            fx, fy, fw, fh = self.field_rect
+            x0, y0 = min(x0, fx), min(y0, fy)
+            x1, y1 = max(x1, fx + fw), max(y1, fy + fh)
+        self.field_rect = (x0, y0, x1 - x0, y1 - y0)
+
+    ## Sets font size of the cairo context and remembers it as a part of the text extents cache key
+    #  @param self The python object self
+    #  @param font_size Font size
+    def set_font_size(self, font_size):
+        if font_size != self.font_size:
+            self.ctx.set_font_size(font_size)
+            self.font_size = font_size
+
+    ## Returns cairo text extents of a text for the current font face and size. Extents are cached, most of the texts
+    #  (units, digits, separators) are measured many times per frame.
+    #  @param self The python object self
+    #  @param text Text to be measured
+    def get_text_extents(self, text):
+        key = (self.ll.font_face, self.font_size, text)
+        try:
+            te = self.text_extents_cache[key]
+            self.text_extents_cache.move_to_end(key)
+            self.text_extents_hits += 1
+        except KeyError:
+            te = self.ctx.text_extents(text)
+            self.text_extents_cache[key] = te
+            if len(self.text_extents_cache) > self.TEXT_EXTENTS_CACHE_SIZE:
+                self.text_extents_cache.popitem(last=False)
+            self.text_extents_misses += 1
+        return te
+
+    ## Returns dict with text extents cache statistics: size, hits, misses and hit rate
+    #  @param self The python object self
+    def get_text_extents_stats(self):
+        total = self.text_extents_hits + self.text_extents_misses
+        if total > 0:
+            hit_rate = self.text_extents_hits / total
+        else:
+            hit_rate = num.NAN
+        return dict(size=len(self.text_extents_cache), hits=self.text_extents_hits, misses=self.text_extents_misses, hit_rate=hit_rate)
 
     def calculate_x_shift(self, align, text):
         # Calculate text horizontal shift
-        te = self.ctx.text_extents(text)
+        te = self.get_text_extents(text)
         if align == 'center':
             shift_x = -1.0 * te.width / 2.0
         elif align == 'right':
@@ -347,7 +501,7 @@ class layout(threading.Thread):
         # Split text on separator
         self.split_text = self.value.rpartition(char)
         # Get separator width
-        te = self.ctx.text_extents(self.split_text[1])
+        te = self.get_text_extents(self.split_text[1])
         width = te.width
         # Render all parts of the text to the surface
         for text, align, shift in zip(self.split_text, ('right', 'center', 'left'), (-1 * width, 0, width)):
@@ -359,21 +513,21 @@ class layout(threading.Thread):
         i = self.editor_fields["index"]
         #Head
         rv1 = self.value[:i]
-        te1 = self.ctx.text_extents(rv1)
+        te1 = self.get_text_extents(rv1)
         #Tail
         rv3 = self.value[i + 1:]
         #Currently edited digit
         rv2 = self.value[i]
-        self.ctx.set_font_size(self.scale * self.fs)
-        te2 = self.ctx.text_extents(rv2)
+        self.set_font_size(self.scale * self.fs)
+        te2 = self.get_text_extents(rv2)
 
-        te = self.ctx.text_extents(self.value)
+        te = self.get_text_extents(self.value)
         rv1_x = self.pos_x - te.width / 2.0
         rv2_x = self.pos_x - te.width / 2.0 + te1.x_advance
         rv3_x = self.pos_x - te.width / 2.0 + te1.x_advance + te2.x_advance
 
         self.text_to_surface(rv2, rv2_x, self.pos_y + self.scale * self.shift_y, (1.0, 0.0, 0.0))
-        self.ctx.set_font_size(self.fs)
+        self.set_font_size(self.fs)
         self.text_to_surface(rv1, rv1_x, self.pos_y + self.shift_y, self.text_colour)
         self.text_to_surface(rv3, rv3_x, self.pos_y + self.shift_y, self.text_colour)
 
@@ -390,16 +544,25 @@ class layout(threading.Thread):
             self.ctx.stroke()
 
     def render_pressed_button(self, pressed_pos):
-        if self.ctx is None or self.page['buttons_image'] is None:
+        if self.buffers is None or self.page['buttons_image_file'] is None:
+            return
+        buttons_image = self.ll.get_image(self.page['buttons_image_file'])
+        if buttons_image is None:
             return
         self.log.debug("render_pressed_button started", extra=self.extra)
+        self.ctx = self.buffers.acquire()
+        self.damage = list()
         for parameter, r in self.page['button_rectangles'].items():
             if self.point_in_rect(pressed_pos, r[1]):
                 fr = r[1]
-                self.ctx.set_source_surface(self.page['buttons_image'], 0, 0)
+                self.ctx.set_source_surface(buttons_image, 0, 0)
                 self.ctx.rectangle(fr[0], fr[1], fr[2], fr[3])
                 self.ctx.fill()
-        self.pm.render['refresh'] = True
+                self.add_damage(tuple(fr))
+        if self.damage != []:
+            self.buffers.publish(self.damage)
+        # Pressed button is removed by repainting the whole page
+        self.full_redraw = True
         self.log.debug("render_pressed_button finished", extra=self.extra)
 
     def check_click(self, position, click):
@@ -409,7 +572,7 @@ class layout(threading.Thread):
                     self.log.debug("CLICK on {} {}".format(parameter, r), extra=self.extra)
                     field = self.page['fields'][parameter]
                     self.parse_short_click(field)
-            self.pm.render['refresh'] = True
+            self.full_redraw = True
         elif click == 'LONG':
             for parameter, r in self.page['button_rectangles'].items():
                 if self.point_in_rect(position, r[1]):
@@ -568,13 +731,14 @@ class layout(threading.Thread):
             image_path = overlay[0]
             self.overlay_show_time = overlay[1]
             if image_path is not None:
-                if image_path not in self.ll.images:
-                    self.ll.images[image_path] = self.ll.load_image(image_path)
-                image = self.ll.images[image_path]
+                # Overlay is painted once, the image is the first one to be evicted from the cache
+                image = self.ll.get_image(image_path, cold=True)
                 if image is not None:
                     self.octx.set_source_rgba(0.0, 0.0, 0.0, 0.0)
                     self.octx.set_source_surface(image, 0, 0)
                     self.octx.paint_with_alpha(1.0)
+                    self.pm.overlay['visible'] = True
+                    self.invalidate_buffers()
 
     def hide_overlay(self):
         self.octx.set_source_rgba(0.0, 0.0, 0.0, 0.0)
@@ -582,8 +746,20 @@ class layout(threading.Thread):
         self.octx.paint_with_alpha(1.0)
         self.octx.set_operator(cairo.OPERATOR_SOURCE)
         self.overlay_time_start = num.NAN
+        self.pm.overlay['visible'] = False
+        self.invalidate_buffers()
+
+    ## Asks the rendering plugin to copy the whole last frame, i.e. after overlay change
+    #  @param self The python object self
+    def invalidate_buffers(self):
+        if self.buffers is not None:
+            self.buffers.invalidate()
 
     def text_to_surface(self, text, x, y, c):
+        te = self.get_text_extents(text)
+        self.extend_field_rect(x + te.x_bearing, y + te.y_bearing, te.width, te.height)
+        if self.measure_only:
+            return
         self.ctx.set_source_rgb(c[0], c[1], c[2])
         self.ctx.move_to(x, y)
         self.ctx.show_text(text)
@@ -609,13 +785,13 @@ class layout(threading.Thread):
             w = self.width
         if h is None:
             h = self.height
+        try:
+            self.extend_field_rect(x, y, min(w, surface.get_width()), min(h, surface.get_height()))
+        except AttributeError:
+            # Image not loaded
+            pass
+        if self.measure_only:
+            return
         self.ctx.set_source_surface(surface, x, y)
         self.ctx.rectangle(x, y, w, h)
         self.ctx.fill()
-
-    #FIXME Needs to go to layout_loader
-    def make_image_key(self, image_path, value):
-        suffix = "_" + format(value)
-        extension = image_path[-4:]
-        name = image_path[:-4]
-        return (name + suffix + extension)
@@ -11,9 +11,17 @@ import ctypes as ct
 import glob
 import logging
 import os
+import pickle
+import queue
+import re
+import threading
 import yaml
 
+from helpers import num
+import helpers
+import image_cache
 import pyplum
+import startup_profiler
 
 
 ## Class for loading and parsing layouts
@@ -21,6 +29,15 @@ class layout_loader():
     ## @var extra
     # Module name used for logging and prefixing data
     extra = {'module_name': __qualname__}
+    ## @var CACHE_SUFFIX
+    # Suffix of layout cache file name for layout file, or the cache file name for layout directory
+    CACHE_SUFFIX = '.layout_cache'
+    ## @var CACHE_VERSION
+    # Version of the converted pages format. Increase after changing convert_page to invalidate old caches.
+    CACHE_VERSION = 2
+    ## @var PAGE_ID_RE
+    # Regular expression finding page id in a layout file without parsing it
+    PAGE_ID_RE = re.compile(r'^id:\s*["\']?([^"\'\s#]+)', re.MULTILINE)
 
     def __init__(self):
         ## @var log
@@ -29,18 +46,51 @@ class layout_loader():
         ## @var pm
         #  PYthon PLUgin Manager instance
         self.pm = pyplum.pyplum()
+        ## @var profiler
+        #  Startup profiler instance
+        self.profiler = startup_profiler.startup_profiler()
         ## @var fonts_dir
         #  Location of fonts directory
         self.fonts_dir = self.pm.parameters['fonts_dir']['value']
         ## @var layout_file
         #  Location of layout file or directory
         self.layout_location = self.pm.parameters['layout_location']['value']
+        # Maximum size in bytes of decoded images, including background and buttons images of pages
+        self.pm.register_parameter('image_cache_budget', self.extra['module_name'], value=image_cache.image_cache.BUDGET, raw_unit='B')
         ## @var images
-        #  Dict with images loaded with png_to_cairo_surface. Currently only pngs are supported.
-        self.images = {}
+        #  image_cache with images loaded with png_to_cairo_surface. Currently only pngs are supported.
+        self.images = image_cache.image_cache(self.pm.parameters['image_cache_budget']['value'])
         ## @var pages
-        #  Dict with parsed pages from layout file.
+        #  Dict with pages ready to use (converted, with compiled fields). Pages are added on the first use by get_page.
+        #  Pages don't hold images, they're kept in images and can be evicted unless the page is pinned, see pin_pages.
         self.pages = {}
+        ## @var pinned_pages
+        #  List with ids of pages with pinned images: the current page and pages reachable from it
+        self.pinned_pages = list()
+        ## @var converted_pages
+        #  Dict with converted pages without images, from the layout cache or converted from layout files
+        self.converted_pages = {}
+        ## @var page_files
+        #  Dict with page ids as keys and layout files with the page as values
+        self.page_files = {}
+        ## @var cache
+        #  Dict with valid layout cache entries, see read_layout_cache
+        self.cache = {}
+        ## @var cache_file
+        #  Layout cache file path
+        self.cache_file = None
+        ## @var cache_dirty
+        #  True if pages were converted since the layout cache was written, see flush_layout_cache
+        self.cache_dirty = False
+        ## @var lock
+        #  Lock protecting pages, page loading is done by layout and prefetch threads
+        self.lock = threading.RLock()
+        ## @var prefetch_queue
+        #  Queue with ids of pages to be loaded in background
+        self.prefetch_queue = queue.Queue()
+        ## @var uc
+        #  Handle of unit_converter, used by render_op value getters
+        self.uc = helpers.unit_converter()
         ## @var font_face_set
         #  Indicates if cairo font has been initialised.
         self.font_initialised = False
@@ -55,116 +105,371 @@ class layout_loader():
         self.rel_origin = dict(x=0, y=0)
         self.load_layout_from_location()
         #self.parse_page()
+        threading.Thread(target=self.prefetch_loop, name='layout_prefetch', daemon=True).start()
 
-    ## Loads layout from a location (directory with one page per file or file woith all pages) and parses the content into self.pages
+    ## Finds pages in a layout location (directory with one page per file or file with all pages). Pages are not converted
+    #  and images are not loaded until the page is used, see get_page. Converted pages are stored in a cache file next to
+    #  the layout. Only files changed since the cache was written (different modification time or size) are parsed again.
+    #  The cache is written once after loading, pages converted later are written by flush_layout_cache.
     #  @param self The python object self
     def load_layout_from_location(self):
-        self.layout_tree = dict()
-        self.layout_tree['pages'] = dict()
-        if os.path.isfile(self.layout_location):
-            self.layout_file = self.layout_location
-            self.layout_tree['pages'] = self.load_layout_tree_from_file(self.layout_location)
-        elif os.path.isdir(self.layout_location):
-            self.layout_dir = self.layout_location
-            files = [f for f in glob.glob(self.layout_dir + "*.yaml")]
+        with self.lock:
+            # Keep pages converted from the previous layout location
+            self.flush_layout_cache()
+            self.images.clear()
+            self.pages = {}
+            self.pinned_pages = list()
+            self.converted_pages = {}
+            self.page_files = {}
+            files = []
+            self.cache_file = None
+            if os.path.isfile(self.layout_location):
+                self.layout_file = self.layout_location
+                files = [self.layout_location]
+                self.cache_file = self.layout_location + self.CACHE_SUFFIX
+            elif os.path.isdir(self.layout_location):
+                self.layout_dir = self.layout_location
+                files = sorted(glob.glob(self.layout_dir + "*.yaml"))
+                self.cache_file = os.path.join(self.layout_dir, self.CACHE_SUFFIX)
+            else:
+                self.log.critical("Layput location is not a file or a directory, refusing to load".format(self.layout_location), extra=self.extra)
+            with self.profiler.span("read layout cache", 'layout'):
+                cache = self.read_layout_cache(self.cache_file)
+            self.cache = dict()
             for f in files:
-                layout_tree = self.load_layout_tree_from_file(f)
-                self.layout_tree['pages'][layout_tree['id']] = layout_tree
-        else:
-            self.log.critical("Layput location is not a file or a directory, refusing to load".format(self.layout_location), extra=self.extra)
-        self.convert_pages()
+                try:
+                    if cache[f]['key'] != self.get_layout_file_key(f):
+                        raise KeyError(f)
+                    self.cache[f] = cache[f]
+                    for page_id, page in cache[f]['pages'].items():
+                        self.page_files[page_id] = f
+                        self.converted_pages[page_id] = page
+                except KeyError:
+                    page_id = self.find_page_id(f)
+                    if page_id is not None:
+                        self.page_files[page_id] = f
+                    else:
+                        # Layout file with many pages or without id, page ids are known after conversion
+                        self.convert_file(f)
+            if set(self.cache) != set(cache):
+                self.write_layout_cache(self.cache_file, self.cache)
+            self.cache_dirty = False
+
+    ## Returns page id from a single page layout file without parsing it or None if the id can't be found
+    #  @param self The python object self
+    #  @param layout_file Layout file path
+    def find_page_id(self, layout_file):
+        try:
+            with open(layout_file) as f:
+                match = self.PAGE_ID_RE.search(f.read())
+        except (IOError, OSError):
+            return None
+        if match is None:
+            return None
+        return match.group(1)
+
+    ## Converts all pages from a layout file and adds the file to layout cache
+    #  @param self The python object self
+    #  @param layout_file Layout file path
+    def convert_file(self, layout_file):
+        key = self.get_layout_file_key(layout_file)
+        with self.profiler.span("convert " + layout_file, 'layout'):
+            pages = self.convert_pages(self.load_layout_tree_from_file(layout_file))
+        self.cache[layout_file] = dict(key=key, pages=pages)
+        for page_id, page in pages.items():
+            self.page_files[page_id] = layout_file
+            self.converted_pages[page_id] = page
+
+    ## Returns page ready to use. The page is converted and its background and buttons images are loaded into the image
+    #  cache on the first use. Raises KeyError if the page doesn't exist.
+    #  @param self The python object self
+    #  @param page_id Page id
+    def get_page(self, page_id):
+        with self.lock:
+            try:
+                return self.pages[page_id]
+            except KeyError:
+                pass
+            if page_id not in self.converted_pages:
+                self.convert_file(self.page_files[page_id])
+                # Writing the cache on page switch would delay it, it's written on quit
+                self.cache_dirty = True
+            with self.profiler.span("prepare page " + page_id, 'layout'):
+                page = self.prepare_page(self.converted_pages[page_id])
+            self.pages[page_id] = page
+            if page_id in self.pinned_pages:
+                # Pin images of a prefetched page before loading them, so they're not evicted right away
+                self.pin_pages(self.pinned_pages)
+        with self.profiler.span("load page images " + page_id, 'layout'):
+            for image_path in (page['background_image_file'], page['buttons_image_file']):
+                if image_path is not None:
+                    self.get_image(image_path)
+        return page
+
+    ## Pins images of pages in the image cache, so they're not evicted. Pages that are not loaded yet are pinned when
+    #  they're loaded by get_page. Previously pinned pages can be evicted.
+    #  @param self The python object self
+    #  @param page_ids List with page ids, None values are ignored
+    def pin_pages(self, page_ids):
+        with self.lock:
+            self.pinned_pages = [page_id for page_id in page_ids if page_id is not None]
+            images = list()
+            for page_id in self.pinned_pages:
+                try:
+                    images.extend(self.get_page_images(self.pages[page_id]))
+                except KeyError:
+                    pass
+            self.images.pin(images)
+
+    ## Returns list with image cache keys of all images used by a page: background and buttons images and images of all
+    #  fields, including all frames of variable images
+    #  @param self The python object self
+    #  @param page Page returned by get_page
+    def get_page_images(self, page):
+        images = [image_path for image_path in (page['background_image_file'], page['buttons_image_file']) if image_path is not None]
+        for op in page['ops'].values():
+            if op.image_path is None:
+                continue
+            if op.sprite:
+                images.append(self.get_sprite_cache_key(op.image_path, op.frames + 1))
+            else:
+                images.append(op.image_path)
+                images.extend(op.image_keys.values())
+        return images
+
+    ## Schedules loading pages in background, so switching to them is fast
+    #  @param self The python object self
+    #  @param page_ids List with page ids, None values are ignored
+    def prefetch_pages(self, page_ids):
+        for page_id in page_ids:
+            if page_id is not None and page_id not in self.pages:
+                self.prefetch_queue.put(page_id)
 
-    ## Converts self.layout_tree into move convinient self.page
+    ## Loads pages from prefetch_queue. Runs in a separate thread.
     #  @param self The python object self
-    def convert_pages(self):
-        self.images = {}
-        self.pages = {}
-        for page_id, page in self.layout_tree['pages'].items():
-            self.pages[page_id] = collections.OrderedDict()
-            self.pages[page_id]['top'] = None
-            self.pages[page_id]['botton'] = None
-            self.pages[page_id]['left'] = None
-            self.pages[page_id]['right'] = None
-            self.pages[page_id]['fields'] = collections.OrderedDict()
-            self.pages[page_id]['button_rectangles'] = collections.OrderedDict()
-            abs_x = 0
-            abs_y = 0
-            rel_x = 0
-            rel_y = 0
-            page_fields = collections.OrderedDict()
-            self.pages[page_id]['name'] = None
-            self.pages[page_id]['type'] = None
-            self.pages[page_id]['background_image'] = None
-            self.pages[page_id]['buttons_image'] = None
-            self.pages[page_id]['background_colour'] = (0, 0, 0)
-            self.pages[page_id]['text_colour'] = (255, 255, 255)
-            self.pages[page_id]['font'] = None
-            self.pages[page_id]['font_size'] = 18
+    def prefetch_loop(self):
+        while True:
+            page_id = self.prefetch_queue.get()
             try:
-                if 'name' in page:
-                    self.pages[page_id]['name'] = page['name']
-                if 'type' in page:
-                    self.pages[page_id]['type'] = page['type']
-                if 'background_image' in page:
-                    self.pages[page_id]['background_image'] = self.load_image(page['background_image'])
-                if 'buttons_image' in page:
-                    self.pages[page_id]['buttons_image'] = self.load_image(page['buttons_image'])
-                if 'background_colour' in page:
-                    self.pages[page_id]['background_colour'] = self.parse_background_colour()
-                if 'text_colour' in page:
-                    self.pages[page_id]['text_colour'] = self.parse_text_colour(page['text_colour'])
-                if 'up' in page:
-                    self.pages[page_id]['up'] = page['up']
-                if 'down' in page:
-                    self.pages[page_id]['down'] = page['down']
-                if 'left' in page:
-                    self.pages[page_id]['left'] = page['left']
-                if 'right' in page:
-                    self.pages[page_id]['right'] = page['right']
-                if 'font' in page:
-                    self.pages[page_id]['font'], self.pages[page_id]['font_size'] = self.parse_font(page['font'], page['font_size'])
-                    if not self.font_initialised:
-                        #FIXME Move to layout.py?
-                        self.initialise_font(self.pages[page_id]['font'])
-
-                if page['fields'] is not None:
-                    for f in page['fields']:
-                        meta_name = self.get_meta_name(f)
-                        if meta_name in page['fields']:
-                            #field already in the ordered dict, add location
-                            meta_name = meta_name + '-' + format(f['x']) + '-' + format(f['y'])
-                        page_fields[meta_name] = f
-                        if ('abs_origin' in f):
-                            abs_x = f['abs_origin']['x']
-                            abs_y = f['abs_origin']['y']
-                            del page_fields[meta_name]['abs_origin']
-                        if ('rel_origin' in f):
-                            rel_x = f['rel_origin']['x']
-                            rel_y = f['rel_origin']['y']
-                            abs_x += rel_x
-                            abs_y += rel_y
-                            del page_fields[meta_name]['rel_origin']
-                        if ('x' in f) and ('y' in f):
-                            x = f['x']
-                            y = f['y']
-                            del page_fields[meta_name]['x']
-                            del page_fields[meta_name]['y']
-                        else:
-                            x = 0
-                            y = 0
-                        page_fields[meta_name]['origin'] = (abs_x + x, abs_y + y)
-
-                        if 'text_colour' in f:
-                            page_fields[meta_name]['text_colour'] = self.parse_text_colour(f['text_colour'])
-
-                        button_rect = self.button_rect_from_layout(f)
-                        if button_rect is not None:
-                            button_rect[0] += abs_x
-                            button_rect[1] += abs_y
-                        self.pages[page_id]['button_rectangles'][meta_name] = (f['parameter'], button_rect)
-                    self.pages[page_id]['fields'] = page_fields
-            except TypeError as e:
-                self.log.error("Error while converting layout {}: {}.".format(page_id, str(e)), extra=self.extra)
+                self.get_page(page_id)
+            except KeyError:
+                self.log.warning("Page {} can't be prefetched, it doesn't exist".format(page_id), extra=self.extra)
+
+    ## Returns key used to check if the cached content of a layout file is still valid
+    #  @param self The python object self
+    #  @param layout_file Layout file path
+    def get_layout_file_key(self, layout_file):
+        st = os.stat(layout_file)
+        return (st.st_mtime_ns, st.st_size)
+
+    ## Reads layout cache file. Returns dict with layout file paths as keys and dicts with file key and converted pages as values.
+    #  Returns empty dict if the cache doesn't exist, is invalid or was written by a different CACHE_VERSION.
+    #  @param self The python object self
+    #  @param cache_file Cache file path
+    def read_layout_cache(self, cache_file):
+        if cache_file is None or not os.path.isfile(cache_file):
+            return dict()
+        try:
+            with open(cache_file, 'rb') as f:
+                cache = pickle.load(f)
+            if cache['version'] == self.CACHE_VERSION:
+                self.log.debug("Layout cache {} loaded".format(cache_file), extra=self.extra)
+                return cache['files']
+            self.log.debug("Layout cache {} has different version, ignoring".format(cache_file), extra=self.extra)
+        except (IOError, OSError, EOFError, pickle.PickleError, AttributeError, ImportError, KeyError, TypeError, ValueError) as e:
+            # Cache written by a different code version or a broken file, pages are converted again
+            self.log.warning("Reading layout cache {} failed with: {}".format(cache_file, e), extra=self.extra)
+        return dict()
+
+    ## Writes layout cache file if pages were converted since it was written. Called on quit and layout reload.
+    #  @param self The python object self
+    def flush_layout_cache(self):
+        with self.lock:
+            if not self.cache_dirty:
+                return
+            self.cache_dirty = False
+            cache_file = self.cache_file
+            files = self.cache.copy()
+        self.write_layout_cache(cache_file, files)
+
+    ## Writes layout cache file. The file is replaced atomically, so a crash can't leave a broken cache.
+    #  @param self The python object self
+    #  @param cache_file Cache file path
+    #  @param files Dict with layout file paths as keys and dicts with file key and converted pages as values
+    def write_layout_cache(self, cache_file, files):
+        if cache_file is None:
+            return
+        self.log.debug("Writing layout cache {}".format(cache_file), extra=self.extra)
+        try:
+            with open(cache_file + '.tmp', 'wb') as f:
+                pickle.dump(dict(version=self.CACHE_VERSION, files=files), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(cache_file + '.tmp', cache_file)
+        except (IOError, OSError, pickle.PickleError) as e:
+            self.log.warning("Writing layout cache {} failed with: {}".format(cache_file, e), extra=self.extra)
+
+    ## Converts layout tree loaded from a file into dict with converted pages. The file contains a single page
+    #  or, for a layout file with all pages, list of pages in 'pages'.
+    #  @param self The python object self
+    #  @param layout_tree Layout tree loaded with load_layout_tree_from_file
+    def convert_pages(self, layout_tree):
+        pages = collections.OrderedDict()
+        try:
+            if 'id' in layout_tree:
+                page_list = [layout_tree]
+            else:
+                page_list = layout_tree['pages']
+            for page in page_list:
+                pages[page['id']] = self.convert_page(page['id'], page)
+        except (KeyError, TypeError) as e:
+            self.log.error("Error while converting layout: {}.".format(str(e)), extra=self.extra)
+        return pages
+
+    ## Converts a page from layout tree into more convinient form used by layout module. The result doesn't contain any cairo
+    #  objects, so it can be stored in the layout cache. Images and font are loaded by prepare_page.
+    #  @param self The python object self
+    #  @param page_id Page id
+    #  @param page Page from layout tree
+    def convert_page(self, page_id, page):
+        converted = collections.OrderedDict()
+        converted['top'] = None
+        converted['botton'] = None
+        converted['left'] = None
+        converted['right'] = None
+        converted['fields'] = collections.OrderedDict()
+        converted['button_rectangles'] = collections.OrderedDict()
+        abs_x = 0
+        abs_y = 0
+        rel_x = 0
+        rel_y = 0
+        page_fields = collections.OrderedDict()
+        converted['name'] = None
+        converted['type'] = None
+        converted['background_image_file'] = None
+        converted['buttons_image_file'] = None
+        converted['background_colour'] = (0, 0, 0)
+        converted['text_colour'] = (255, 255, 255)
+        converted['font'] = None
+        converted['font_size'] = 18
+        try:
+            if 'name' in page:
+                converted['name'] = page['name']
+            if 'type' in page:
+                converted['type'] = page['type']
+            if 'background_image' in page:
+                converted['background_image_file'] = page['background_image']
+            if 'buttons_image' in page:
+                converted['buttons_image_file'] = page['buttons_image']
+            if 'background_colour' in page:
+                converted['background_colour'] = self.parse_background_colour()
+            if 'text_colour' in page:
+                converted['text_colour'] = self.parse_text_colour(page['text_colour'])
+            if 'up' in page:
+                converted['up'] = page['up']
+            if 'down' in page:
+                converted['down'] = page['down']
+            if 'left' in page:
+                converted['left'] = page['left']
+            if 'right' in page:
+                converted['right'] = page['right']
+            if 'font' in page:
+                converted['font'], converted['font_size'] = self.parse_font(page['font'], page['font_size'])
+
+            if page['fields'] is not None:
+                for f in page['fields']:
+                    meta_name = self.get_meta_name(f)
+                    if meta_name in page['fields']:
+                        #field already in the ordered dict, add location
+                        meta_name = meta_name + '-' + format(f['x']) + '-' + format(f['y'])
+                    page_fields[meta_name] = f
+                    if ('abs_origin' in f):
+                        abs_x = f['abs_origin']['x']
+                        abs_y = f['abs_origin']['y']
+                        del page_fields[meta_name]['abs_origin']
+                    if ('rel_origin' in f):
+                        rel_x = f['rel_origin']['x']
+                        rel_y = f['rel_origin']['y']
+                        abs_x += rel_x
+                        abs_y += rel_y
+                        del page_fields[meta_name]['rel_origin']
+                    if ('x' in f) and ('y' in f):
+                        x = f['x']
+                        y = f['y']
+                        del page_fields[meta_name]['x']
+                        del page_fields[meta_name]['y']
+                    else:
+                        x = 0
+                        y = 0
+                    page_fields[meta_name]['origin'] = (abs_x + x, abs_y + y)
+
+                    if 'text_colour' in f:
+                        page_fields[meta_name]['text_colour'] = self.parse_text_colour(f['text_colour'])
+
+                    button_rect = self.button_rect_from_layout(f)
+                    if button_rect is not None:
+                        button_rect[0] += abs_x
+                        button_rect[1] += abs_y
+                    converted['button_rectangles'][meta_name] = (f['parameter'], button_rect)
+                converted['fields'] = page_fields
+        except TypeError as e:
+            self.log.error("Error while converting layout {}: {}.".format(page_id, str(e)), extra=self.extra)
+        return converted
+
+    ## Returns a copy of converted page with fields compiled to render ops (page['ops']). Initialises font if it's not
+    #  initialised yet.
+    #  @param self The python object self
+    #  @param page Converted page
+    def prepare_page(self, page):
+        page = page.copy()
+        if page['font'] is not None and not self.font_initialised:
+            #FIXME Move to layout.py?
+            self.initialise_font(page['font'])
+        page['ops'] = collections.OrderedDict()
+        if page['fields'] is not None:
+            for meta_name, field in page['fields'].items():
+                page['ops'][meta_name] = self.compile_field(page, meta_name, field)
+        return page
+
+    ## Compiles a field into render_op. Defaults from the page are resolved and value getter, formatter, image key
+    #  getter and alignment function are selected once, not on each frame.
+    #  @param self The python object self
+    #  @param page Converted page
+    #  @param meta_name Meta name of the field
+    #  @param field Field from the converted page
+    def compile_field(self, page, meta_name, field):
+        op = render_op(meta_name, field['parameter'], field['origin'], self.uc)
+        op.show = field.get('show', 'value')
+        op.text = field.get('text', '')
+        op.font_size = field.get('font_size', page['font_size'])
+        op.align = field.get('align', 'center')
+        op.text_colour = field.get('text_colour', page['text_colour'])
+        if op.show == 'value' and page['type'] == 'editor':
+            # For editors use parameter value from editor_fields
+            op.get_value = op.get_editor_value
+        else:
+            try:
+                op.get_value = op.VALUE_GETTERS[op.show].__get__(op)
+            except KeyError:
+                op.get_value = op.get_no_value
+        format_field = field.get('format')
+        if type(format_field) == dict:
+            op.formatters = {unit: helpers.formatter(format_string) for unit, format_string in format_field.items()}
+            op.format_value = op.format_by_unit
+        else:
+            op.formatter = helpers.formatter(self.get_format_string(format_field, op.parameter))
+        if op.align == 'center':
+            op.shift_x = op.shift_center
+        elif op.align == 'right':
+            op.shift_x = op.shift_right
+        op.image_path = field.get('file')
+        try:
+            variable = field['variable']
+            op.variable_name = variable['name']
+            op.frames = variable['frames']
+            op.sprite = variable.get('sprite', False)
+            op.image_keys = {v: op.make_image_key(v) for v in range(op.frames + 1)}
+        except (KeyError, TypeError):
+            op.variable_name = None
+        return op
 
     ## Loads layout from yaml file.
     #  @param self The python object self
@@ -172,9 +477,8 @@ class layout_loader():
         self.log.debug("Loading layout file {}".format(layout_file), extra=self.extra)
         layout_tree = None
         try:
-            with open(layout_file) as f:
+            with open(layout_file) as f, self.profiler.span("parse " + layout_file, 'layout'):
                 layout_tree = yaml.safe_load(f)
-                f.close()
         except yaml.scanner.ScannerError as e:
             self.log.critical("Loading layout file {} failed, quitting".format(layout_file), extra=self.extra)
             self.log.critical("Error details: {}".format(str(e)), extra=self.extra)
@@ -198,7 +502,8 @@ class layout_loader():
         try:
             # Only one font is allowed for now due to cairo helper workaround.
             self.log.debug("Calling cairo_helper for {}".format(self.fonts_dir + font), extra=self.extra)
-            self.font_face = create_cairo_font_face_for_file(self.fonts_dir + font, 0)
+            with self.profiler.span("load font " + font, 'fonts'):
+                self.font_face = create_cairo_font_face_for_file(self.fonts_dir + font, 0)
             self.font_initialised = True
         except AttributeError:
             pass
@@ -240,30 +545,12 @@ class layout_loader():
 
     def format_parameter(self, format_field, parameter, value):
         format_string = self.get_format_string(format_field, parameter)
-        if format_string == "hhmmss.s":
-            try:
-                minutes, seconds = divmod(value, 60)
-                hours, minutes = divmod(minutes, 60)
-                value = "{:02.0f}:{:02.0f}:{:02.1f}".format(hours, minutes, seconds)
-            except (TypeError, ValueError):
-                pass
-        elif format_string == "hhmmss":
-            try:
-                minutes, seconds = divmod(int(value), 60)
-                hours, minutes = divmod(minutes, 60)
-                value = "{:02.0f}:{:02.0f}:{:02.0f}".format(hours, minutes, seconds)
-            except (TypeError, ValueError):
-                pass
-        else:
-            try:
-                value = format_string % float(value)
-            except (TypeError, ValueError):
-                value = format(value)
-        return value, format_string
+        return helpers.formatter.compile(format_string)(value), format_string
 
     def load_image(self, image_path):
         try:
-            image = self.png_to_cairo_surface(image_path)
+            with self.profiler.span("load image " + format(image_path), 'images'):
+                image = self.png_to_cairo_surface(image_path)
             self.log.debug("Image {} loaded".format(image_path), extra=self.extra)
         except cairo.Error:
             # image is invalid
@@ -273,6 +560,51 @@ class layout_loader():
             image = None
         return image
 
+    ## Returns image from the image cache, the image is loaded if it's not cached. Frames of sprite sheets are selected
+    #  with tuple (sprite sheet path, number of frames, frame index) used as image key.
+    #  @param self The python object self
+    #  @param image_key Image path or tuple with sprite sheet frame
+    #  @param cold If True the image is the first one to be evicted from the cache, see image_cache.get
+    def get_image(self, image_key, cold=False):
+        if type(image_key) is not tuple:
+            return self.images.get(image_key, self.load_image, cold)
+        image_path, frames, index = image_key
+        sprite = self.images.get(self.get_sprite_cache_key(image_path, frames),
+                                 lambda cache_key: self.load_sprite(image_path, frames), cold)
+        try:
+            return sprite[index]
+        except (IndexError, TypeError):
+            self.log.error("Sprite sheet {} has no frame {}".format(image_path, index), extra=self.extra)
+            return None
+
+    ## Returns key of sliced sprite sheet in the image cache. It's different from the key of the sheet loaded as a plain
+    #  image, so both can be cached.
+    #  @param image_path Sprite sheet path
+    #  @param frames Number of frames in the sprite sheet
+    @staticmethod
+    def get_sprite_cache_key(image_path, frames):
+        return ('sprite', image_path, frames)
+
+    ## Loads sprite sheet and slices it into frames. Frames have equal width and are placed from left to right.
+    #  Returns tuple with frames (cairo.ImageSurface) or None if the image can't be loaded.
+    #  @param self The python object self
+    #  @param image_path Sprite sheet path
+    #  @param frames Number of frames in the sprite sheet
+    def load_sprite(self, image_path, frames):
+        sheet = self.load_image(image_path)
+        if sheet is None:
+            return None
+        width = sheet.get_width() // frames
+        height = sheet.get_height()
+        sprite = list()
+        for i in range(frames):
+            frame = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+            ctx = cairo.Context(frame)
+            ctx.set_source_surface(sheet, -i * width, 0)
+            ctx.paint()
+            sprite.append(frame)
+        return tuple(sprite)
+
     def get_format_string(self, format_field, parameter):
         format_string = '%.0f'
         if type(format_field) == dict:
@@ -286,6 +618,16 @@ class layout_loader():
         png_surface = cairo.ImageSurface.create_from_png(file_path)
         return png_surface
 
+    ## Returns image file name for a frame of variable image, i.e. images/ble_icon_32x32_3.png for frame 3
+    #  @param image_path Image file name
+    #  @param value Frame number
+    @staticmethod
+    def make_image_key(image_path, value):
+        suffix = "_" + format(value)
+        extension = image_path[-4:]
+        name = image_path[:-4]
+        return (name + suffix + extension)
+
     def get_meta_name(self, field):
         try:
             show = field["show"]
@@ -295,6 +637,239 @@ class layout_loader():
         return meta_name
 
 
+## Field of a page compiled by layout_loader.compile_field. Rendering a field only calls functions selected during
+#  compilation, there is no field configuration look up on each frame.
+class render_op():
+    ## @var extra
+    # Module name used for logging and prefixing data
+    extra = {'module_name': __qualname__}
+    ## @var DEFAULT_FORMAT
+    # Format used if there is no format for the current unit of the parameter
+    DEFAULT_FORMAT = '%.0f'
+    __slots__ = ('meta_name', 'parameter', 'origin', 'uc', 'conversion', 'log', 'show', 'text', 'font_size', 'align', 'text_colour',
+                 'get_value', 'formatters', 'formatter', 'format_value', 'shift_x',
+                 'image_path', 'variable_name', 'frames', 'sprite', 'image_keys')
+
+    ## The constructor
+    #  @param self The python object self
+    #  @param meta_name Meta name of the field
+    #  @param parameter Parameter name
+    #  @param origin Position of the field (x, y)
+    #  @param uc unit_converter instance
+    def __init__(self, meta_name, parameter, origin, uc):
+        self.meta_name = meta_name
+        self.parameter = parameter
+        self.origin = origin
+        self.uc = uc
+        ## @var conversion
+        #  unit_conversion used for the last frame, changes only if the parameter unit changes
+        self.conversion = uc.get_conversion(None, None)
+        self.log = logging.getLogger('system')
+        self.show = 'value'
+        self.text = ''
+        self.font_size = None
+        self.align = 'center'
+        self.text_colour = None
+        self.get_value = self.get_no_value
+        self.formatters = None
+        self.formatter = None
+        self.format_value = self.format_static
+        self.shift_x = self.shift_none
+        self.image_path = None
+        self.variable_name = None
+        self.frames = 0
+        self.sprite = False
+        self.image_keys = {}
+
+    ## Returns parameter field converted to the parameter unit, with inf and nan replaced
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters, see pyplum.snapshot
+    #  @param vtype Parameter field, i.e. value or value_max
+    def convert(self, frame, vtype):
+        p = frame[self.parameter]
+        conversion = self.conversion
+        if p['raw_unit'] != conversion.source_unit or p['unit'] != conversion.target_unit:
+            conversion = self.uc.get_conversion(p['raw_unit'], p['unit'])
+            self.conversion = conversion
+        return num.sanitise(conversion.convert(p[vtype]))
+
+    ## Value getter for fields without known 'show'
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_no_value(self, frame, editor_fields):
+        return None
+
+    ## Value getter for 'show: value'
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_value_value(self, frame, editor_fields):
+        try:
+            return self.convert(frame, 'value')
+        except (KeyError, TypeError):
+            return None
+
+    ## Value getter for 'show: value' on editor pages
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_editor_value(self, frame, editor_fields):
+        try:
+            value = editor_fields[self.parameter]
+            if type(value) is tuple:
+                value = value[0]
+            return value
+        except (KeyError, TypeError):
+            return None
+
+    ## Value getter for 'show: date'
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_date_value(self, frame, editor_fields):
+        try:
+            value = self.convert(frame, 'value')
+        except (KeyError, TypeError):
+            return None
+        return helpers.formatter.format_date(value)
+
+    ## Value getter for 'show: time'
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_time_value(self, frame, editor_fields):
+        try:
+            value = self.convert(frame, 'value')
+        except (KeyError, TypeError):
+            return None
+        return helpers.formatter.format_time(value)
+
+    ## Value getter for 'show: tenths'
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_tenths_value(self, frame, editor_fields):
+        try:
+            value = self.convert(frame, 'value')
+            tenths_string = "{}".format(value - int(value))
+            return format(tenths_string)[2:3]
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    ## Value getter for 'show: unit'
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_unit_value(self, frame, editor_fields):
+        try:
+            return frame[self.parameter]['unit']
+        except KeyError:
+            return None
+
+    ## Value getter for 'show: min'
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_min_value(self, frame, editor_fields):
+        try:
+            return self.convert(frame, 'value_min')
+        except (KeyError, TypeError):
+            return None
+
+    ## Value getter for 'show: avg'
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_avg_value(self, frame, editor_fields):
+        try:
+            return self.convert(frame, 'value_avg')
+        except (KeyError, TypeError):
+            return None
+
+    ## Value getter for 'show: max'
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    #  @param editor_fields Dict with editor data
+    def get_max_value(self, frame, editor_fields):
+        try:
+            return self.convert(frame, 'value_max')
+        except (KeyError, TypeError):
+            return None
+
+    ## @var VALUE_GETTERS
+    # Dict with 'show' options as keys and value getters as values
+    VALUE_GETTERS = dict(value=get_value_value, date=get_date_value, time=get_time_value, tenths=get_tenths_value,
+                         unit=get_unit_value, min=get_min_value, avg=get_avg_value, max=get_max_value)
+
+    ## Formats value with format string selected during compilation. Returns formatted value and format string.
+    #  @param self The python object self
+    #  @param value Value to be formatted
+    #  @param frame Snapshot of parameters
+    def format_static(self, value, frame):
+        return self.formatter(value), self.formatter.format_string
+
+    ## Formats value with format string selected by the current parameter unit. Returns formatted value and format string.
+    #  @param self The python object self
+    #  @param value Value to be formatted
+    #  @param frame Snapshot of parameters
+    def format_by_unit(self, value, frame):
+        try:
+            formatter = self.formatters[frame[self.parameter]['unit']]
+        except KeyError:
+            return helpers.formatter.compile(self.DEFAULT_FORMAT)(value), self.DEFAULT_FORMAT
+        return formatter(value), formatter.format_string
+
+    ## Returns image key of a variable image frame: sprite sheet frame tuple (see layout_loader.get_image) or file name
+    #  @param self The python object self
+    #  @param value Frame number
+    def make_image_key(self, value):
+        if self.sprite:
+            # Frames 0..frames from one sprite sheet
+            return (self.image_path, self.frames + 1, value)
+        return layout_loader.make_image_key(self.image_path, value)
+
+    ## Returns image key for the current value of the variable, or image path if the field doesn't have variable image.
+    #  Keys of frames 0..frames are computed by layout_loader.compile_field.
+    #  @param self The python object self
+    #  @param frame Snapshot of parameters
+    def get_image_key(self, frame):
+        if self.variable_name is None:
+            return self.image_path
+        try:
+            v = frame[self.variable_name]['value']
+            if v > self.frames:
+                self.log.error("Variable {} value {} is greater than number of frames ({}) for image file {}".format(self.variable_name, v, self.frames, self.image_path), extra=self.extra)
+                v = self.frames
+        except (KeyError, TypeError):
+            # No value yet, i.e. sensor not connected. Sprite sheet can't be used as a plain image, use the first frame.
+            if self.sprite:
+                return self.image_keys[0]
+            return self.image_path
+        try:
+            return self.image_keys[v]
+        except (KeyError, TypeError):
+            return self.make_image_key(v)
+
+    ## Alignment function for left aligned text. Returns horizontal shift for text width.
+    #  @param width Text width
+    @staticmethod
+    def shift_none(width):
+        return 0.0
+
+    ## Alignment function for centered text. Returns horizontal shift for text width.
+    #  @param width Text width
+    @staticmethod
+    def shift_center(width):
+        return -1.0 * width / 2.0
+
+    ## Alignment function for right aligned text. Returns horizontal shift for text width.
+    #  @param width Text width
+    @staticmethod
+    def shift_right(width):
+        return -1.0 * width
+
+
 _initialized = False
 
 
@@ -6,16 +6,25 @@
 #
 #  http://opencyclingcomputer.eu/
 
+import time
+## @var start_time
+# Time of the program start, beginning of startup profiler timeline
+start_time = time.time()
+
 import argparse
 import logging
 import logging.handlers
 import signal
-import time
 
 import events
 import layout
 import pyplum
 import singleton
+import startup_profiler
+
+## @var imports_end_time
+# Time of finishing module imports
+imports_end_time = time.time()
 
 
 ## Main OpenCyclingComputer class
@@ -41,13 +50,16 @@ class open_cycling_computer(object, metaclass=singleton.singleton):
         self.pm.register_parameter("config_file", self.extra["module_name"], value=config_file)
         self.pm.register_parameter("layout_location", self.extra["module_name"], value=layout_location)
         self.pm.register_parameter("fonts_dir", self.extra["module_name"], value=fonts_dir)
+        profiler = startup_profiler.startup_profiler()
         ## @var layout
         #  Handle to layout instance
-        self.layout = layout.layout()
+        with profiler.span("layout init", 'occ'):
+            self.layout = layout.layout()
         ## @var events
         #  Handle to events instance
         self.log.debug("Initialising events", extra=self.extra)
-        self.events = events.events()
+        with profiler.span("events init", 'occ'):
+            self.events = events.events()
 
     ## Stops main event loop
     #  @param self The python object self
@@ -72,6 +84,10 @@ if __name__ == "__main__":
     lt.add_argument('-L', '--layout-dir', help='directory with Layout yaml files (one page per file)')
     parser.add_argument('-d', '--data-log', help='Data log config yaml file', required=True)
     parser.add_argument('-f', '--fonts', help='Directory with fonts', required=True)
+    parser.add_argument('--rgb565', action='store_true',
+                        help='Render directly into RGB565 buffers copied to the framebuffer without conversion. Pages must not use transparency.')
+    parser.add_argument('--profile-startup', nargs='?', const='', metavar='TRACE_FILE',
+                        help='Write startup timeline as Chrome trace json file, log/startup.<date>.json by default')
     args = parser.parse_args()
     config_file = args.config
     data_log_config = args.data_log
@@ -98,14 +114,24 @@ if __name__ == "__main__":
 
     ex = {'module_name': 'Main'}
     sys_logger.debug("Log start", extra=ex)
+    ## @var profiler
+    # Startup profiler, records startup phases if --profile-startup is used
+    profiler = startup_profiler.startup_profiler()
+    if args.profile_startup is not None:
+        trace_file = args.profile_startup or "log/startup." + time.strftime("%Y-%m-%d-%H:%M:%S") + ".json"
+        profiler.enable(trace_file, start_time)
+        profiler.add_span("imports", 'occ', start_time, imports_end_time)
     sys_logger.debug("Setting up plugin manager", extra=ex)
     p_manager = pyplum.pyplum()
     width, height = 240, 320
     sys_logger.debug("Screen size is {} x {}".format(width, height), extra=ex)
     # pitft_rendering needs this
     p_manager.register_parameter("display_size", value=(width, height))
+    p_manager.register_parameter("rgb565_rendering", value=args.rgb565)
     # data_log needs this
     p_manager.register_parameter("data_log_config", value=data_log_config)
+    # Notification statistics are written to log directory on quit
+    p_manager.set_value("notification_stats_file", "log/notification_stats." + time.strftime("%Y-%m-%d-%H:%M:%S") + ".yaml")
     #print(p_manager.list_plugins('plugins'))
     plugins = ['ble_hr',
                'ble_sc',
@@ -117,12 +143,14 @@ if __name__ == "__main__":
                'editor',
                #'json_server',
                #'gtk_rendering',
+               #'headless_rendering',
                'pitft_rendering',
                'pitft_touchscreen',
                'lipo_shim',
                'data_log',
                'syscalls']
-    p_manager.load_plugins('plugins', plugins)
+    with profiler.span("load plugins", 'occ'):
+        p_manager.load_plugins('plugins', plugins)
     sys_logger.debug("Starting plugin manager", extra=ex)
     p_manager.start()
     ## @var main_window
@@ -131,4 +159,6 @@ if __name__ == "__main__":
     sys_logger.debug("Starting events loop", extra=ex)
     main_window.events.run()
     p_manager.stop()
+    # Write startup timeline if the first frame has never been painted
+    profiler.finish()
     sys_logger.debug("Log end", extra=ex)
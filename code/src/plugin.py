@@ -13,6 +13,9 @@ class plugin(threading.Thread):
     ## @var extra
     # Module name used for logging and prefixing data
     extra = {'module_name': __qualname__}
+    ## @var DEPENDS
+    # Names of plugins that have to be initialised before this one. Plugins without dependencies are initialised in parallel.
+    DEPENDS = ()
 
     def __init__(self):
         super().__init__()
@@ -60,14 +60,14 @@ class bicycle(plugin.plugin):
         if 'session_odometer_start' in self.pm.parameters:
             if self.pm.parameters["session_odometer_start"]["value"] is not None:
                 if math.isnan(self.pm.parameters["session_odometer_start"]["value"]):
-                    self.pm.parameters["session_odometer_start"]["value"] = self.odometer
+                    self.pm.set_value("session_odometer_start", self.odometer)
 
         # Handle wheel_size change
         if self.wheel_size != self.pm.parameters['wheel_size']['value']:
             self.log.debug("wheel_size changed from {} to {}.".format(self.wheel_size, self.pm.parameters['wheel_size']['value']), extra=self.extra)
             self.wheel_size = self.pm.parameters['wheel_size']['value']
             try:
-                self.pm.parameters['wheel_circumference']['value'] = self.w.get_circumference(self.wheel_size)
+                self.pm.set_value('wheel_circumference', self.w.get_circumference(self.wheel_size))
             except KeyError:
                 #FIXME That should give user feedback that something went wrong
                 self.log.critical("Unknown wheel_circumference for wheel_size {}.".format(self.wheel_size), extra=self.extra)
@@ -82,14 +82,14 @@ class bicycle(plugin.plugin):
         # Speed calculation
         if self.wheel_revolution_time != self.pm.parameters["wheel_revolution_time"]["value"]:
             self.wheel_revolution_time = self.pm.parameters["wheel_revolution_time"]["value"]
-            self.pm.parameters["speed"]["value"] = self.wheel_circumference / self.wheel_revolution_time
+            self.pm.set_value("speed", self.wheel_circumference / self.wheel_revolution_time)
             self.pm.parameters["speed"]["value_max"] = max(self.pm.parameters["speed"]["value_max"], self.pm.parameters["speed"]["value"])
             self.speed_time_stamp = time.time()
             self.pm.parameters["speed"]["time_stamp"] = self.speed_time_stamp
 
         # Expiry speed after 2 s
         if time.time() - self.speed_time_stamp > 2.0:
-            self.pm.parameters["speed"]["value"] = 0.0
+            self.pm.set_value("speed", 0.0)
             self.speed_time_stamp = time.time()
             self.pm.parameters["speed"]["time_stamp"] = self.speed_time_stamp
 
@@ -111,7 +111,7 @@ class bicycle(plugin.plugin):
             except TypeError:
                 self.odometer_delta = 0.0
             try:
-                self.pm.parameters["session_distance"]["value"] = self.odometer - self.pm.parameters["session_odometer_start"]["value"]
+                self.pm.set_value("session_distance", self.odometer - self.pm.parameters["session_odometer_start"]["value"])
             except (TypeError, ValueError):
                 pass
 
@@ -119,9 +119,9 @@ class bicycle(plugin.plugin):
         if self.cadence != self.pm.parameters["cadence"]["value"]:
             self.cadence = self.pm.parameters["cadence"]["value"]
             try:
-                self.pm.parameters["gear_ratio"]["value"] = self.wheel_revolution_time / (self.cadence / 60.0)
+                self.pm.set_value("gear_ratio", self.wheel_revolution_time / (self.cadence / 60.0))
             except (TypeError, ZeroDivisionError):
-                self.pm.parameters["gear_ratio"]["value"] = num.NAN
+                self.pm.set_value("gear_ratio", num.NAN)
 
         # Calculate slope
         if self.odometer_delta > 0.0:
@@ -138,7 +138,7 @@ class bicycle(plugin.plugin):
         while self.running:
             # 3 s expiry to slope reset
             if time.time() - self.pm.parameters["slope"]["time_stamp"] > 3.0:
-                self.pm.parameters["slope"]["value"] = 0.0
+                self.pm.set_value("slope", 0.0)
             time.sleep(0.1)
         self.log.debug("Main loop finished", extra=self.extra)
 
@@ -147,12 +147,12 @@ class bicycle(plugin.plugin):
     def calculate_slope(self):
         t = time.time()
         if self.odometer_delta_cumulative > 2.0:
-            self.pm.parameters["slope"]["value"] = self.altitude_delta_cumulative / self.odometer_delta_cumulative
+            self.pm.set_value("slope", self.altitude_delta_cumulative / self.odometer_delta_cumulative)
             self.pm.parameters["slope"]["time_stamp"] = t
             self.log.debug("slope: {}".format(self.pm.parameters["slope"]["value"]), extra=self.extra)
         if abs(self.pm.parameters["slope"]["value"]) < 0.02:
             #If slope is less than 2% wait for more cumulative distance/altitude
-            self.pm.parameters["slope"]["value"] = 0.0
+            self.pm.set_value("slope", 0.0)
             self.pm.parameters["slope"]["time_stamp"] = t
         else:
             #If slope is less more 2%, use calculated value and reset cumulative variables
@@ -51,18 +51,18 @@ class ble_hr(ble_sensor.ble_sensor):
             self.pm.parameters["heart_rate"]["reset"] = False
         try:
             self.pm.parameters["heart_rate"]["time_stamp"] = self.delegate.time_stamp
-            self.pm.parameters["heart_rate_nof"]["value"] = self.delegate.heart_rate
+            self.pm.set_value("heart_rate_nof", self.delegate.heart_rate)
             self.pm.parameters["heart_rate"]["value_min"] = min(self.pm.parameters["heart_rate"]["value_min"], self.delegate.heart_rate)
             self.pm.parameters["heart_rate"]["value_avg"] = self.delegate.heart_rate_avg
             self.measurement_time = self.delegate.measurement_time
             self.pm.parameters["heart_rate"]["value_max"] = max(self.pm.parameters["heart_rate"]["value_max"], self.delegate.heart_rate)
-            self.pm.parameters["heart_rate_notification_beat"]["value"] = self.delegate.heart_rate_notification_beat
+            self.pm.set_value("heart_rate_notification_beat", self.delegate.heart_rate_notification_beat)
             if self.pm.parameters["heart_rate_battery_level"]["value"] != self.battery_level:
-                self.pm.parameters["heart_rate_battery_level"]["value"] = self.battery_level
+                self.pm.set_value("heart_rate_battery_level", self.battery_level)
             if not math.isnan(self.pm.parameters["heart_rate"]["value"]):
                 self.kalman.update_unfiltered_value(self.pm.parameters["heart_rate_nof"]["value"])
                 self.kalman.update()
-                self.pm.parameters["heart_rate"]["value"] = self.kalman.value_estimate
+                self.pm.set_value("heart_rate", self.kalman.value_estimate)
         except (AttributeError) as exception:
             self.handle_exception(exception, "process_delegate_data")
         self.log.debug("heart rate = {} @ {}".format(self.pm.parameters["heart_rate"]["value"], time.strftime("%H:%M:%S", time.localtime(self.pm.parameters["heart_rate"]["time_stamp"]))), extra=self.extra)
@@ -71,7 +71,7 @@ class ble_hr(ble_sensor.ble_sensor):
         # BLE Scan end, consume results using editor_list
         if self.pm.parameters['ble_scan_done']['value'] and \
                 self.pm.parameters['ble_scan_results']['value'] == 'heart_rate':
-            self.pm.parameters['ble_scan_done']['value'] = False
+            self.pm.set_value('ble_scan_done', False)
             if self.pm.parameters['ble_scan_results']['data'] is not None:
                 self.set_up_editor()
             else:
@@ -83,9 +83,9 @@ class ble_hr(ble_sensor.ble_sensor):
                 data = self.pm.parameters["heart_rate_device_name"]["data"][1]
                 name = data['name']
                 self.device_name = name
-                self.pm.parameters["heart_rate_device_name"]["value"] = name
+                self.pm.set_value("heart_rate_device_name", name)
                 addr = data['addr']
-                self.pm.parameters["heart_rate_device_address"]["value"] = addr
+                self.pm.set_value("heart_rate_device_address", addr)
                 # FIXME - that might need to be passed to ble_sensor
                 #addr_type = data[1]['addr_type']
             except TypeError:
@@ -99,12 +99,12 @@ class ble_hr(ble_sensor.ble_sensor):
 
         # Set device as Disconnected if device address in None
         if self.device_address is None:
-            self.pm.parameters["heart_rate_device_name"]["value"] = 'Disconnected'
+            self.pm.set_value("heart_rate_device_name", 'Disconnected')
             self.device_name = 'Disconnected'
 
         # Update battery level, level read from physical sensor
         if self.pm.parameters["heart_rate_battery_level"]["value"] != self.battery_level:
-            self.pm.parameters["heart_rate_battery_level"]["value"] = self.battery_level
+            self.pm.set_value("heart_rate_battery_level", self.battery_level)
 
     def find_heart_rate_device(self):
         self.pm.plugins['ble_scanner'].find_ble_device('heart_rate')
@@ -40,39 +40,43 @@ class ble_sc(ble_sensor.ble_sensor):
     ## Process data delivered from delegate
     #  @param self The python object self
     def process_delegate_data(self):
+        cadence = self.pm.parameters["cadence"]
         if self.delegate.measurement_no <= 2:
             #Fresh start or restart after lost connection. Update average value in the delegate
-            self.delegate.cadence_avg = self.pm.parameters["cadence"]["value_avg"]
+            self.delegate.cadence_avg = cadence.value_avg
             self.measurement_time = self.delegate.measurement_time
-        if self.pm.parameters["cadence"]["reset"]:
+        if cadence.reset:
             #Reset by user, reset delegate data
             self.log.debug('reset request received', extra=self.extra)
             self.delegate.cadence = 0.0
             self.delegate.cadence_avg = 0.0
             self.delegate.measurement_time = 0.0
-            self.pm.parameters["cadence"]["reset"] = False
+            cadence.reset = False
         try:
-            self.pm.parameters["wheel_revolution_time"]["time_stamp"] = self.delegate.wheel_revolution_time_stamp
-            self.pm.parameters["wheel_revolution_time"]["value"] = self.delegate.wheel_revolution_time
-            self.log.debug('wheel_revolution_time {}'.format(self.pm.parameters["wheel_revolution_time"]["value"]), extra=self.extra)
+            wheel_revolution_time = self.pm.parameters["wheel_revolution_time"]
+            wheel_revolutions = self.pm.parameters["wheel_revolutions"]
+            wheel_revolution_time.time_stamp = self.delegate.wheel_revolution_time_stamp
+            wheel_revolution_time.value = self.delegate.wheel_revolution_time
+            self.log.debug('wheel_revolution_time {}'.format(wheel_revolution_time.value), extra=self.extra)
 
-            if self.pm.parameters["wheel_revolutions"]["value"] != self.delegate.wheel_revolutions:
+            if wheel_revolutions.value != self.delegate.wheel_revolutions:
+                odometer = self.pm.parameters["odometer"]
                 try:
-                    self.pm.parameters["odometer"]["value"] += (self.delegate.wheel_revolutions - self.pm.parameters["wheel_revolutions"]["value"]) \
-                        * self.pm.parameters["wheel_circumference"]["value"]
+                    odometer.value = odometer.value + (self.delegate.wheel_revolutions - wheel_revolutions.value) * \
+                        self.pm.parameters["wheel_circumference"].value
                 except TypeError:
                     pass
-                self.pm.parameters["wheel_revolutions"]["value"] = self.delegate.wheel_revolutions
-                self.log.debug('wheel_revolutions {}'.format(self.pm.parameters["wheel_revolutions"]["value"]), extra=self.extra)
+                wheel_revolutions.value = self.delegate.wheel_revolutions
+                self.log.debug('wheel_revolutions {}'.format(wheel_revolutions.value), extra=self.extra)
 
-            self.pm.parameters["cadence"]["time_stamp"] = self.delegate.cadence_time_stamp
-            self.pm.parameters["cadence"]["value"] = self.delegate.cadence
-            self.pm.parameters["cadence"]["value_avg"] = self.delegate.cadence_avg
+            cadence.time_stamp = self.delegate.cadence_time_stamp
+            cadence.value = self.delegate.cadence
+            cadence.value_avg = self.delegate.cadence_avg
             self.measurement_time = self.delegate.measurement_time
-            self.pm.parameters["cadence"]["value_max"] = max(self.pm.parameters["cadence"]["value_max"], self.delegate.cadence)
-            self.pm.parameters["cadence_notification_beat"]["value"] = self.delegate.cadence_notification_beat
-            if self.pm.parameters["cadence_speed_battery_level"]["value"] != self.battery_level:
-                self.pm.parameters["cadence_speed_battery_level"]["value"] = self.battery_level
+            cadence.value_max = max(cadence.value_max, self.delegate.cadence)
+            self.pm.parameters["cadence_notification_beat"].value = self.delegate.cadence_notification_beat
+            # Notification is sent only if the battery level changed
+            self.pm.parameters["cadence_speed_battery_level"].value = self.battery_level
         except (AttributeError) as exception:
             self.handle_exception(exception, "process_delegate_data")
 
@@ -80,7 +84,7 @@ class ble_sc(ble_sensor.ble_sensor):
         # BLE Scan end, consume results using editor_list
         if self.pm.parameters['ble_scan_done']['value'] and \
                 self.pm.parameters['ble_scan_results']['value'] == 'speed_cadence':
-            self.pm.parameters['ble_scan_done']['value'] = False
+            self.pm.set_value('ble_scan_done', False)
             self.set_up_editor()
 
         # Device name has been changed by editor
@@ -89,9 +93,9 @@ class ble_sc(ble_sensor.ble_sensor):
                 data = self.pm.parameters["cadence_speed_device_name"]["data"][1]
                 name = data['name']
                 self.device_name = name
-                self.pm.parameters["cadence_speed_device_name"]["value"] = name
+                self.pm.set_value("cadence_speed_device_name", name)
                 addr = data['addr']
-                self.pm.parameters["cadence_speed_device_address"]["value"] = addr
+                self.pm.set_value("cadence_speed_device_address", addr)
                 # FIXME - that might need to be passed to ble_sensor
                 #addr_type = data[1]['addr_type']
             except TypeError:
@@ -106,11 +110,11 @@ class ble_sc(ble_sensor.ble_sensor):
         # Set device as Disconnected if device address in None
         if self.device_address is None:
             self.device_name = 'Disconnected'
-            self.pm.parameters["cadence_speed_device_name"]["value"] = 'Disconnected'
+            self.pm.set_value("cadence_speed_device_name", 'Disconnected')
 
         # Update battery level, level read from physical sensor
         if self.pm.parameters["cadence_speed_battery_level"]["value"] != self.battery_level:
-            self.pm.parameters["cadence_speed_battery_level"]["value"] = self.battery_level
+            self.pm.set_value("cadence_speed_battery_level", self.battery_level)
 
     def find_cadence_speed_device(self):
         self.pm.plugins['ble_scanner'].find_ble_device('speed_cadence')
@@ -26,6 +26,9 @@ class ble_scanner(plugin.plugin):
     ## @var extra
     # Module name used for logging and prefixing data
     extra = {'module_name': __qualname__}
+    ## @var ANIMATION_SPRITE
+    # Sprite sheet with BLE scan animation frames
+    ANIMATION_SPRITE = 'images/ol_ble_scanning_sprite.png'
 
     ## The constructor
     #  @param self The python object self
@@ -92,10 +95,10 @@ class ble_scanner(plugin.plugin):
             self.ble_devices = sorted(devices, key=lambda k: k['rss'], reverse=True)
             self.pm.parameters['ble_scan_results']['data'] = self.ble_devices
         finally:
-            self.pm.parameters['ble_scan_results']['value'] = self.current_device_type
+            self.pm.set_value('ble_scan_results', self.current_device_type)
             self.current_device_type = None
             self.pm.parameters['ble_scan_results']['time_stamp'] = time.time()
-            self.pm.parameters['ble_scan_done']['value'] = True
+            self.pm.set_value('ble_scan_done', True)
             self.log.debug("scan finished", extra=self.extra)
             self.scan_in_progress = False
 
@@ -106,7 +109,7 @@ class ble_scanner(plugin.plugin):
             for pl in self.pm.plugins:
                 if self.pm.plugins[pl].connected:
                     connected += 1
-            self.pm.parameters['ble_no_of_devices_connected']['value'] = connected
+            self.pm.set_value('ble_no_of_devices_connected', connected)
             #self.log.debug("ble_no_of_devices_connected: {}".format(connected), extra=self.extra)
             if self.scan_in_progress:
                 self.ble_scan_animation_next_frame()
@@ -129,7 +132,7 @@ class ble_scanner(plugin.plugin):
             period = 2
             self.speed_cadence_device_found = False
         else:
-            next_ol_image = 'images/ol_ble_scanning_{}.png'.format(self.animation_frame)
+            next_ol_image = (self.ANIMATION_SPRITE, self.animation_frame_max + 1, self.animation_frame)
             period = 1
 
         if self.pm.event_queue is not None:
@@ -183,8 +186,7 @@ class ble_scanner(plugin.plugin):
 
     def preload_images(self):
         if self.pm.event_queue is not None:
-            images = ['images/ol_ble_scanning.png', 'images/ol_ble_hr_connected.png']
-            for af in range(self.animation_frame_max + 1):
-                images.append('images/ol_ble_scanning_{}.png'.format(af))
+            images = ['images/ol_ble_scanning.png', 'images/ol_ble_hr_connected.png',
+                      (self.ANIMATION_SPRITE, self.animation_frame_max + 1, 0)]
             for image in images:
                 self.pm.event_queue.put(('preload_image', image))
@@ -68,7 +68,7 @@ class bmp280(plugin.plugin):
             self.mean_sea_level_pressure = self.pm.parameters["mean_sea_level_pressure"]["value"]
             ra = self.calculate_altitude(self.pm.parameters['pressure']['value'])
             if ra is not None and not math.isnan(ra):
-                self.pm.parameters['reference_altitude']['value'] = ra
+                self.pm.set_value('reference_altitude', ra)
                 self.log.debug("reference_altitude recalculated to: {}".format(self.pm.parameters['reference_altitude']['value']), extra=self.extra)
                 # reference_altitude recalculation triggers notification, so ignore the next event
                 self.ignore_reference_altitude_change = True
@@ -92,7 +92,7 @@ class bmp280(plugin.plugin):
             with open('/sys/bus/iio/devices/iio:device0/in_temp_input', 'r') as temp:
                 # self.temperature is required for test files
                 self.temperature = float(temp.read()) / 1000.0
-                self.pm.parameters["temperature"]["value"] = self.temperature
+                self.pm.set_value("temperature", self.temperature)
         except (FileNotFoundError, OSError) as e:
             # FileNotFoundError: [Errno 2] No such file or directory: '/sys/bus/iio/devices/iio:device0/in_pressure_input'
             # OSError: [Errno 121] Remote I/O error
@@ -104,6 +104,11 @@ class bmp280(plugin.plugin):
     def run(self):
         self.log.debug("Main loop started", extra=self.extra)
         self.running = True
+        pressure = self.pm.parameters["pressure"]
+        pressure_nof = self.pm.parameters["pressure_nof"]
+        temperature = self.pm.parameters["temperature"]
+        altitude = self.pm.parameters["altitude"]
+        altitude_lock = self.pm.parameters["altitude_lock"]
         while self.running:
             self.measure()
             if self.mean_sea_level_pressure is not None:
@@ -111,27 +116,27 @@ class bmp280(plugin.plugin):
                     self.calculate_mean_sea_level_pressure()
 
             # MSL Pressure needs to be recalculated after every measurement in altitude-lock mode
-            if self.pm.parameters['altitude_lock']['value']:
+            if altitude_lock.value:
                 self.calculate_mean_sea_level_pressure()
 
             self.kalman.update_unfiltered_value(self.pressure_unfiltered)
             self.kalman.update()
             # self.pressure is required for test files
             self.pressure = self.kalman.value_estimate
-            self.pm.parameters["pressure"]["value"] = self.pressure
-            self.pm.parameters["pressure_nof"]["value"] = self.pressure_unfiltered
+            pressure.value = self.pressure
+            pressure_nof.value = self.pressure_unfiltered
 
-            if self.pm.parameters["altitude_lock"]["value"]:
-                self.pm.parameters['altitude']['value'] = self.pm.parameters['reference_altitude']['value']
+            if altitude_lock.value:
+                altitude.value = self.pm.parameters['reference_altitude'].value
             else:
-                self.pm.parameters['altitude']['value'] = self.calculate_altitude(self.pm.parameters['pressure']['value'])
+                altitude.value = self.calculate_altitude(pressure.value)
 
-            self.log.debug("pressure = {} [Pa], temperature = {} [C]".format(self.pm.parameters["pressure"]["value"], self.pm.parameters["temperature"]["value"]), extra=self.extra)
+            self.log.debug("pressure = {} [Pa], temperature = {} [C]".format(pressure.value, temperature.value), extra=self.extra)
             try:
-                self.pm.parameters["pressure"]["value_min"] = min(self.pm.parameters["pressure"]["value"], self.pm.parameters["pressure"]["value_min"])
-                self.pm.parameters["pressure"]["value_max"] = max(self.pm.parameters["pressure"]["value"], self.pm.parameters["pressure"]["value_max"])
-                self.pm.parameters["temperature"]["value_min"] = min(self.pm.parameters["temperature"]["value"], self.pm.parameters["temperature"]["value_min"])
-                self.pm.parameters["temperature"]["value_max"] = max(self.pm.parameters["temperature"]["value"], self.pm.parameters["temperature"]["value_max"])
+                pressure.value_min = min(pressure.value, pressure.value_min)
+                pressure.value_max = max(pressure.value, pressure.value_max)
+                temperature.value_min = min(temperature.value, temperature.value_min)
+                temperature.value_max = max(temperature.value, temperature.value_max)
                 # Some variables are not initialised when run in test mode, so ignore the error
             except TypeError:
                 pass
@@ -163,7 +168,7 @@ class bmp280(plugin.plugin):
                 self.mean_sea_level_pressure = num.NAN
         except TypeError:
             pass
-        self.pm.parameters['mean_sea_level_pressure']['value'] = self.mean_sea_level_pressure
+        self.pm.set_value('mean_sea_level_pressure', self.mean_sea_level_pressure)
         self.log.debug("mean_sea_level_pressure: {}".format(self.mean_sea_level_pressure), extra=self.extra)
 
     ## Calculates altitude based on mean_sea_level_pressure and given pressure
@@ -35,14 +35,14 @@ class compute(plugin.plugin):
             t = time.time()
             # Check if there was a reset of session time
             if math.isnan(self.pm.parameters["session_time"]["value"]):
-                self.pm.parameters["session_start_time"]["value"] = t
+                self.pm.set_value("session_start_time", t)
 
             session_time = t - self.pm.parameters["session_start_time"]["value"]
             session_time_delta = session_time - self.pm.parameters["session_time"]["value"]
             if abs(session_time_delta) > 2.0:
                 self.log.warning("Session time change bigger than 2s ({:.3f} s), assuming system time change.".format(session_time_delta), extra=self.extra)
-                self.pm.parameters["session_start_time"]["value"] += session_time_delta
-            self.pm.parameters["session_time"]["value"] = t - self.pm.parameters["session_start_time"]["value"]
-            self.pm.parameters["real_time"]["value"] = t
+                self.pm.set_value("session_start_time", self.pm.parameters["session_start_time"]["value"] + session_time_delta)
+            self.pm.set_value("session_time", t - self.pm.parameters["session_start_time"]["value"])
+            self.pm.set_value("real_time", t)
             time.sleep(0.1)
         self.log.debug("Main loop finished", extra=self.extra)
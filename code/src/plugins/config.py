@@ -73,7 +73,7 @@ class config(plugin.plugin):
             self.log.setLevel('DEBUG')
         try:
             if self.pm.parameters['write_config_requested']['value']:
-                self.pm.parameters['write_config_requested']['value'] = False
+                self.pm.set_value('write_config_requested', False)
                 self.write_config()
         except KeyError:
             pass
@@ -110,12 +110,13 @@ class config(plugin.plugin):
     def write_config(self):
         self.log.debug("Writing config file started", extra=self.extra)
         storage = {}
-        for p in self.pm.parameters:
-            if self.pm.parameters[p]['store']:
+        frame = self.pm.snapshot()
+        for p in frame:
+            if frame[p]['store']:
                 storage[p] = {}
-                for f in self.pm.parameters[p]:
+                for f in frame[p]:
                     if f not in self.filter_out_fields:
-                        storage[p][f] = self.pm.parameters[p][f]
+                        storage[p][f] = frame[p][f]
                         if type(storage[p][f]) == tuple:
                             self.log.debug("Tuple detected as {} in {}. Setting to None as pyyaml can't handle loading it".format(f, p), extra=self.extra)
                             storage[p][f] = None
@@ -2,10 +2,10 @@
 # -*- coding: utf-8 -*-
 ## @package data_log
 #  Module for handling ride parameters logging to file
-import datetime
 import logging
 import logging.handlers
 from helpers import num
+import helpers
 import plugin
 import threading
 import time
@@ -26,6 +26,9 @@ class data_log(plugin.plugin):
         self.pm.register_parameter("data_log_period", self.extra["module_name"], value=1.0, raw_unit='s', store=True)
         self.pm.request_parameter("real_time", self.extra["module_name"])
         self.last_log_entry = 0.0
+        ## @var uc
+        #  Handle of unit_converter, used for columns with unit
+        self.uc = helpers.unit_converter()
         self.pm.request_parameter("data_log_config", self.extra["module_name"])
         try:
             self.data_log_config = self.pm.parameters['data_log_config']['value']
@@ -68,6 +71,8 @@ class data_log(plugin.plugin):
         data_log_format = ''
         self.ex = dict()
         self.parameter_format = dict()
+        self.parameter_unit = dict()
+        self.conversions = dict()
         self.parameters = dict()
         for i in self.config_params['columns']:
             try:
@@ -86,9 +91,15 @@ class data_log(plugin.plugin):
                 string_format = i['format']
             except KeyError:
                 string_format = '%.1f'
+            try:
+                unit = i['unit']
+            except KeyError:
+                # Log value in raw unit
+                unit = None
 
             data_log_format += '%(' + name + ')-12s,'
-            self.parameter_format[name] = string_format
+            self.parameter_format[name] = helpers.formatter(string_format)
+            self.parameter_unit[name] = unit
             self.parameters[name] = parameter
             self.ex[name] = description
 
@@ -117,48 +128,33 @@ class data_log(plugin.plugin):
         except KeyError:
             pass
 
+    ## Returns value converted to the unit of a column. Conversion is cached for each column.
+    #  @param self The python object self
+    #  @param name Column name
+    #  @param value Parameter value
+    #  @param raw_unit Parameter raw unit
+    def convert(self, name, value, raw_unit):
+        conversion = self.conversions.get(name)
+        if conversion is None or conversion.source_unit != raw_unit:
+            conversion = self.uc.get_conversion(raw_unit, self.parameter_unit[name])
+            self.conversions[name] = conversion
+        return conversion.convert(value)
+
     ## Function responsible for formatting and adding entries to ride log
     #  @param self The python object self
     def add_entry(self):
         self.log.debug("Adding ride log entry", extra=self.extra)
+        frame = self.pm.snapshot()
         for name in self.ex:
             try:
                 parameter = self.parameters[name]
-                value = self.pm.parameters[parameter]["value"]
+                value = frame[parameter]["value"]
             except KeyError:
                 self.log.debug("There is no {} in available paameters".format(name), extra=self.extra)
                 continue
-            string_format = self.parameter_format[name]
-            if string_format == "hhmmss.s":
-                try:
-                    minutes, seconds = divmod(value, 60)
-                    hours, minutes = divmod(minutes, 60)
-                    value = "{:02.0f}:{:02.0f}:{:02.1f}".format(hours, minutes, seconds)
-                except (TypeError, ValueError):
-                    pass
-            elif string_format == "hhmmss":
-                try:
-                    minutes, seconds = divmod(value, 60)
-                    hours, minutes = divmod(minutes, 60)
-                    value = "{:02.0f}:{:02.0f}:{:02.0f}".format(hours, minutes, seconds)
-                except (TypeError, ValueError):
-                    pass
-            elif string_format == "time":
-                try:
-                    value = datetime.datetime.fromtimestamp(int(value)).strftime('%H:%M:%S')
-                except (TypeError, ValueError):
-                    pass
-            elif string_format == "date":
-                try:
-                    value = datetime.datetime.fromtimestamp(int(value)).strftime('%Y-%m-%d')
-                except (ValueError, TypeError):
-                    pass
-            else:
-                try:
-                    value = string_format % value
-                except (ValueError, TypeError):
-                    pass
-            self.ex[name] = num.sanitise(value)
+            if self.parameter_unit[name] is not None:
+                value = self.convert(name, value, frame[parameter]['raw_unit'])
+            self.ex[name] = num.sanitise(self.parameter_format[name](value))
         self.data_logger.info('', extra=self.ex)
         # Schedule next data entry event
         if self.running:
@@ -49,9 +49,9 @@ class ds18b20(plugin.plugin):
         self.running = True
         while self.running:
             if self.pm.parameters['data_log_period']['value'] != 5:
-                self.pm.parameters["data_log_period"]['value'] = 5
+                self.pm.set_value("data_log_period", 5)
             self.measure()
-            self.pm.parameters['external_temperature']['value'] = self.temperature
+            self.pm.set_value('external_temperature', self.temperature)
             self.log.debug("ds18b20 temperature: {}".format(self.temperature), extra=self.extra)
             time.sleep(self.measurement_delay)
         self.log.debug("Main loop finished", extra=self.extra)
@@ -200,12 +200,13 @@ class editor(plugin.plugin):
         if self.fields["editor"] == "editor_numbers":
             unit_raw = self.pm.parameters[parameter]["raw_unit"]
             value = self.uc.convert(float(parameter_value), parameter_unit, unit_raw)
-            self.pm.parameters[parameter]["value"] = float(value)
+            self.pm.set_value(parameter, float(value))
         if self.fields["editor"] == "editor_string" or \
                 self.fields["editor"] == "editor_list":
-            self.pm.parameters[parameter]["value"] = parameter_value
             self.pm.parameters[parameter]["data"] = parameter_data
-            self.pm.parameters[parameter]["force_notification"] = True
+            self.pm.set_value(parameter, parameter_value)
+            # Notify even if the same value has been selected again
+            self.pm.force_notification(parameter)
         self.pm.parameters[parameter]["time_stamp"] = time.time()
         self.log.debug("accept_edit finished", extra=self.extra)
         self.fields = None
@@ -3,7 +3,9 @@
 #  Rendering module in GTK window
 
 import cairo
+import frame_buffers
 import plugin
+import startup_profiler
 import time
 import threading
 
@@ -18,7 +20,7 @@ class gtk_rendering(plugin.plugin):
     # Module name used for logging and prefixing data
     extra = {'module_name': __qualname__}
     ## @var FPS
-    #  Desired FPS, very innacurate
+    #  Maximum FPS
     FPS = 10.0
 
     ## The constructor
@@ -44,10 +46,14 @@ class gtk_rendering(plugin.plugin):
         ## @var running
         #  Variable controlling if rendering module should keep running
         self.running = False
-        ## @var fps
-        #  Variable controlling numver of frames per second
-        self.fps = self.FPS
+        ## @var scheduler
+        #  Frame scheduler, wakes up the main loop when layout has a new frame ready
+        self.scheduler = self.pm.render['scheduler']
+        self.scheduler.max_fps = self.FPS
         self.cairo_initialised = False
+        ## @var first_frame_painted
+        #  Set to True after the first frame has been painted, used by startup profiler
+        self.first_frame_painted = False
         self.setup_cairo()
 
     ## Notification handler
@@ -75,11 +81,9 @@ class gtk_rendering(plugin.plugin):
             self.ctx = self.drawing_area.get_window().cairo_create()
             # Window surface
             s = self.ctx.get_target()
-            # Soft framebuffer surface
-            self.surface_buf = cairo.ImageSurface.create_similar(s, cairo.CONTENT_COLOR, self.width, self.height)
-            # Soft framebuffer context
-            self.ctx_buffer = cairo.Context(self.surface_buf)
-            self.pm.register_cairo_context(self.extra['module_name'], self.ctx_buffer)
+            # Soft framebuffer surfaces, layout draws into one while the last complete frame is copied from another
+            self.buffers = frame_buffers.frame_buffers(s, self.width, self.height, self.scheduler)
+            self.pm.register_frame_buffers(self.extra['module_name'], self.buffers)
             self.cairo_initialised = True
             Gdk.threads_init()
             threading.Thread(target=Gtk.main).start()
@@ -91,41 +95,48 @@ class gtk_rendering(plugin.plugin):
                     self.height is not None and
                     not self.cairo_initialised):
                 self.setup_cairo()
-            if self.pm.render['refresh'] and not self.pm.render['hold']:
-                self.pm.render['hold'] = True
-                self.pm.render['refresh'] = False
-                Gdk.threads_enter()
-                try:
-                    self.ctx.set_source_surface(self.surface_buf, 0, 0)
-                    self.ctx.rectangle(0, 0, self.width, self.height)
-                    self.ctx.fill()
-                except cairo.Error as e:
-                    #Exception in thread None:
-                    #Traceback (most recent call last):
-                    #  File "/usr/lib64/python3.6/threading.py", line 916, in _bootstrap_inner
-                    #    self.run()
-                    #  File "/home/przemo/software/occ/OpenCyclingComputer/Open-Cycling-Computer/code/src/plugins/gtk_rendering.py", line 102, in run
-                    #    self.ctx.fill()
-                    #cairo.Error: the target surface has been finished
-                    if e == 'the target surface has been finished':
-                        self.log.critical('The target surface no longer exist.', extra=self.extra)
-                        self.running = False
-                self.drawing_area.queue_draw()
-                Gdk.threads_leave()
-                self.pm.render['hold'] = False
-                try:
-                    if self.pm.parameters['screenshot_mode']['value']:
-                        self.fb_surface.write_to_png("sc_" + str(round(time.time())) + ".png")
-                        self.fps = 1.0
-                    else:
-                        self.fps = self.FPS
-                except KeyError:
-                    pass
-            #FIXME Set up scheduler instead of waiting
-            time.sleep(1.0 / self.fps)
+            if not self.scheduler.wait_for_frame():
+                continue
+            surface, damage = self.buffers.take()
+            if surface is None:
+                continue
+            Gdk.threads_enter()
+            try:
+                self.ctx.set_source_surface(surface, 0, 0)
+                self.ctx.rectangle(0, 0, self.width, self.height)
+                self.ctx.fill()
+            except cairo.Error as e:
+                #Exception in thread None:
+                #Traceback (most recent call last):
+                #  File "/usr/lib64/python3.6/threading.py", line 916, in _bootstrap_inner
+                #    self.run()
+                #  File "/home/przemo/software/occ/OpenCyclingComputer/Open-Cycling-Computer/code/src/plugins/gtk_rendering.py", line 102, in run
+                #    self.ctx.fill()
+                #cairo.Error: the target surface has been finished
+                if e == 'the target surface has been finished':
+                    self.log.critical('The target surface no longer exist.', extra=self.extra)
+                    self.running = False
+            self.drawing_area.queue_draw()
+            Gdk.threads_leave()
+            self.buffers.release()
+            self.scheduler.frame_done()
+            if not self.first_frame_painted:
+                self.first_frame_painted = True
+                profiler = startup_profiler.startup_profiler()
+                profiler.instant("first frame painted", 'rendering')
+                profiler.finish()
+            try:
+                if self.pm.parameters['screenshot_mode']['value']:
+                    self.fb_surface.write_to_png("sc_" + str(round(time.time())) + ".png")
+                    self.scheduler.max_fps = 1.0
+                else:
+                    self.scheduler.max_fps = self.FPS
+            except KeyError:
+                pass
 
     def stop(self):
         self.running = False
+        self.scheduler.wake()
 
     def __del__(self):
         self.stop()
@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+## @package headless_rendering
+#  Offscreen rendering module. Frames are rendered into memory, so layout can be run and profiled without a display.
+#  Every Nth frame can be written to a PNG or raw (cairo ARGB32 data) file.
+
+import cairo
+import collections
+import frame_buffers
+from helpers import num
+import os
+import plugin
+import startup_profiler
+import time
+
+
+## Offscreen rendering class
+class headless_rendering(plugin.plugin):
+    ## @var extra
+    # Module name used for logging and prefixing data
+    extra = {'module_name': __qualname__}
+    ## @var FPS
+    #  Maximum FPS
+    FPS = 10.0
+    ## @var SAMPLES
+    #  Number of the last frames used to calculate render time statistics
+    SAMPLES = 1000
+
+    ## The constructor
+    #  @param self The python object self
+    def __init__(self):
+        # Run init for super class
+        super().__init__()
+        ## @var width
+        #  Window/screen width
+        try:
+            self.width = self.pm.parameters['display_size']['value'][0]
+        except KeyError:
+            self.log.critical('headless_rendering init failed on display_size', extra=self.extra)
+            raise
+        ## @var height
+        #  Window/screen height
+        try:
+            self.height = self.pm.parameters['display_size']['value'][1]
+        except KeyError:
+            self.log.critical('headless_rendering init failed on display_size', extra=self.extra)
+            raise
+        self.pm.register_parameter("headless_dump_every", self.extra["module_name"], value=0)
+        self.pm.register_parameter("headless_dump_format", self.extra["module_name"], value='png')
+        self.pm.register_parameter("headless_dump_dir", self.extra["module_name"], value='log/frames')
+        self.pm.register_parameter("headless_render_time", self.extra["module_name"], value=num.NAN, raw_unit='s')
+        self.pm.register_parameter("headless_render_stats", self.extra["module_name"], value={})
+        ## @var running
+        #  Variable controlling if rendering module should keep running
+        self.running = False
+        ## @var scheduler
+        #  Frame scheduler, wakes up the main loop when layout has a new frame ready
+        self.scheduler = self.pm.render['scheduler']
+        self.scheduler.max_fps = self.FPS
+        ## @var render_times
+        #  Render times in seconds of the last SAMPLES frames
+        self.render_times = collections.deque(maxlen=self.SAMPLES)
+        ## @var frames
+        #  Number of rendered frames
+        self.frames = 0
+        self.cairo_initialised = False
+        ## @var first_frame_painted
+        #  Set to True after the first frame has been painted, used by startup profiler
+        self.first_frame_painted = False
+        self.setup_cairo()
+
+    ## Notification handler
+    #  @param self The python object self
+    def notification(self):
+        self.log.debug('notification received', extra=self.extra)
+        if (self.width, self.height) != self.pm.parameters['display_size']['value'] and \
+                not self.cairo_initialised:
+            self.width, self.height = self.pm.parameters['display_size']['value']
+            self.setup_cairo()
+
+    ## Prepare cairo surfaces and contexts
+    #  @param self The python object self
+    def setup_cairo(self):
+        if self.width is not None and self.height is not None and not self.cairo_initialised:
+            # Surface used only to create similar buffers
+            self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height)
+            self.buffers = frame_buffers.frame_buffers(self.surface, self.width, self.height, self.scheduler)
+            self.pm.register_frame_buffers(self.extra['module_name'], self.buffers)
+            # Overlay cairo drawing surface
+            self.overlay_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height)
+            # Overlay cairo context
+            self.overlay_ctx = cairo.Context(self.overlay_surface)
+            self.pm.register_cairo_overlay(self.extra['module_name'], self.overlay_ctx)
+            self.cairo_initialised = True
+
+    def run(self):
+        self.running = True
+        while self.running:
+            if self.width is not None and \
+                    self.height is not None and \
+                    not self.cairo_initialised:
+                self.setup_cairo()
+            if not self.scheduler.wait_for_frame():
+                continue
+            surface, damage = self.buffers.take()
+            if surface is None:
+                continue
+            render_time = self.buffers.get_render_time()
+            self.frames += 1
+            self.render_times.append(render_time)
+            self.pm.set_value('headless_render_time', render_time)
+            dump_every = self.pm.parameters['headless_dump_every']['value']
+            if dump_every and self.frames % dump_every == 0:
+                self.dump_frame(surface)
+            self.buffers.release()
+            self.scheduler.frame_done()
+            if not self.first_frame_painted:
+                self.first_frame_painted = True
+                profiler = startup_profiler.startup_profiler()
+                profiler.instant("first frame painted", 'rendering')
+                profiler.finish()
+            if self.frames % self.SAMPLES == 0:
+                self.update_render_stats()
+
+    ## Writes frame to a file in headless_dump_dir. Format is set by headless_dump_format: 'png' or 'raw' (cairo ARGB32
+    #  data, stride is width * 4).
+    #  @param self The python object self
+    #  @param surface Surface with the frame
+    def dump_frame(self, surface):
+        dump_dir = self.pm.parameters['headless_dump_dir']['value']
+        dump_format = self.pm.parameters['headless_dump_format']['value']
+        file_name = os.path.join(dump_dir, "frame_{:06d}.{}".format(self.frames, dump_format))
+        try:
+            os.makedirs(dump_dir, exist_ok=True)
+            if dump_format == 'raw':
+                surface.flush()
+                with open(file_name, 'wb') as f:
+                    f.write(surface.get_data())
+            else:
+                surface.write_to_png(file_name)
+        except (IOError, OSError, cairo.Error) as e:
+            self.log.error("Writing frame {} failed with: {}".format(file_name, e), extra=self.extra)
+
+    ## Returns dict with render time statistics in seconds: number of frames, mean, median, 95th percentile and maximum
+    #  @param self The python object self
+    def get_render_stats(self):
+        times = list(self.render_times)
+        if times:
+            mean = sum(times) / len(times)
+            maximum = max(times)
+        else:
+            mean = num.NAN
+            maximum = num.NAN
+        return dict(frames=self.frames, mean=mean, p50=num.percentile(times, 0.5), p95=num.percentile(times, 0.95), max=maximum)
+
+    ## Updates headless_render_stats parameter
+    #  @param self The python object self
+    def update_render_stats(self):
+        self.pm.set_value('headless_render_stats', self.get_render_stats())
+
+    def stop(self):
+        if self.running:
+            self.update_render_stats()
+            self.log.info("Render time stats: {}".format(self.get_render_stats()), extra=self.extra)
+        self.running = False
+        self.scheduler.wake()
+
+    def __del__(self):
+        self.stop()
@@ -30,8 +30,8 @@ class json_server(plugin.plugin):
         @bottle.get('/')
         def serve_json():
             s = {}
-            for p in self.pm.parameters:
-                s[p] = self.pm.parameters[p]['value']
+            for p, fields in self.pm.snapshot().items():
+                s[p] = fields['value']
                 try:
                     if s[p] is None:
                         s[p] = 'None'
@@ -44,7 +44,7 @@ class lipo_shim(plugin.plugin):
                     self.log.debug('Battery status: low', extra=self.extra)
                 else:
                     self.log.debug('Battery status: OK', extra=self.extra)
-                self.pm.parameters['battery_low']['value'] = self.battery_low
+                self.pm.set_value('battery_low', self.battery_low)
                 if self.pm.event_queue is not None and self.battery_low:
                     self.pm.event_queue.put(('show_overlay', self.battery_low_overlay_image))
             time.sleep(1.0)
@@ -3,8 +3,10 @@
 #  Rendering module for piTFT
 
 import cairo
+import frame_buffers
 import mmap
 import plugin
+import startup_profiler
 import time
 
 
@@ -14,7 +16,7 @@ class pitft_rendering(plugin.plugin):
     # Module name used for logging and prefixing data
     extra = {'module_name': __qualname__}
     ## @var FPS
-    #  Desired FPS, very innacurate
+    #  Maximum FPS
     FPS = 10.0
 
     ## The constructor
@@ -40,10 +42,20 @@ class pitft_rendering(plugin.plugin):
         ## @var running
         #  Variable controlling if rendering module should keep running
         self.running = False
-        ## @var fps
-        #  Variable controlling numver of frames per second
-        self.fps = self.FPS
+        ## @var scheduler
+        #  Frame scheduler, wakes up the main loop when layout has a new frame ready
+        self.scheduler = self.pm.render['scheduler']
+        self.scheduler.max_fps = self.FPS
+        ## @var rgb565
+        #  If True layout renders directly into RGB565 buffers, frames are copied to the framebuffer without conversion
+        try:
+            self.rgb565 = self.pm.parameters['rgb565_rendering']['value']
+        except KeyError:
+            self.rgb565 = False
         self.cairo_initialised = False
+        ## @var first_frame_painted
+        #  Set to True after the first frame has been painted, used by startup profiler
+        self.first_frame_painted = False
         self.setup_cairo()
 
     ## Notification handler
@@ -64,15 +76,15 @@ class pitft_rendering(plugin.plugin):
             self.fb_map = mmap.mmap(self.fb_fd.fileno(), PiTFT_mem_size)
             # Framebuffer surface
             self.fb_surface = cairo.ImageSurface.create_for_data(self.fb_map, cairo.FORMAT_RGB16_565, self.width, self.height)
-            # Main cairo drawing surface
-            self.surface = cairo.ImageSurface.create_similar(self.fb_surface, cairo.CONTENT_COLOR_ALPHA, self.width, self.height)
             # Framebuffer context
             self.fb_ctx = cairo.Context(self.fb_surface)
-            # Main cairo context
-            self.ctx = cairo.Context(self.surface)
-            self.ctx.set_source_rgba(0.0, 0.0, 0.0, 1.0)
-            self.ctx.paint()
-            self.pm.register_cairo_context(self.extra['module_name'], self.ctx)
+            # Main cairo drawing surfaces, layout draws into one while the last complete frame is copied from another
+            if self.rgb565:
+                self.log.debug('Using RGB565 frame buffers', extra=self.extra)
+                self.buffers = frame_buffers.frame_buffers(self.fb_surface, self.width, self.height, self.scheduler, cairo.FORMAT_RGB16_565)
+            else:
+                self.buffers = frame_buffers.frame_buffers(self.fb_surface, self.width, self.height, self.scheduler)
+            self.pm.register_frame_buffers(self.extra['module_name'], self.buffers)
             # Overlay cairo drawing surface
             self.overlay_surface = cairo.ImageSurface.create_similar(self.fb_surface, cairo.CONTENT_COLOR_ALPHA, self.width, self.height)
             # Overlay cairo context
@@ -89,27 +101,83 @@ class pitft_rendering(plugin.plugin):
                     self.height is not None and \
                     not self.cairo_initialised:
                 self.setup_cairo()
-            if self.pm.render['refresh'] and not self.pm.render['hold']:
-                self.pm.render['hold'] = True
-                self.fb_ctx.set_source_surface(self.surface, 0, 0)
-                self.fb_ctx.paint()
-                self.fb_ctx.set_source_surface(self.overlay_surface, 0, 0)
-                self.fb_ctx.paint_with_alpha(0.9)
-                self.pm.render['refresh'] = False
-                self.pm.render['hold'] = False
-                try:
-                    if self.pm.parameters['screenshot_mode']['value']:
-                        self.fb_surface.write_to_png("sc_" + str(round(time.time())) + ".png")
-                        self.fps = 1.0
-                    else:
-                        self.fps = self.FPS
-                except KeyError:
-                    pass
-            #FIXME Set up scheduler instead of waiting
-            time.sleep(1.0 / self.fps)
+            if not self.scheduler.wait_for_frame():
+                continue
+            surface, damage = self.buffers.take()
+            if surface is None:
+                continue
+            self.copy_to_framebuffer(surface, damage)
+            self.buffers.release()
+            self.scheduler.frame_done()
+            if not self.first_frame_painted:
+                self.first_frame_painted = True
+                profiler = startup_profiler.startup_profiler()
+                profiler.instant("first frame painted", 'rendering')
+                profiler.finish()
+            try:
+                if self.pm.parameters['screenshot_mode']['value']:
+                    self.fb_surface.write_to_png("sc_" + str(round(time.time())) + ".png")
+                    self.scheduler.max_fps = 1.0
+                else:
+                    self.scheduler.max_fps = self.FPS
+            except KeyError:
+                pass
+
+    ## Composites frame surface and overlay onto the framebuffer. Only damaged rectangles are copied and converted to RGB565.
+    #  RGB565 frames without visible overlay are copied without conversion, see memcpy_to_framebuffer.
+    #  @param self The python object self
+    #  @param surface Surface with the frame, returned by frame_buffers.take
+    #  @param damage List with damaged rectangles (x, y, w, h), None means the whole screen
+    def copy_to_framebuffer(self, surface, damage):
+        if damage is None:
+            damage = [(0, 0, self.width, self.height)]
+        elif not damage:
+            return
+        if self.rgb565 and not self.pm.overlay['visible'] and surface.get_stride() == self.fb_surface.get_stride():
+            self.memcpy_to_framebuffer(self.fb_map, surface, damage)
+        elif self.pm.overlay['visible']:
+            self.paint_to_framebuffer(self.fb_ctx, surface, damage, self.overlay_surface)
+        else:
+            # Fully transparent overlay doesn't change anything
+            self.paint_to_framebuffer(self.fb_ctx, surface, damage)
+
+    ## Paints damaged rectangles of a frame surface and optional overlay with cairo, converting them to the framebuffer
+    #  format. Used by copy_to_framebuffer and tests/benchmark_rgb565.py.
+    #  @param fb_ctx Cairo context of the framebuffer surface
+    #  @param surface Surface with the frame
+    #  @param damage List with damaged rectangles (x, y, w, h)
+    #  @param overlay_surface Overlay surface painted over the frame, None if overlay is not visible
+    @staticmethod
+    def paint_to_framebuffer(fb_ctx, surface, damage, overlay_surface=None):
+        fb_ctx.save()
+        for r in damage:
+            fb_ctx.rectangle(*r)
+        fb_ctx.clip()
+        fb_ctx.set_source_surface(surface, 0, 0)
+        fb_ctx.paint()
+        if overlay_surface is not None:
+            fb_ctx.set_source_surface(overlay_surface, 0, 0)
+            fb_ctx.paint_with_alpha(0.9)
+        fb_ctx.restore()
+
+    ## Copies rows covered by damaged rectangles from RGB565 frame surface to the framebuffer memory. Copying whole rows
+    #  makes it one copy per rectangle. Used by copy_to_framebuffer and tests/benchmark_rgb565.py.
+    #  @param fb_map Framebuffer memory, mmap or bytearray with the same stride as the surface
+    #  @param surface RGB565 surface with the frame
+    #  @param damage List with damaged rectangles (x, y, w, h)
+    @staticmethod
+    def memcpy_to_framebuffer(fb_map, surface, damage):
+        surface.flush()
+        data = surface.get_data()
+        stride = surface.get_stride()
+        for x, y, w, h in damage:
+            start = y * stride
+            end = (y + h) * stride
+            fb_map[start:end] = data[start:end]
 
     def stop(self):
         self.running = False
+        self.scheduler.wake()
 
     def __del__(self):
         self.stop()
@@ -43,7 +43,7 @@ class syscalls(plugin.plugin):
     def quit(self):
         pm = pyplum.pyplum()
         # Stop pyplum
-        pm.parameters['quit']['value'] = True
+        pm.set_value('quit', True)
         # Stop events
         if pm.event_queue is not None:
             pm.event_queue.put(('quit',))
@@ -59,7 +59,7 @@ class syscalls(plugin.plugin):
             log_level = 10
         log_level_name = logging.getLevelName(log_level)
         try:
-            pm.parameters['log_level']['value'] = log_level_name
+            pm.set_value('log_level', log_level_name)
         except KeyError:
             pass
 
@@ -74,7 +74,7 @@ class syscalls(plugin.plugin):
             if 'screenshot_mode' not in pm.parameters:
                 pm.register_parameter('screenshot_mode', self.extra['module_name'], value=True)
             else:
-                pm.parameters['screenshot_mode']['value'] = not pm.parameters['screenshot_mode']['value']
+                pm.set_value('screenshot_mode', not pm.parameters['screenshot_mode']['value'])
         except KeyError:
             pass
 
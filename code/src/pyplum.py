@@ -3,14 +3,298 @@
 #  Sensors module. Responsible for connecting to, starting and stopping plugins.
 
 #from bluepy.btle import BTLEException
-import copy
+import collections
 import importlib
+import itertools
 import logging
 import math
+import operator
 from helpers import num
+import render_scheduler
 import singleton
+import startup_profiler
 import threading
 import time
+import yaml
+
+
+## Returns property for a parameter field stored in slot '_' + name. Writing the field calls on_field_change, so i.e.
+#  value_max written by a plugin is visible in the next snapshot. Only fields written by plugins on every update use it,
+#  other fields are written as dict items or with update.
+#  @param name Name of the field
+def tracked_field(name):
+    slot = '_' + name
+
+    def set_field(self, content):
+        setattr(self, slot, content)
+        if self.on_field_change is not None:
+            self.on_field_change(self.name)
+    return property(operator.attrgetter(slot), set_field)
+
+
+## Class holding a single parameter registered with pyplum. Fields are accessible as attributes, i.e. p.value_max
+#  or, for layouts and config file, as dict items, i.e. p['value_max']. Changing the value calls on_change callback,
+#  changing any other field as dict item, with update or, for tracked fields, as attribute calls on_field_change callback.
+class parameter():
+    ## @var FIELDS
+    # Names of the parameter fields. See pyplum.register_parameter for the description
+    FIELDS = ('plugin_name', 'time_stamp', 'value', 'value_min', 'value_avg', 'value_max', 'value_default', 'value_list',
+              'data', 'raw_unit', 'unit', 'units_allowed', 'required_by', 'store', 'reset')
+    ## @var SLOTS
+    # Slot holding each field. Value and tracked fields, see tracked_field, are held in slots prefixed with '_'.
+    SLOTS = dict(zip(FIELDS, ('plugin_name', '_time_stamp', '_value', '_value_min', '_value_avg', '_value_max', 'value_default', 'value_list',
+                              'data', 'raw_unit', 'unit', 'units_allowed', 'required_by', 'store', '_reset')))
+    __slots__ = ('name', 'on_change', 'on_field_change', 'plugin_name', '_time_stamp', '_value', '_value_min', '_value_avg', '_value_max',
+                 'value_default', 'value_list', 'data', 'raw_unit', 'unit', 'units_allowed', 'required_by', 'store', '_reset')
+
+    ## The constructor
+    #  @param self The python object self
+    #  @param name Name of the parameter
+    #  @param on_change Function called with the parameter name when the value changes
+    #  @param on_field_change Function called with the parameter name when other fields are changed
+    def __init__(self, name, on_change=None, on_field_change=None, plugin_name=None, time_stamp=0.0, value=None, value_min=num.INF, value_avg=num.NAN,
+                 value_max=num.INF_MIN, value_default=None, value_list=None, data=None, raw_unit=None, unit=None,
+                 units_allowed=None, required_by=None, store=False, reset=False):
+        self.name = name
+        self.on_change = on_change
+        self.on_field_change = on_field_change
+        self.plugin_name = plugin_name
+        self._time_stamp = time_stamp
+        self._value = value
+        self._value_min = value_min
+        self._value_avg = value_avg
+        self._value_max = value_max
+        self.value_default = value_default
+        self.value_list = value_list
+        self.data = data
+        self.raw_unit = raw_unit
+        self.unit = unit
+        self.units_allowed = units_allowed
+        self.required_by = required_by
+        self.store = store
+        self._reset = reset
+
+    time_stamp = tracked_field('time_stamp')
+    value_min = tracked_field('value_min')
+    value_avg = tracked_field('value_avg')
+    value_max = tracked_field('value_max')
+    reset = tracked_field('reset')
+
+    @property
+    def value(self):
+        return self._value
+
+    ## Sets value and calls on_change if the value is different from the previous one
+    #  @param self The python object self
+    #  @param value New value of the parameter
+    @value.setter
+    def value(self, value):
+        previous_value = self._value
+        self._value = value
+        if self.on_change is not None and not self.values_equal(previous_value, value):
+            self.on_change(self.name)
+
+    ## Compares two values of a parameter. nan is treated as equal to nan.
+    #  @param value_a First value
+    #  @param value_b Second value
+    @staticmethod
+    def values_equal(value_a, value_b):
+        try:
+            if value_a == value_b:
+                return True
+            return math.isnan(value_a) and math.isnan(value_b)
+        except TypeError:
+            # TypeError on NoneType or not float type
+            return False
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, content):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        if field == 'value':
+            self.value = content
+            return
+        setattr(self, self.SLOTS[field], content)
+        if self.on_field_change is not None:
+            self.on_field_change(self.name)
+
+    def __contains__(self, field):
+        return field in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return "parameter({}, {})".format(self.name, self.as_dict())
+
+    def keys(self):
+        return self.FIELDS
+
+    def items(self):
+        return [(f, getattr(self, f)) for f in self.FIELDS]
+
+    def get(self, field, default=None):
+        if field not in self.FIELDS:
+            return default
+        return getattr(self, field)
+
+    ## Update fields with content of a dict. Unknown fields, i.e. from an old config file, are ignored
+    #  @param self The python object self
+    #  @param content Dict with new content of the fields
+    def update(self, content):
+        changed = False
+        for field, c in content.items():
+            if field == 'value':
+                self.value = c
+            elif field in self.FIELDS:
+                setattr(self, self.SLOTS[field], c)
+                changed = True
+        if changed and self.on_field_change is not None:
+            self.on_field_change(self.name)
+
+    ## Returns fields of the parameter as a new dict
+    #  @param self The python object self
+    def as_dict(self):
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+
+## Class delivering notifications to a single plugin in a separate thread. A slow or stuck plugin doesn't delay notifications
+#  for other plugins. Notifications sent while the plugin is busy are coalesced into one pending notification.
+class notification_worker(threading.Thread):
+    ## @var extra
+    # Module name used for logging and prefixing data
+    extra = {'module_name': __qualname__}
+    ## @var SAMPLES
+    # Number of the most recent notifications used to calculate duration and latency percentiles
+    SAMPLES = 500
+
+    ## The constructor
+    #  @param self The python object self
+    #  @param plugin_name Name of the plugin
+    #  @param plugin Plugin instance
+    def __init__(self, plugin_name, plugin):
+        super().__init__(name='notification_' + plugin_name)
+        # Daemon thread, so a plugin stuck in notification can't block quitting
+        self.daemon = True
+        ## @var log
+        # System logger handle
+        self.log = logging.getLogger('system')
+        ## @var plugin_name
+        # Name of the plugin
+        self.plugin_name = plugin_name
+        ## @var plugin
+        # Plugin instance
+        self.plugin = plugin
+        ## @var pending
+        # Event set when a notification is waiting to be delivered
+        self.pending = threading.Event()
+        ## @var pending_since
+        # Time of the earliest parameter change waiting to be delivered by the pending notification
+        self.pending_since = None
+        ## @var lock
+        # Lock protecting pending_since
+        self.lock = threading.Lock()
+        ## @var busy_since
+        # Time when the current notification call started, None if the plugin is not processing a notification
+        self.busy_since = None
+        ## @var stuck_reported
+        # Set to True after the current notification call has been reported as stuck
+        self.stuck_reported = False
+        ## @var count
+        # Number of delivered notifications
+        self.count = 0
+        ## @var coalesced
+        # Number of notifications merged with an already pending one
+        self.coalesced = 0
+        ## @var last_duration
+        # Duration in seconds of the last notification call
+        self.last_duration = 0.0
+        ## @var max_duration
+        # Longest notification call in seconds
+        self.max_duration = 0.0
+        ## @var durations
+        # Durations in seconds of the recent notification calls
+        self.durations = collections.deque(maxlen=self.SAMPLES)
+        ## @var latencies
+        # Time in seconds from parameter change to the start of notification call for the recent notifications
+        self.latencies = collections.deque(maxlen=self.SAMPLES)
+        self.running = False
+
+    ## Schedules notification of the plugin. If a notification is already pending it's not queued again.
+    #  @param self The python object self
+    #  @param change_time Time of the parameter change that triggered the notification
+    def notify(self, change_time=None):
+        if change_time is None:
+            change_time = time.time()
+        with self.lock:
+            if self.pending.is_set():
+                self.coalesced += 1
+                if self.pending_since is None or change_time < self.pending_since:
+                    self.pending_since = change_time
+            else:
+                self.pending_since = change_time
+                self.pending.set()
+
+    def run(self):
+        self.running = True
+        while self.running:
+            if not self.pending.wait(pyplum.NOTIFICATION_TIMEOUT):
+                continue
+            with self.lock:
+                self.pending.clear()
+                pending_since = self.pending_since
+                self.pending_since = None
+            if not self.running:
+                break
+            self.busy_since = time.time()
+            if pending_since is not None:
+                self.latencies.append(self.busy_since - pending_since)
+            try:
+                self.plugin.notification()
+            except Exception as e:
+                self.log.error("notification of {} failed with: {}".format(self.plugin_name, e), extra=self.extra)
+            duration = time.time() - self.busy_since
+            self.busy_since = None
+            if self.stuck_reported:
+                self.log.warning("{} finished notification after {:.3f} s".format(self.plugin_name, duration), extra=self.extra)
+                self.stuck_reported = False
+            self.count += 1
+            self.last_duration = duration
+            self.max_duration = max(self.max_duration, duration)
+            self.durations.append(duration)
+
+    ## Returns dict with notification statistics of the plugin. Times are in seconds.
+    #  @param self The python object self
+    def get_stats(self):
+        durations = list(self.durations)
+        latencies = list(self.latencies)
+        return dict(count=self.count,
+                    coalesced=self.coalesced,
+                    duration_p50=num.percentile(durations, 0.50),
+                    duration_p95=num.percentile(durations, 0.95),
+                    duration_max=self.max_duration,
+                    latency_p50=num.percentile(latencies, 0.50),
+                    latency_p95=num.percentile(latencies, 0.95),
+                    latency_max=max(latencies, default=num.NAN))
+
+    ## Returns time in seconds spent in the current notification call, 0.0 if the plugin is not processing a notification
+    #  @param self The python object self
+    def busy_time(self):
+        busy_since = self.busy_since
+        if busy_since is None:
+            return 0.0
+        return time.time() - busy_since
+
+    def stop(self):
+        self.running = False
+        self.pending.set()
 
 
 ## Class for handling starting/stopping plugins in separate threads
@@ -18,6 +302,18 @@ class pyplum(threading.Thread, metaclass=singleton.singleton):
     ## @var extra
     # Module name used for logging and prefixing data
     extra = {'module_name': __qualname__}
+    ## @var NOTIFICATION_TIMEOUT
+    # Maximum time in seconds the main loop waits for a parameter change before checking if it should keep running
+    NOTIFICATION_TIMEOUT = 1.0
+    ## @var STUCK_TIME
+    # Time in seconds after which a plugin processing a notification is reported as stuck
+    STUCK_TIME = 5.0
+    ## @var STATS_INTERVAL
+    # Time in seconds between updates of notification statistics parameters
+    STATS_INTERVAL = 10.0
+    ## @var PLUGIN_INIT_TIMEOUT
+    # Maximum time in seconds a plugin waits for plugins from its DEPENDS to be initialised
+    PLUGIN_INIT_TIMEOUT = 30.0
 
     ## The constructor
     #  @param self The python object self
@@ -31,24 +327,68 @@ class pyplum(threading.Thread, metaclass=singleton.singleton):
         ## @var plugins
         # Dict with sensor instances
         self.plugins = dict()
+        ## @var startup_times
+        # Dict with import, init and dependency wait times in seconds of each loaded plugin
+        self.startup_times = dict()
         ## @var parameters
-        # Dict with parameters
+        # Dict with parameter instances, see class parameter. The dict is never modified in place, registering a parameter
+        # replaces it with an updated copy, so it can be iterated from any thread.
         self.parameters = dict()
+        ## @var parameters_lock
+        # Lock serialising registering of parameters and parameter requests
+        self.parameters_lock = threading.RLock()
+        ## @var version_counter
+        # Source of parameters version numbers
+        self.version_counter = itertools.count(1)
+        ## @var version
+        # Version of parameters, changes on every parameter change. Used to detect if snapshot is up to date.
+        self.version = 0
+        ## @var snapshot_cache
+        # Tuple with parameters dict, version and the last snapshot taken
+        self.snapshot_cache = (None, -1, None)
+        ## @var snapshot_changed
+        # Set with names of parameters changed since the last snapshot
+        self.snapshot_changed = set()
+        ## @var snapshot_lock
+        # Lock protecting version and snapshot_changed
+        self.snapshot_lock = threading.Lock()
         ## @var parameter_requests
         # Dict with parameters requested by a module. Should be empty if all requered parameters are provided by loaded plugins
         self.parameter_requests = dict()
+        ## @var dirty
+        # Dict with names of parameters changed since the last notification round and time of the first change
+        self.dirty = dict()
+        ## @var update_count
+        # Dict with number of changes of each parameter since the last update of notification statistics
+        self.update_count = dict()
+        ## @var update_total
+        # Dict with number of changes of each parameter since start
+        self.update_total = dict()
+        ## @var stats_time
+        # Time of the last update of notification statistics
+        self.stats_time = time.time()
+        ## @var dirty_lock
+        # Lock protecting dirty dict and update counters, parameters are changed from many threads
+        self.dirty_lock = threading.Lock()
+        ## @var dirty_event
+        # Event set when a parameter is marked as changed. Wakes up the main loop.
+        self.dirty_event = threading.Event()
+        ## @var notification_workers
+        # Dict with notification_worker instances, one per notified plugin. Created on the first notification.
+        self.notification_workers = dict()
         ## @var render
-        #  owner   - name of the module that registered cairo context,
-        #  ctx     - cairo context used to render graphics,
-        #  refresh - flag indicating that the context has been modified,
-        #  hold    - flag indicating that rendering should be posponed to avoid flickering
-        self.render = dict(owner=None, ctx=None, refresh=False, hold=False)
+        #  owner     - name of the module that registered frame buffers,
+        #  buffers   - frame_buffers instance, layout draws into a back buffer and publishes it, the rendering plugin
+        #              copies the last published frame,
+        #  scheduler - render_scheduler instance, frame_buffers calls frame_ready after a frame has been published
+        self.render = dict(owner=None, buffers=None, scheduler=render_scheduler.render_scheduler())
         ## @var overlay
         #  owner   - name of the module that registered cairo context,
         #  ctx     - cairo context used as overlay graphics,
         #  refresh - flag indicating that the context has been modified,
         #  hold    - flag indicating that rendering to overlay should be posponed to avoid flickering
-        self.overlay = dict(owner=None, ctx=None, refresh=False, hold=False)
+        #  visible - flag indicating that overlay has some content, fully transparent overlay is not composited
+        self.overlay = dict(owner=None, ctx=None, refresh=False, hold=False, visible=False)
         ## @var input_queue
         #  Input queue with events from hardware input, i.e. pitft touchscreen
         self.input_queue = None
@@ -63,6 +403,17 @@ class pyplum(threading.Thread, metaclass=singleton.singleton):
         self.event_queue_owner = None
         # Setting 'quit' parameter to True triggers quit action for all plugins and pyplum
         self.register_parameter('quit', self.extra['module_name'], value=False)
+        # Time in seconds used to collect changes of parameters before notifying plugins. 0.0 means notify immediately.
+        self.register_parameter('notification_window', self.extra['module_name'], value=0.0, raw_unit='s')
+        # Read only notification statistics, updated every STATS_INTERVAL seconds. notification_stats value is a dict with
+        # update count and rate per parameter and notification count, handler duration and latency per plugin.
+        self.register_parameter('notification_stats', self.extra['module_name'], value=dict(parameters={}, plugins={}))
+        self.register_parameter('notification_latency_p50', self.extra['module_name'], value=num.NAN, raw_unit='s')
+        self.register_parameter('notification_latency_p95', self.extra['module_name'], value=num.NAN, raw_unit='s')
+        self.register_parameter('notification_latency_max', self.extra['module_name'], value=num.NAN, raw_unit='s')
+        self.register_parameter('notification_duration_max', self.extra['module_name'], value=num.NAN, raw_unit='s')
+        # File to dump notification statistics to on quit. None disables dumping.
+        self.register_parameter('notification_stats_file', self.extra['module_name'], value=None)
 
     ## Functon that lists plugins from a subdirectory.
     #  @param self The python object self
@@ -78,36 +429,100 @@ class pyplum(threading.Thread, metaclass=singleton.singleton):
         return plugins_list
 
     ## Functon that loads plugins from a subdirectory per provided list. The subdirectory name in 'plugins' by default.
+    #  Each plugin is imported and initialised in a separate thread, after plugins listed in its DEPENDS are initialised.
+    #  The first exception raised by a plugin is re-raised after all plugins finished.
     #  @param self The python object self
     #  @param directory The directory with plugin
     #  @param plugins_list List with plugins
     def load_plugins(self, directory='plugins', plugins_list=[]):
         __import__(directory)
+        start_time = time.time()
+        ready = {plugin: threading.Event() for plugin in plugins_list}
+        errors = dict()
+        threads = list()
+        for plugin in plugins_list:
+            t = threading.Thread(target=self.init_plugin, args=(directory, plugin, ready, errors), name='init_' + plugin)
+            threads.append(t)
+            t.start()
+        for t in threads:
+            t.join()
+        # Keep plugins in the requested order, threads are started in that order by run
+        plugins = {name: p for name, p in self.plugins.items() if name not in plugins_list}
+        for plugin in plugins_list:
+            if plugin in self.plugins:
+                plugins[plugin] = self.plugins[plugin]
+        self.plugins = plugins
+        self.log_startup_times(plugins_list, time.time() - start_time)
+        for plugin in plugins_list:
+            if plugin in errors:
+                self.log.critical("Loading plugin {} failed with: {}".format(plugin, errors[plugin]), extra=self.extra)
+                raise errors[plugin]
+
+    ## Function importing and initialising a plugin in a thread started by load_plugins
+    #  @param self The python object self
+    #  @param directory The directory with plugin
+    #  @param plugin Name of the plugin
+    #  @param ready Dict with events set when a plugin is initialised
+    #  @param errors Dict for exceptions raised by plugins
+    def init_plugin(self, directory, plugin, ready, errors):
+        profiler = startup_profiler.startup_profiler()
+        try:
+            start_time = time.time()
+            module = importlib.import_module(str(directory + '.' + plugin), directory)
+            plugin_class = module.__getattribute__(plugin)
+            profiler.add_span("import " + plugin, 'plugins', start_time, time.time())
+            import_time = time.time() - start_time
+            start_time = time.time()
+            for dependency in plugin_class.DEPENDS:
+                try:
+                    if not ready[dependency].wait(self.PLUGIN_INIT_TIMEOUT):
+                        self.log.error("{} waited too long for {}, initialising anyway".format(plugin, dependency), extra=self.extra)
+                except KeyError:
+                    self.log.warning("{} depends on {}, but it's not being loaded".format(plugin, dependency), extra=self.extra)
+            wait_time = time.time() - start_time
+            if plugin_class.DEPENDS:
+                profiler.add_span("wait " + plugin, 'plugins', start_time, time.time())
+            start_time = time.time()
+            self.log.debug("Initialising plugin {}".format(plugin), extra=self.extra)
+            self.plugins[plugin] = plugin_class()
+            profiler.add_span("init " + plugin, 'plugins', start_time, time.time())
+            self.startup_times[plugin] = dict(import_time=import_time, wait_time=wait_time, init_time=time.time() - start_time)
+        except Exception as e:
+            errors[plugin] = e
+        finally:
+            ready[plugin].set()
+
+    ## Logs startup timing report
+    #  @param self The python object self
+    #  @param plugins_list List with plugins
+    #  @param total_time Time in seconds of loading all plugins
+    def log_startup_times(self, plugins_list, total_time):
+        self.log.debug("Plugin startup times:", extra=self.extra)
         for plugin in plugins_list:
-            self.load_plugin(directory, plugin)
+            try:
+                t = self.startup_times[plugin]
+                self.log.debug("{:<20} import {:.3f} s, waiting for dependencies {:.3f} s, init {:.3f} s".format(
+                               plugin, t['import_time'], t['wait_time'], t['init_time']), extra=self.extra)
+            except KeyError:
+                self.log.debug("{:<20} failed".format(plugin), extra=self.extra)
+        self.log.debug("Loading {} plugins took {:.3f} s".format(len(plugins_list), total_time), extra=self.extra)
 
     ## Functon that loads all plugins from a subdirectory. The subdirectory name in 'plugins' by default.
     #  @param self The python object self
     #  @param directory The directory with plugin
     def load_all_plugins(self, directory='plugins'):
         __import__(directory)
-        plugins = self.list_plugins(directory)
-        for plugin in plugins:
-            self.load_plugin(directory, plugin)
+        self.load_plugins(directory, self.list_plugins(directory))
 
     ## Functon that load single plugins from a directory.
     #  @param self The python object self
     #  @param directory The directory with plugin
     #  @param plugin Name of the plugin
     def load_plugin(self, directory, plugin):
-        __import__(directory)
-        module = importlib.import_module(str(directory + '.' + plugin), directory)
-        plugin_class = module.__getattribute__(plugin)
-        self.log.debug("Initialising plugin {}".format(plugin), extra=self.extra)
-        self.plugins[plugin] = plugin_class()
+        self.load_plugins(directory, [plugin])
 
-    ## Main loop of pyplum module.Makes snap shot of parameters and after a delay compares it to the current state.
-    # Changes of parameters are used to notify plugins that requested relevant parameters.
+    ## Main loop of pyplum module. Waits for parameters to be marked as changed by set_value or force_notification
+    # and notifies plugins that requested relevant parameters.
     #  @param self The python object self
     def run(self):
         self.log.debug("run started", extra=self.extra)
@@ -117,59 +532,120 @@ class pyplum(threading.Thread, metaclass=singleton.singleton):
             self.plugins[s].start()
 
         self.running = True
-        self.previous_parameters = dict()
         while self.running:
-            self.log.debug("running...", extra=self.extra)
+            self.dirty_event.wait(self.NOTIFICATION_TIMEOUT)
             try:
-                self.previous_parameters = copy.deepcopy(self.parameters)
-            except RuntimeError as e:
-                if str(e) == 'dictionary changed size during iteration':
-                    self.log.debug("New parameter added while copying dictionary. Ignoring..", extra=self.extra)
-            time.sleep(0.8)
-            notify = list()
-            for parameter, content in self.parameters.items():
-                curr_val = content['value']
+                window = float(self.parameters['notification_window']['value'])
+            except (TypeError, ValueError):
+                window = 0.0
+            if window > 0.0:
+                # Collect more changes, so a burst of updates results in one notification
+                time.sleep(window)
+            with self.dirty_lock:
+                self.dirty_event.clear()
+                dirty = self.dirty
+                self.dirty = dict()
+            # Plugins to notify with the earliest change time of the parameters they required
+            notify = dict()
+            for parameter, change_time in dirty.items():
                 try:
-                    prev_val = self.previous_parameters[parameter]["value"]
+                    for m in self.parameters[parameter]["required_by"]:
+                        if m not in notify or change_time < notify[m]:
+                            notify[m] = change_time
                 except KeyError:
-                    #New position added to dictionary at runtime, copy & force notification
-                    prev_val = curr_val
-                    self.previous_parameters[parameter] = content
-                    self.previous_parameters[parameter]["force_notification"] = True
-                try:
-                    if math.isnan(curr_val) and math.isnan(prev_val):
-                        # Skip comparison if previous and current values are nan. nan != nan is always True
-                        continue
-                except TypeError:
-                    # TypeError on NoneType or not float type
-                    pass
-                try:
-                    if self.previous_parameters[parameter]["force_notification"] or \
-                       prev_val != curr_val:
-                        self.parameters[parameter]["force_notification"] = False
-                        #print('change in {}'.format(parameter))
-                        #print('{} >> {}'.format(prev_val, curr_val))
-                        if content["required_by"] is not None:
-                            for m in content["required_by"]:
-                                if m not in notify:
-                                    notify.append(m)
-                except KeyError:
-                    pass
-            for module in notify:
-                try:
-                    self.plugins[module].notification()
-                except (AttributeError, KeyError):
-                    # Ignore error - module might not exist anymore/yet or might be assigned from config file
                     pass
+            for module, change_time in notify.items():
+                self.notify_plugin(module, change_time)
+            self.check_notification_workers()
+            if time.time() - self.stats_time > self.STATS_INTERVAL:
+                self.update_notification_stats()
             if self.parameters['quit']["value"]:
                 self.stop()
         self.log.debug("run finished", extra=self.extra)
 
+    ## Passes notification to the worker of a plugin. The worker is created and started on the first notification.
+    #  @param self The python object self
+    #  @param plugin_name Name of the plugin
+    #  @param change_time Time of the parameter change that triggered the notification
+    def notify_plugin(self, plugin_name, change_time=None):
+        try:
+            worker = self.notification_workers[plugin_name]
+        except KeyError:
+            try:
+                plugin = self.plugins[plugin_name]
+            except KeyError:
+                # Ignore error - module might not exist anymore/yet or might be assigned from config file
+                return
+            worker = notification_worker(plugin_name, plugin)
+            self.notification_workers[plugin_name] = worker
+            worker.start()
+        worker.notify(change_time)
+
+    ## Reports plugins that are processing a notification for longer than STUCK_TIME
+    #  @param self The python object self
+    def check_notification_workers(self):
+        for name, worker in self.notification_workers.items():
+            busy_time = worker.busy_time()
+            if busy_time > self.STUCK_TIME and not worker.stuck_reported:
+                worker.stuck_reported = True
+                self.log.warning("{} is stuck in notification for {:.3f} s, pending: {}, delivered: {}, coalesced: {}, max duration: {:.3f} s".format(
+                                 name, busy_time, worker.pending.is_set(), worker.count, worker.coalesced, worker.max_duration), extra=self.extra)
+
+    ## Returns dict with notification statistics: update count and rate per parameter and notification statistics per plugin
+    #  @param self The python object self
+    def get_notification_stats(self):
+        now = time.time()
+        interval = now - self.stats_time
+        with self.dirty_lock:
+            update_count = self.update_count
+            self.update_count = dict()
+            update_total = self.update_total.copy()
+        self.stats_time = now
+        parameters = dict()
+        for name, total in update_total.items():
+            rate = update_count.get(name, 0) / interval if interval > 0.0 else num.NAN
+            parameters[name] = dict(updates=total, rate=rate)
+        plugins = dict()
+        for name, worker in list(self.notification_workers.items()):
+            plugins[name] = worker.get_stats()
+        return dict(parameters=parameters, plugins=plugins)
+
+    ## Updates notification statistics parameters
+    #  @param self The python object self
+    def update_notification_stats(self):
+        stats = self.get_notification_stats()
+        latencies = list()
+        for worker in list(self.notification_workers.values()):
+            latencies.extend(worker.latencies)
+        durations = [p['duration_max'] for p in stats['plugins'].values()]
+        self.set_value('notification_stats', stats)
+        self.set_value('notification_latency_p50', num.percentile(latencies, 0.50))
+        self.set_value('notification_latency_p95', num.percentile(latencies, 0.95))
+        self.set_value('notification_latency_max', max(latencies, default=num.NAN))
+        self.set_value('notification_duration_max', max(durations, default=num.NAN))
+
+    ## Writes notification statistics to notification_stats_file, if set
+    #  @param self The python object self
+    def dump_notification_stats(self):
+        stats_file = self.parameters['notification_stats_file'].value
+        if stats_file is None:
+            return
+        self.update_notification_stats()
+        self.log.debug("Writing notification statistics to {}".format(stats_file), extra=self.extra)
+        try:
+            with open(stats_file, 'w') as f:
+                yaml.safe_dump(self.parameters['notification_stats'].value, f, default_flow_style=False)
+        except (IOError, OSError) as e:
+            self.log.error("Writing notification statistics to {} failed with: {}".format(stats_file, e), extra=self.extra)
+
     ## Function stopping all plugins. Called by the destructor
     #  @param self The python object self
     def stop(self):
         self.log.debug("stop started", extra=self.extra)
         self.running = False
+        for w in self.notification_workers.values():
+            w.stop()
+        self.dump_notification_stats()
         time.sleep(1.0)
         for s in self.plugins:
             if self.plugins[s].isAlive():
@@ -203,7 +679,7 @@ class pyplum(threading.Thread, metaclass=singleton.singleton):
     #  @param unit Unit used to dispaly the parameter i.e. for odometer it might be km or mi (mile)
     #  @param units_allowed List of units allowed for the parametes. The units has to be covered in unit_converter module
     #  @param required_by List of plugins that need to be notified about parameter change
-    #  @param force_notification Force notification, even if the parameter value didn't change
+    #  @param force_notification Notify plugins from required_by about the parameter, even if the parameter value didn't change
     #  @param store If True triggers writing to config file
     #  @param reset Used to notify plugins that the parameter has been reset
     def register_parameter(self,
@@ -224,57 +700,69 @@ class pyplum(threading.Thread, metaclass=singleton.singleton):
                            store=False,
                            reset=False):
 
-        if units_allowed is None:
-            units_allowed = list()
-        if required_by is None:
-            required_by = list()
-
-        self.log.debug("Trying to register {} by {}".format(parameter_name, plugin_name), extra=self.extra)
-        if unit is None:
-            unit = raw_unit
-        if unit is not None and units_allowed is None:
-            units_allowed.append(unit)
-        if parameter_name in self.parameters:
-            if self.parameters[parameter_name]["plugin_name"] == plugin_name:
-                self.log.debug("{} already registerd by the same sensor {}, probably update from config".format(parameter_name, plugin_name), extra=self.extra)
-            elif self.parameters[parameter_name]["plugin_name"] is not None:
-                self.log.critical("{} already registerd by sensor {}. Sensor {} request refused.".format(parameter_name, self.parameters[parameter_name]["plugin_name"], plugin_name), extra=self.extra)
-                return
-        else:
-            if parameter_name in self.parameter_requests:
-                required_by = self.parameter_requests[parameter_name]
-                del self.parameter_requests[parameter_name]
-            self.parameters[parameter_name] = dict(plugin_name=plugin_name,
-                                                   time_stamp=0.0,
-                                                   value=value,
-                                                   value_min=value_min,
-                                                   value_avg=value_avg,
-                                                   value_max=value_max,
-                                                   value_default=value_default,
-                                                   value_list=value_list,
-                                                   data=data,
-                                                   raw_unit=raw_unit,
-                                                   unit=unit,
-                                                   units_allowed=units_allowed,
-                                                   required_by=required_by,
-                                                   force_notification=force_notification,
-                                                   store=store,
-                                                   reset=False)
+        with self.parameters_lock:
+            if units_allowed is None:
+                units_allowed = list()
+            if required_by is None:
+                required_by = list()
+
+            self.log.debug("Trying to register {} by {}".format(parameter_name, plugin_name), extra=self.extra)
+            if unit is None:
+                unit = raw_unit
+            if unit is not None and units_allowed is None:
+                units_allowed.append(unit)
+            if parameter_name in self.parameters:
+                if self.parameters[parameter_name]["plugin_name"] == plugin_name:
+                    self.log.debug("{} already registerd by the same sensor {}, probably update from config".format(parameter_name, plugin_name), extra=self.extra)
+                elif self.parameters[parameter_name]["plugin_name"] is not None:
+                    self.log.critical("{} already registerd by sensor {}. Sensor {} request refused.".format(parameter_name, self.parameters[parameter_name]["plugin_name"], plugin_name), extra=self.extra)
+                    return
+            else:
+                if parameter_name in self.parameter_requests:
+                    required_by = self.parameter_requests[parameter_name]
+                    del self.parameter_requests[parameter_name]
+                p = parameter(parameter_name,
+                              on_change=self.force_notification,
+                              on_field_change=self.bump_version,
+                              plugin_name=plugin_name,
+                              time_stamp=0.0,
+                              value=value,
+                              value_min=value_min,
+                              value_avg=value_avg,
+                              value_max=value_max,
+                              value_default=value_default,
+                              value_list=value_list,
+                              data=data,
+                              raw_unit=raw_unit,
+                              unit=unit,
+                              units_allowed=units_allowed,
+                              required_by=required_by,
+                              store=store,
+                              reset=False)
+                parameters = self.parameters.copy()
+                parameters[parameter_name] = p
+                self.parameters = parameters
+                if force_notification or required_by:
+                    # Plugins waiting for the parameter need to know it's available now
+                    self.force_notification(parameter_name)
         #self.log.debug("after register_parameter {} is {}".format(parameter_name, self.parameters[parameter_name]), extra=self.extra)
 
     ## Function for requesting a parameter. Called by a sensor to request information abut changes of a parameter.
     #  @param self The python object self
     def request_parameter(self, parameter_name, plugin_name):
         self.log.debug("request_parameter called for {} by {}".format(parameter_name, plugin_name), extra=self.extra)
-        if parameter_name in self.parameters:
-            if plugin_name not in self.parameters[parameter_name]["required_by"]:
-                self.parameters[parameter_name]["required_by"].append(plugin_name)
-                self.parameters[parameter_name]["force_notification"] = True
-                self.log.debug("{} added to required_by of {}".format(plugin_name, parameter_name), extra=self.extra)
-        else:
-            if parameter_name not in self.parameter_requests:
-                self.parameter_requests[parameter_name] = list()
-            self.parameter_requests[parameter_name].append(plugin_name)
+        with self.parameters_lock:
+            if parameter_name in self.parameters:
+                p = self.parameters[parameter_name]
+                if plugin_name not in p.required_by:
+                    # Replace the list, so the main loop can iterate over the old one
+                    p.required_by = p.required_by + [plugin_name]
+                    self.force_notification(parameter_name)
+                    self.log.debug("{} added to required_by of {}".format(plugin_name, parameter_name), extra=self.extra)
+            else:
+                if parameter_name not in self.parameter_requests:
+                    self.parameter_requests[parameter_name] = list()
+                self.parameter_requests[parameter_name].append(plugin_name)
         #self.log.debug("after request_parameter for {} parameter_requests is {}".format(parameter_name, self.parameter_requests), extra=self.extra)
 
     ## Update parameter with new content
@@ -287,36 +775,93 @@ class pyplum(threading.Thread, metaclass=singleton.singleton):
         if parameter not in self.parameters:
             self.register_parameter(parameter)
         self.parameters[parameter].update(content)
-        self.parameters[parameter]["force_notification"] = True
+        self.force_notification(parameter)
         #self.log.debug("after update_parameter {} is {}".format(parameter, self.parameters[parameter]), extra=self.extra)
 
+    ## Set value of a parameter. Plugins from required_by are notified if the value changed.
+    #  @param self The python object self
+    #  @param parameter Name of the parameter
+    #  @param value New value of the parameter
+    def set_value(self, parameter, value):
+        self.parameters[parameter].value = value
+
+    ## Marks parameter as changed for snapshot readers. Called when parameter fields other than value are changed.
+    #  @param self The python object self
+    #  @param parameter Name of the parameter
+    def bump_version(self, parameter):
+        with self.snapshot_lock:
+            self.snapshot_changed.add(parameter)
+            self.version = next(self.version_counter)
+
+    ## Returns a snapshot of all parameters: dict with parameter names as keys and dicts with parameter fields as values.
+    #  The snapshot is shared between callers and must not be modified. It's rebuilt only if a parameter changed since
+    #  the last call, otherwise the cached one is returned. Only dicts of the changed parameters are rebuilt, the others
+    #  are shared with the previous snapshot. Registering a parameter rebuilds all of them.
+    #  @param self The python object self
+    def snapshot(self):
+        parameters, version, frame = self.snapshot_cache
+        if parameters is self.parameters and version == self.version:
+            return frame
+        # A field written while the snapshot is taken bumps the version after the lock is released, so the parameter
+        # is rebuilt again by the next call
+        with self.snapshot_lock:
+            changed = self.snapshot_changed
+            self.snapshot_changed = set()
+            version = self.version
+            if parameters is self.parameters:
+                frame = frame.copy()
+                for name in changed:
+                    try:
+                        frame[name] = parameters[name].as_dict()
+                    except KeyError:
+                        # force_notification called for a parameter that's not registered
+                        pass
+            else:
+                parameters = self.parameters
+                frame = {name: p.as_dict() for name, p in parameters.items()}
+            self.snapshot_cache = (parameters, version, frame)
+        return frame
+
+    ## Mark parameter as changed. Plugins from required_by will be notified, even if the parameter value didn't change.
+    #  @param self The python object self
+    #  @param parameter Name of the parameter
+    def force_notification(self, parameter):
+        with self.dirty_lock:
+            if parameter not in self.dirty:
+                self.dirty[parameter] = time.time()
+            self.update_count[parameter] = self.update_count.get(parameter, 0) + 1
+            self.update_total[parameter] = self.update_total.get(parameter, 0) + 1
+        self.bump_version(parameter)
+        self.dirty_event.set()
+
     def parameter_reset(self, parameter, reset_list):
         self.log.debug("reset request received for {}".format(parameter), extra=self.extra)
         self.log.debug("reset list: {}".format(reset_list), extra=self.extra)
         # Info for module responsible for the parameter that there was a reset
-        self.parameters[parameter]['reset'] = True
+        p = self.parameters[parameter]
+        p.reset = True
         for suffix in reset_list:
             suffix = suffix.strip(' ')
             if suffix == '':
-                self.parameters[parameter]['value'] = self.parameters[parameter]['value_default']
+                p.value = p.value_default
             elif suffix == 'min':
-                self.parameters[parameter]['value_min'] = num.INF
+                p.value_min = num.INF
             elif suffix == 'avg':
-                self.parameters[parameter]['value_avg'] = num.NAN
+                p.value_avg = num.NAN
             elif suffix == 'max':
-                self.parameters[parameter]['value_max'] = num.INF_MIN
+                p.value_max = num.INF_MIN
 
-    ## Function for registering cairo context linked with a display. Only one plugin is allowed to register it
+    ## Function for registering frame buffers linked with a display. Only one plugin is allowed to register them
     #  @param self The python object self
-    #  @param plugin_name Name of the plugin registering cairo context
-    #  @param cairo_context Cairo context need to be registered by one of the plugins to allow display access
-    def register_cairo_context(self, plugin_name, cairo_context):
-        self.log.debug("Registering cairo context by {}".format(plugin_name), extra=self.extra)
+    #  @param plugin_name Name of the plugin registering frame buffers
+    #  @param buffers frame_buffers instance need to be registered by one of the plugins to allow display access
+    def register_frame_buffers(self, plugin_name, buffers):
+        self.log.debug("Registering frame buffers by {}".format(plugin_name), extra=self.extra)
         if self.render['owner'] is None:
-            self.render['ctx'] = cairo_context
+            self.render['buffers'] = buffers
             self.render['owner'] = plugin_name
         else:
-            self.log.critical("Can't register cairo context by {} as it's already registered by {}".format(plugin_name, self.render['owner']), extra=self.extra)
+            self.log.critical("Can't register frame buffers by {} as they're already registered by {}".format(plugin_name, self.render['owner']), extra=self.extra)
 
     ## Function for registering cairo context used as overlay. Only one plugin is allowed to register it
     #  @param self The python object self
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+## @package render_scheduler
+#  Frame scheduler shared by layout and rendering plugins. Layout signals that a new frame is ready, the rendering plugin
+#  sleeps until that happens, so there is no polling and no display latency caused by a fixed frame period.
+
+import threading
+import time
+
+
+## Class scheduling frames for rendering plugins
+class render_scheduler():
+    ## @var extra
+    # Module name used for logging and prefixing data
+    extra = {'module_name': __qualname__}
+    ## @var MAX_FPS
+    # Default maximum number of frames per second
+    MAX_FPS = 10.0
+    ## @var MIN_IDLE
+    # Default minimum time in seconds between the end of one frame and the start of the next one
+    MIN_IDLE = 0.02
+
+    ## The constructor
+    #  @param self The python object self
+    def __init__(self):
+        ## @var max_fps
+        # Maximum number of frames per second
+        self.max_fps = self.MAX_FPS
+        ## @var min_idle
+        # Minimum time in seconds between the end of one frame and the start of the next one
+        self.min_idle = self.MIN_IDLE
+        ## @var condition
+        # Condition used to wake up the rendering plugin
+        self.condition = threading.Condition()
+        ## @var ready
+        # Set to True when a new frame is ready and not rendered yet
+        self.ready = False
+        ## @var woken
+        # Set to True by wake to stop waiting without a frame
+        self.woken = False
+        ## @var frame_start
+        # Time of the start of the last rendered frame
+        self.frame_start = 0.0
+        ## @var frame_end
+        # Time of the end of the last rendered frame
+        self.frame_end = 0.0
+        ## @var frames
+        # Number of rendered frames
+        self.frames = 0
+
+    ## Signals that a new frame is ready to be rendered. Called by layout.
+    #  @param self The python object self
+    def frame_ready(self):
+        with self.condition:
+            self.ready = True
+            self.condition.notify_all()
+
+    ## Wakes up the rendering plugin without a new frame, i.e. to let it stop
+    #  @param self The python object self
+    def wake(self):
+        with self.condition:
+            self.woken = True
+            self.condition.notify_all()
+
+    ## Waits until a frame is ready and the frame rate limits allow rendering it. Returns True if the frame should be
+    #  rendered or False after wake or timeout. Without timeout it sleeps as long as nothing changes.
+    #  @param self The python object self
+    #  @param timeout Maximum waiting time in seconds, None means no limit
+    def wait_for_frame(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.ready or self.woken, timeout):
+                return False
+            if self.woken:
+                self.woken = False
+                return False
+        # Collect more changes until the frame rate limits allow rendering
+        next_frame = max(self.frame_start + 1.0 / self.max_fps, self.frame_end + self.min_idle)
+        delay = next_frame - time.time()
+        if delay > 0.0:
+            time.sleep(delay)
+        with self.condition:
+            self.ready = False
+        self.frame_start = time.time()
+        return True
+
+    ## Marks the end of rendering a frame. Called by the rendering plugin.
+    #  @param self The python object self
+    def frame_done(self):
+        self.frame_end = time.time()
+        self.frames += 1
@@ -1,7 +1,21 @@
+import threading
+
+
 class singleton(type):
     _instances = {}
+    # Plugins are initialised in parallel threads, so the first instance of a class can be requested from many threads
+    # at once. Each class has its own lock, so a slow constructor doesn't block creating other singletons.
+    _locks = {}
+    _locks_lock = threading.Lock()
 
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(singleton, cls).__call__(*args, **kwargs)
+        try:
+            return cls._instances[cls]
+        except KeyError:
+            pass
+        with singleton._locks_lock:
+            lock = singleton._locks.setdefault(cls, threading.RLock())
+        with lock:
+            if cls not in cls._instances:
+                cls._instances[cls] = super(singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+## @package startup_profiler
+#  Records timeline of OCC startup and writes it as Chrome trace json file (open with chrome://tracing or https://ui.perfetto.dev).
+#  Disabled by default, all recording functions do nothing until enable is called.
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+import singleton
+
+
+## Class recording startup phases
+class startup_profiler(object, metaclass=singleton.singleton):
+    ## @var extra
+    # Module name used for logging and prefixing data
+    extra = {'module_name': __qualname__}
+
+    ## The constructor
+    #  @param self The python object self
+    def __init__(self):
+        ## @var log
+        # System logger handle
+        self.log = logging.getLogger('system')
+        ## @var enabled
+        # Events are recorded only if enabled is True
+        self.enabled = False
+        ## @var trace_file
+        # Name of Chrome trace file
+        self.trace_file = None
+        ## @var start_time
+        # Time used as zero of the timeline
+        self.start_time = time.time()
+        ## @var events
+        # List with recorded trace events
+        self.events = list()
+        ## @var threads
+        # Set with ids of threads that have name metadata event in events list
+        self.threads = set()
+        ## @var lock
+        # Lock protecting events list, phases are recorded from many threads
+        self.lock = threading.Lock()
+
+    ## Starts recording
+    #  @param self The python object self
+    #  @param trace_file Name of Chrome trace file written by finish
+    #  @param start_time Time used as zero of the timeline, i.e. time of program start. Defaults to now.
+    def enable(self, trace_file, start_time=None):
+        self.trace_file = trace_file
+        if start_time is not None:
+            self.start_time = start_time
+        self.enabled = True
+        self.log.debug("Startup profiling enabled, trace file: {}".format(trace_file), extra=self.extra)
+
+    ## Converts time to microseconds since start_time
+    #  @param self The python object self
+    #  @param t Time as returned by time.time()
+    def timestamp(self, t):
+        return round((t - self.start_time) * 1000000.0)
+
+    ## Records a phase that started and ended at given times
+    #  @param self The python object self
+    #  @param name Name of the phase
+    #  @param category Category of the phase, i.e. plugins, layout, images
+    #  @param start Start time of the phase
+    #  @param end End time of the phase
+    def add_span(self, name, category, start, end):
+        if not self.enabled:
+            return
+        self.add_event(dict(name=name, cat=category, ph='X', ts=self.timestamp(start), dur=self.timestamp(end) - self.timestamp(start)))
+
+    ## Adds event to the timeline with process and thread id of the caller. Thread name is added as metadata event.
+    #  @param self The python object self
+    #  @param event Dict with Chrome trace event
+    def add_event(self, event):
+        thread = threading.current_thread()
+        event['pid'] = os.getpid()
+        event['tid'] = thread.ident
+        with self.lock:
+            if thread.ident not in self.threads:
+                self.threads.add(thread.ident)
+                self.events.append(dict(name='thread_name', ph='M', pid=event['pid'], tid=thread.ident, args=dict(name=thread.name)))
+            self.events.append(event)
+
+    ## Context manager recording the time of the code block as a phase
+    #  @param self The python object self
+    #  @param name Name of the phase
+    #  @param category Category of the phase, i.e. plugins, layout, images
+    @contextlib.contextmanager
+    def span(self, name, category):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start, time.time())
+
+    ## Records a single moment of startup, i.e. first frame painted
+    #  @param self The python object self
+    #  @param name Name of the moment
+    #  @param category Category of the moment
+    def instant(self, name, category):
+        if not self.enabled:
+            return
+        self.add_event(dict(name=name, cat=category, ph='i', s='g', ts=self.timestamp(time.time())))
+
+    ## Writes the recorded timeline to trace_file and stops recording. Called after the first frame is painted or on quit.
+    #  @param self The python object self
+    def finish(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        with self.lock:
+            trace = dict(traceEvents=self.events, displayTimeUnit='ms')
+            try:
+                with open(self.trace_file, 'w') as f:
+                    json.dump(trace, f, indent=1)
+                self.log.debug("Startup timeline with {} events written to {}".format(len(self.events), self.trace_file), extra=self.extra)
+            except (IOError, OSError) as e:
+                self.log.error("Writing startup timeline to {} failed with: {}".format(self.trace_file, e), extra=self.extra)
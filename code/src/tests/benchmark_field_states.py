@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compares computing field states from compiled render ops (layout_loader.render_op) with the previous implementation
+# probing field dicts on every frame. All pages of all layouts from code/layouts/ are used (except editors) with
+# synthetic parameter values. States from both implementations have to be equal, differences are printed.
+#
+# Run from any directory: python3 tests/benchmark_field_states.py [-n FRAMES]
+
+import argparse
+import datetime
+import math
+import os
+import sys
+import time
+
+CODE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+sys.path.insert(0, os.path.join(CODE_DIR, 'src'))
+
+from helpers import num
+import helpers
+import layout_loader
+import pyplum
+
+## @var SYNTHETIC
+# Parameters with synthetic values: raw unit, unit and function returning value for frame number
+SYNTHETIC = {
+    'real_time': ('s', 's', lambda i: 1500000000.0 + 0.1 * i),
+    'speed': ('m/s', 'km/h', lambda i: 8.0 + 3.0 * math.sin(i / 20.0)),
+    'cadence': ('RPM', 'RPM', lambda i: 85.0 + 5.0 * math.sin(i / 7.0)),
+    'heart_rate': ('BPM', 'BPM', lambda i: 140.0 + 10.0 * math.sin(i / 30.0)),
+}
+
+
+## Field state computed the way layout did it before fields were compiled: every field option is looked up in
+#  the field dict on every frame and 'show' is dispatched with string comparisons.
+class reference_state():
+    def __init__(self, ll, page):
+        self.ll = ll
+        self.page = page
+        self.uc = helpers.unit_converter()
+        self.frame = None
+        self.editor_fields = None
+
+    def get_value(self, parameter, vtype):
+        p = self.frame[parameter]
+        value = self.uc.convert(p[vtype], p['raw_unit'], p['unit'])
+        self.value = num.sanitise(value)
+
+    def get_parameter_value(self, show, parameter):
+        if show == "value":
+            try:
+                self.get_value(parameter, 'value')
+            except (KeyError, TypeError):
+                self.value = None
+        elif show == "date":
+            try:
+                self.get_value(parameter, 'value')
+                self.value = datetime.datetime.fromtimestamp(int(self.value)).strftime('%Y-%m-%d')
+            except (ValueError, TypeError):
+                pass
+        elif show == "time":
+            try:
+                self.get_value(parameter, 'value')
+                self.value = datetime.datetime.fromtimestamp(int(self.value)).strftime('%H:%M:%S')
+            except (TypeError, ValueError):
+                pass
+        elif show == "tenths":
+            try:
+                self.get_value(parameter, 'value')
+                tenths_string = "{}".format(self.value - int(self.value))
+                self.value = format(tenths_string)[2:3]
+            except (KeyError, TypeError, ValueError):
+                self.value = None
+        elif show == "unit":
+            try:
+                self.value = self.frame[parameter]['unit']
+            except KeyError:
+                self.value = None
+        elif show in ('min', 'avg', 'max'):
+            try:
+                self.get_value(parameter, 'value_' + show)
+            except KeyError:
+                self.value = None
+
+    def get_field_state(self, field):
+        self.value = None
+        parameter = field['parameter']
+        try:
+            show = field["show"]
+        except KeyError:
+            show = "value"
+        self.get_parameter_value(show, parameter)
+        if self.value is None:
+            try:
+                self.value = field['text']
+            except KeyError:
+                self.value = ""
+        try:
+            format_field = field['format']
+        except KeyError:
+            format_field = None
+        value, format_string = self.ll.format_parameter(format_field, parameter, self.value)
+        try:
+            image_path = field['file']
+        except KeyError:
+            image_path = None
+        try:
+            variable = field['variable']
+            v = self.frame[variable["name"]]['value']
+            frames = field['variable']['frames']
+            if v > frames:
+                v = frames
+            if variable.get('sprite', False):
+                image_path = (image_path, frames + 1, v)
+            else:
+                image_path = self.ll.make_image_key(image_path, v)
+        except (KeyError, TypeError):
+            pass
+        try:
+            fs = field['font_size']
+        except KeyError:
+            fs = self.page['font_size']
+        try:
+            align = field["align"]
+        except KeyError:
+            align = "center"
+        try:
+            text_colour = field["text_colour"]
+        except KeyError:
+            text_colour = self.page['text_colour']
+        return (value, image_path, fs, align, text_colour, format_string)
+
+    def get_field_states(self, frame):
+        self.frame = frame
+        return [self.get_field_state(field) for field in self.page['fields'].values()]
+
+
+## Returns field state computed from a compiled render op, the same way as layout.get_field_state
+def compiled_state(op, frame):
+    value = op.get_value(frame, None)
+    if value is None:
+        value = op.text
+    value, format_string = op.format_value(value, frame)
+    return (value, op.get_image_key(frame), op.font_size, op.align, op.text_colour, format_string)
+
+
+## Returns list with layout locations: directories with one page per file and layout files with all pages
+def find_layouts():
+    layouts_dir = os.path.join(CODE_DIR, 'layouts')
+    locations = list()
+    for entry in sorted(os.listdir(layouts_dir)):
+        path = os.path.join(layouts_dir, entry)
+        if os.path.isdir(path):
+            locations.append(os.path.join('layouts', entry) + '/')
+        elif entry.endswith('.yaml'):
+            locations.append(os.path.join('layouts', entry))
+    return locations
+
+
+## Registers parameters used by fields of a page. Parameters with units selected by format get the first unit.
+def register_parameters(pm, page):
+    for name, (raw_unit, unit, function) in SYNTHETIC.items():
+        if name not in pm.parameters:
+            pm.register_parameter(name, value=function(0), raw_unit=raw_unit, unit=unit)
+    for field in page['fields'].values():
+        for name in (field['parameter'], (field.get('variable') or {}).get('name')):
+            if name is not None and name not in pm.parameters:
+                pm.register_parameter(name, value=0)
+        if type(field.get('format')) is dict and pm.parameters[field['parameter']]['unit'] not in field['format']:
+            pm.parameters[field['parameter']]['unit'] = next(iter(field['format']))
+
+
+## Returns parameter snapshots for frames
+def make_frames(pm, frames):
+    snapshots = list()
+    for i in range(frames):
+        for name, (raw_unit, unit, function) in SYNTHETIC.items():
+            pm.set_value(name, function(i))
+        snapshots.append(pm.snapshot())
+    return snapshots
+
+
+## Returns time in seconds used by function to compute states of all frames and the states
+def measure(function, snapshots):
+    states = list()
+    start = time.perf_counter()
+    for frame in snapshots:
+        states.append(function(frame))
+    return time.perf_counter() - start, states
+
+
+parser = argparse.ArgumentParser(description='Field state computation benchmark')
+parser.add_argument('-n', '--frames', type=int, default=1000, help='Number of frames per page')
+args = parser.parse_args()
+
+# Layouts use paths relative to code directory
+os.chdir(CODE_DIR)
+pm = pyplum.pyplum()
+pm.register_parameter("display_size", value=(240, 320))
+pm.register_parameter("fonts_dir", value='fonts/')
+pm.register_parameter("layout_location", value=None)
+
+print("{:<40} {:>7} {:>12} {:>12} {:>8}".format('layout/page', 'fields', 'dict us/fr', 'ops us/fr', 'speedup'))
+total_reference = total_compiled = 0.0
+differences = 0
+for location in find_layouts():
+    pm.set_value('layout_location', location)
+    ll = layout_loader.layout_loader()
+    for page_id in sorted(ll.page_files):
+        try:
+            page = ll.get_page(page_id)
+        except KeyError:
+            continue
+        if page['type'] == 'editor' or page['fields'] is None:
+            continue
+        register_parameters(pm, page)
+        snapshots = make_frames(pm, args.frames)
+        reference = reference_state(ll, page)
+        ops = list(page['ops'].values())
+        t_reference, reference_states = measure(reference.get_field_states, snapshots)
+        t_compiled, states = measure(lambda frame: [compiled_state(op, frame) for op in ops], snapshots)
+        for frame_states, frame_reference_states in zip(states, reference_states):
+            for op, state, reference_state_ in zip(ops, frame_states, frame_reference_states):
+                if state != reference_state_:
+                    differences += 1
+                    print("  {} differs: {} != {}".format(op.meta_name, state, reference_state_))
+        total_reference += t_reference
+        total_compiled += t_compiled
+        print("{:<40} {:>7} {:>12.1f} {:>12.1f} {:>7.1f}x".format(
+            location + page_id, len(ops), 1e6 * t_reference / args.frames, 1e6 * t_compiled / args.frames,
+            t_reference / t_compiled))
+print("Total: {:.1f}x faster, {} differences".format(total_reference / total_compiled, differences))
+pm.stop()
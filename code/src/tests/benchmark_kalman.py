@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compares Kalman filtering of a synthetic 10 hour ride logged at 1 Hz: streaming (update for each sample, as done by
+# ble_hr and bmp280), batch mode (kalman.filter) and a filter bank with all channels (kalman_bank.filter). The bank is
+# also run with channels of many rides at once. Estimates of all methods have to be identical.
+#
+# Run from any directory: python3 tests/benchmark_kalman.py [-s SECONDS] [--rides RIDES]
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import helpers
+
+## @var CHANNELS
+# Channels: name, Q, R and function returning noiseless value for second of the ride
+CHANNELS = (
+    ('pressure', 0.02, 1.0, lambda i: 101325.0 - 20.0 * math.sin(i / 1800.0)),
+    ('heart_rate', 0.01, 1.0, lambda i: 140.0 + 10.0 * math.sin(i / 600.0)),
+    ('speed', 0.05, 1.0, lambda i: 7.0 + 2.0 * math.sin(i / 300.0)),
+    ('cadence', 0.05, 1.0, lambda i: 85.0 + 5.0 * math.sin(i / 120.0)),
+)
+
+
+## Returns numpy array with measurements of all channels of a ride, shape (seconds, channels)
+def make_ride(seconds, seed):
+    rng = random.Random(seed)
+    return numpy.array([[function(i) + rng.gauss(0.0, 1.0) for name, Q, R, function in CHANNELS]
+                        for i in range(seconds)])
+
+
+## Filters one channel sample by sample
+def filter_streaming(Q, R, values):
+    k = helpers.kalman(Q=Q, R=R)
+    k.set_initial_value(values[0])
+    estimates = list()
+    for value in values:
+        k.update_unfiltered_value(value)
+        k.update()
+        estimates.append(k.value_estimate)
+    return numpy.array(estimates)
+
+
+## Filters one channel with batch mode
+def filter_batch(Q, R, values):
+    k = helpers.kalman(Q=Q, R=R)
+    k.set_initial_value(values[0])
+    return k.filter(values)
+
+
+## Filters all channels with a filter bank, Q and R are sequences with values of each channel
+def filter_bank(Q, R, values):
+    bank = helpers.kalman_bank(Q, R)
+    bank.set_initial_value(values[0])
+    return bank.filter(values)
+
+
+## Returns time in seconds used by function and its result
+def measure(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+parser = argparse.ArgumentParser(description='Kalman filter benchmark')
+parser.add_argument('-s', '--seconds', type=int, default=10 * 3600, help='Ride length in seconds, one sample per second')
+parser.add_argument('--rides', type=int, default=16, help='Number of rides filtered at once by the filter bank')
+args = parser.parse_args()
+
+ride = make_ride(args.seconds, 0)
+Q = [q for name, q, r, function in CHANNELS]
+R = [r for name, q, r, function in CHANNELS]
+differences = 0
+print("{} samples per channel".format(args.seconds))
+print("{:<28} {:>12} {:>10}".format('method', 'ms', 'speedup'))
+
+t_streaming = 0.0
+t_batch = 0.0
+streaming = numpy.empty(ride.shape)
+for c in range(len(CHANNELS)):
+    t, streaming[:, c] = measure(lambda: filter_streaming(Q[c], R[c], ride[:, c]))
+    t_streaming += t
+    t, batch = measure(lambda: filter_batch(Q[c], R[c], ride[:, c]))
+    t_batch += t
+    differences += numpy.count_nonzero(batch != streaming[:, c])
+print("{:<28} {:>12.1f} {:>10}".format('streaming, per channel', 1000 * t_streaming, ''))
+print("{:<28} {:>12.1f} {:>9.1f}x".format('batch, per channel', 1000 * t_batch, t_streaming / t_batch))
+
+t_bank, bank = measure(lambda: filter_bank(Q, R, ride))
+differences += numpy.count_nonzero(bank != streaming)
+print("{:<28} {:>12.1f} {:>9.1f}x".format('bank, {} channels'.format(len(CHANNELS)), 1000 * t_bank, t_streaming / t_bank))
+
+# Many rides at once, streaming time is estimated from the first ride
+rides = numpy.hstack([ride] + [make_ride(args.seconds, seed) for seed in range(1, args.rides)])
+t_rides, bank = measure(lambda: filter_bank(Q * args.rides, R * args.rides, rides))
+differences += numpy.count_nonzero(bank[:, :len(CHANNELS)] != streaming)
+print("{:<28} {:>12.1f} {:>9.1f}x".format('bank, {} channels'.format(rides.shape[1]), 1000 * t_rides, args.rides * t_streaming / t_rides))
+print("{} differences".format(differences))
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Layout rendering benchmark. Each layout from code/layouts/ is loaded with layout_loader and all its pages (except
+# editors) are rendered offscreen with synthetic parameter updates: speed, cadence, heart rate and time ticking.
+# Results (frames/s, per-field cost, text extents calls and allocations) are written to a JSON file. Use --compare
+# to show differences with results of a previous run.
+#
+# Run from any directory: python3 tests/benchmark_layout.py [-n FRAMES] [-o RESULTS.json] [--compare OLD.json]
+
+import argparse
+import cairo
+import collections
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+CODE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+sys.path.insert(0, os.path.join(CODE_DIR, 'src'))
+
+import frame_buffers
+import layout
+import pyplum
+import render_scheduler
+
+## @var RESULTS_VERSION
+# Version of the results format, results with different versions are not compared
+RESULTS_VERSION = 1
+## @var WIDTH
+# Screen width
+WIDTH = 240
+## @var HEIGHT
+# Screen height
+HEIGHT = 320
+## @var SYNTHETIC
+# Parameters with synthetic values: raw unit, unit and function returning value for frame number
+SYNTHETIC = {
+    'real_time': ('s', 's', lambda i: 1500000000.0 + 0.1 * i),
+    'speed': ('m/s', 'km/h', lambda i: 8.0 + 3.0 * math.sin(i / 20.0)),
+    'cadence': ('RPM', 'RPM', lambda i: 85.0 + 5.0 * math.sin(i / 7.0)),
+    'heart_rate': ('BPM', 'BPM', lambda i: 140.0 + 10.0 * math.sin(i / 30.0)),
+}
+
+
+## Layout measuring time spent on each field
+class benchmark_layout(layout.layout):
+    def __init__(self):
+        ## @var field_costs
+        #  Dict with field meta names as keys and lists of times (state + painting) in seconds as values
+        self.field_costs = collections.defaultdict(list)
+        super().__init__(start_thread=False)
+
+    def get_field_state(self, op):
+        start = time.perf_counter()
+        state = super().get_field_state(op)
+        self.field_costs[op.meta_name].append(time.perf_counter() - start)
+        return state
+
+    def render_field(self, op, state):
+        start = time.perf_counter()
+        rect = super().render_field(op, state)
+        self.field_costs[op.meta_name][-1] += time.perf_counter() - start
+        return rect
+
+
+## Returns list with layout locations: directories with one page per file and layout files with all pages
+def find_layouts():
+    layouts_dir = os.path.join(CODE_DIR, 'layouts')
+    locations = list()
+    for entry in sorted(os.listdir(layouts_dir)):
+        path = os.path.join(layouts_dir, entry)
+        if os.path.isdir(path):
+            locations.append(os.path.join('layouts', entry) + '/')
+        elif entry.endswith('.yaml'):
+            locations.append(os.path.join('layouts', entry))
+    return locations
+
+
+## Registers parameters used by fields of a page. Parameters with units selected by format get the first unit.
+def register_parameters(pm, page):
+    for name, (raw_unit, unit, function) in SYNTHETIC.items():
+        if name not in pm.parameters:
+            pm.register_parameter(name, value=function(0), raw_unit=raw_unit, unit=unit)
+    for field in (page['fields'] or {}).values():
+        for name in (field['parameter'], (field.get('variable') or {}).get('name')):
+            if name is not None and name not in pm.parameters:
+                pm.register_parameter(name, value=0)
+        if type(field.get('format')) is dict and pm.parameters[field['parameter']]['unit'] not in field['format']:
+            pm.parameters[field['parameter']]['unit'] = next(iter(field['format']))
+
+
+## Sets synthetic parameter values for a frame
+def update_parameters(pm, frame):
+    for name, (raw_unit, unit, function) in SYNTHETIC.items():
+        pm.set_value(name, function(frame))
+
+
+## Renders frames and returns list with frame times in seconds
+def render_frames(pm, lay, buffers, frames, full_redraw):
+    times = list()
+    for i in range(frames):
+        update_parameters(pm, i)
+        lay.full_redraw = full_redraw
+        start = time.perf_counter()
+        lay.refresh_display()
+        times.append(time.perf_counter() - start)
+        # Act as a rendering plugin, so buffers are swapped
+        buffers.take()
+        buffers.release()
+    return times
+
+
+## Benchmarks one page. Returns dict with results.
+def benchmark_page(pm, lay, buffers, page_id, frames):
+    lay.use_page(page_id)
+    register_parameters(pm, lay.page)
+    # Warm up caches (images, text extents, static layer)
+    render_frames(pm, lay, buffers, 10, True)
+    lay.field_costs.clear()
+    hits, misses = lay.text_extents_hits, lay.text_extents_misses
+    damage_times = render_frames(pm, lay, buffers, frames, False)
+    text_extents = dict(calls=lay.text_extents_hits + lay.text_extents_misses - hits - misses,
+                        cairo_calls=lay.text_extents_misses - misses)
+    fields = {meta_name: dict(calls=len(costs), mean_us=1e6 * sum(costs) / len(costs))
+              for meta_name, costs in lay.field_costs.items()}
+    full_times = render_frames(pm, lay, buffers, frames, True)
+    # Allocations are measured in a separate run, tracemalloc slows down rendering
+    gc.collect()
+    gc_before = gc.get_stats()[0]['collections']
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    render_frames(pm, lay, buffers, frames, False)
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    allocated = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    allocations = dict(blocks_per_frame=allocated / frames, peak_bytes=peak,
+                       gc_gen0_per_frame=(gc.get_stats()[0]['collections'] - gc_before) / frames)
+    return dict(fps_damage=len(damage_times) / sum(damage_times), fps_full=len(full_times) / sum(full_times),
+                frame_ms_damage=1000 * sorted(damage_times)[len(damage_times) // 2],
+                frame_ms_full=1000 * sorted(full_times)[len(full_times) // 2],
+                text_extents=text_extents, allocations=allocations, fields=fields)
+
+
+## Benchmarks all pages of a layout. Returns dict with page ids as keys and results as values.
+def benchmark_layout_location(pm, buffers, location, frames):
+    pm.set_value('layout_location', location)
+    lay = benchmark_layout()
+    results = dict()
+    for page_id in sorted(lay.ll.page_files):
+        try:
+            if lay.ll.get_page(page_id)['type'] == 'editor':
+                # Editors need data from editor plugin
+                continue
+        except KeyError:
+            continue
+        print("{} {}".format(location, page_id))
+        results[page_id] = benchmark_page(pm, lay, buffers, page_id, frames)
+    return results
+
+
+## Prints differences between two results files
+def compare(old, new):
+    if old.get('version') != new.get('version'):
+        print("Results versions differ, can't compare")
+        return
+    print("{:<40} {:>12} {:>12} {:>8}".format('layout/page (fps, damage)', 'old', 'new', 'change'))
+    for location, pages in new['layouts'].items():
+        for page_id, result in pages.items():
+            try:
+                old_fps = old['layouts'][location][page_id]['fps_damage']
+            except KeyError:
+                continue
+            change = 100.0 * (result['fps_damage'] - old_fps) / old_fps
+            marker = '  <- regression' if change < -10.0 else ''
+            print("{:<40} {:>12.1f} {:>12.1f} {:>7.1f}%{}".format(location + page_id, old_fps, result['fps_damage'], change, marker))
+
+
+parser = argparse.ArgumentParser(description='Layout rendering benchmark')
+parser.add_argument('-n', '--frames', type=int, default=200, help='Number of frames per page and mode')
+parser.add_argument('-o', '--output', help='Results file, defaults to log/benchmark_layout.<date>.json')
+parser.add_argument('--compare', metavar='OLD_RESULTS', help='Compare results with a previous results file')
+args = parser.parse_args()
+
+# Layouts use paths relative to code directory
+os.chdir(CODE_DIR)
+pm = pyplum.pyplum()
+pm.register_parameter("display_size", value=(WIDTH, HEIGHT))
+pm.register_parameter("fonts_dir", value='fonts/')
+pm.register_parameter("layout_location", value=None)
+scheduler = render_scheduler.render_scheduler()
+buffers = frame_buffers.frame_buffers(cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT), WIDTH, HEIGHT, scheduler)
+pm.register_frame_buffers('benchmark_layout', buffers)
+pm.register_cairo_overlay('benchmark_layout', cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)))
+
+results = dict(version=RESULTS_VERSION, time=time.strftime("%Y-%m-%d %H:%M:%S"), python=platform.python_version(),
+               machine=platform.machine(), frames=args.frames, layouts=dict())
+for location in find_layouts():
+    results['layouts'][location] = benchmark_layout_location(pm, buffers, location, args.frames)
+output = args.output or "log/benchmark_layout." + time.strftime("%Y-%m-%d-%H:%M:%S") + ".json"
+with open(output, 'w') as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+print("Results written to {}".format(output))
+if args.compare is not None:
+    with open(args.compare) as f:
+        compare(json.load(f), results)
+pm.stop()
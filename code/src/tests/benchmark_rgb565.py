@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compares copying frames to PiTFT framebuffer in the default mode (ARGB32 buffers converted to RGB565 by cairo) and
+# in RGB565 mode (--rgb565, rows copied without conversion) with the copy functions of pitft_rendering. Framebuffer is
+# emulated with anonymous memory (or a bytearray with --bytearray), so the benchmark can be run on any machine with
+# pycairo.
+#
+# Run from any directory: python3 tests/benchmark_rgb565.py [-n FRAMES] [--bytearray]
+
+import argparse
+import cairo
+import mmap
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from plugins.pitft_rendering import pitft_rendering
+
+WIDTH, HEIGHT = 240, 320
+# Damage rectangles of a typical frame: speed value and a small field
+DAMAGE = [(38, 0, 94, 142), (174, 61, 52, 85)]
+
+
+def make_frame(image_format):
+    if image_format is None:
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)
+    else:
+        surface = cairo.ImageSurface(image_format, WIDTH, HEIGHT)
+    ctx = cairo.Context(surface)
+    ctx.set_source_rgb(0.1, 0.2, 0.3)
+    ctx.paint()
+    ctx.set_source_rgb(1.0, 1.0, 1.0)
+    ctx.set_font_size(100)
+    ctx.move_to(40, 120)
+    ctx.show_text("27")
+    return surface
+
+
+def measure(function, frames):
+    start = time.perf_counter()
+    for i in range(frames):
+        function()
+    return (time.perf_counter() - start) / frames
+
+
+parser = argparse.ArgumentParser(description='PiTFT framebuffer copy benchmark')
+parser.add_argument('-n', '--frames', type=int, default=1000, help='Number of frames per test')
+parser.add_argument('--bytearray', action='store_true', help='Use bytearray instead of mmap as the framebuffer memory')
+args = parser.parse_args()
+
+stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_RGB16_565, WIDTH)
+if args.bytearray:
+    fb_map = bytearray(stride * HEIGHT)
+else:
+    fb_map = mmap.mmap(-1, stride * HEIGHT)
+fb_surface = cairo.ImageSurface.create_for_data(fb_map, cairo.FORMAT_RGB16_565, WIDTH, HEIGHT, stride)
+fb_ctx = cairo.Context(fb_surface)
+argb = make_frame(None)
+rgb565 = make_frame(cairo.FORMAT_RGB16_565)
+full = [(0, 0, WIDTH, HEIGHT)]
+
+print("{:<10} {:<8} {:>12} {:>10}".format('mode', 'damage', 'ms/frame', 'speedup'))
+for name, damage in (('full', full), ('fields', DAMAGE)):
+    t_argb = measure(lambda: pitft_rendering.paint_to_framebuffer(fb_ctx, argb, damage), args.frames)
+    t_rgb565 = measure(lambda: pitft_rendering.memcpy_to_framebuffer(fb_map, rgb565, damage), args.frames)
+    print("{:<10} {:<8} {:>12.4f} {:>10}".format('argb32', name, t_argb * 1000, ''))
+    print("{:<10} {:<8} {:>12.4f} {:>9.1f}x".format('rgb565', name, t_rgb565 * 1000, t_argb / t_rgb565))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compares converting ride log columns value by value (unit_converter.convert and num.sanitise) with batch
+# conversion (unit_converter.convert_array and num.sanitise_array). Columns of a synthetic 10 hour ride logged at 1 Hz
+# are used. Values are strings as read from a ride log, with missing values ('-') where a sensor drops out.
+# Results of both methods have to be equal.
+#
+# Run from any directory: python3 tests/benchmark_unit_conversion.py [-s SECONDS] [-r REPEAT]
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from helpers import num
+import helpers
+
+## @var COLUMNS
+# Ride log columns: name, unit in the log, target unit and function returning value for second of the ride
+COLUMNS = (
+    ('speed', 'km/h', 'mi/h', lambda i: 25.0 + 8.0 * math.sin(i / 300.0)),
+    ('pressure', 'Pa', 'inHg', lambda i: 101325.0 - 20.0 * math.sin(i / 1800.0)),
+    ('temperature', 'C', 'F', lambda i: 18.0 + 6.0 * math.sin(i / 7200.0)),
+    ('altitude', 'm', 'ft', lambda i: 150.0 + 120.0 * math.sin(i / 2400.0)),
+    ('odometer', 'km', 'mi', lambda i: 1200.0 + i * 0.007),
+    ('slope', 'm/m', '%', lambda i: 0.05 * math.sin(i / 90.0)),
+)
+## @var DROPOUT
+# Fraction of missing values
+DROPOUT = 0.01
+
+
+## Returns list with column values formatted as in a ride log
+def make_column(function, seconds):
+    random.seed(seconds)
+    column = list()
+    for i in range(seconds):
+        if random.random() < DROPOUT:
+            column.append('-')
+        else:
+            column.append("{:<8}".format("%.1f" % function(i)))
+    return column
+
+
+## Converts column value by value, missing values are kept
+def convert_values(uc, column, source_unit, target_unit):
+    converted = list()
+    for value in column:
+        try:
+            converted.append(num.sanitise(uc.convert(float(value), source_unit, target_unit)))
+        except ValueError:
+            converted.append('-')
+    return converted
+
+
+## Converts column with one call
+def convert_batch(uc, column, source_unit, target_unit):
+    return num.sanitise_array(uc.convert_array(column, source_unit, target_unit))
+
+
+## Returns the shortest time of function calls in seconds and the result
+def measure(function, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+parser = argparse.ArgumentParser(description='Unit conversion benchmark')
+parser.add_argument('-s', '--seconds', type=int, default=10 * 3600, help='Ride length in seconds, one log entry per second')
+parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of measurements, the best one is shown')
+args = parser.parse_args()
+
+uc = helpers.unit_converter()
+print("{} log entries per column".format(args.seconds))
+print("{:<12} {:>12} {:>12} {:>12} {:>8}".format('column', 'units', 'values ms', 'batch ms', 'speedup'))
+total_values = total_batch = 0.0
+differences = 0
+for name, source_unit, target_unit, function in COLUMNS:
+    column = make_column(function, args.seconds)
+    t_values, values = measure(lambda: convert_values(uc, column, source_unit, target_unit), args.repeat)
+    t_batch, batch = measure(lambda: convert_batch(uc, column, source_unit, target_unit), args.repeat)
+    differences += sum(1 for a, b in zip(values, batch) if a != b)
+    total_values += t_values
+    total_batch += t_batch
+    print("{:<12} {:>12} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+        name, source_unit + '>' + target_unit, 1000 * t_values, 1000 * t_batch, t_values / t_batch))
+print("Total: {:.1f}x faster, {} differences".format(total_values / total_batch, differences))
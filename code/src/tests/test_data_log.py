@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks ride log entries written by data_log: hhmmss truncates fractions of seconds like the display does (the log
+# used to round them, i.e. 59.9 s was logged as 00:00:60), columns without format use %.1f, NaN and infinite values
+# are logged as '-' and other values that can't be formatted as strings. The plugin is created without starting the
+# log timer, entries are added by the test.
+#
+# Run with pytest from code/src directory: python3 -m pytest tests/test_data_log.py
+
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import helpers
+import pyplum
+from plugins import data_log
+
+## @var COLUMNS
+# Ride log columns
+COLUMNS = [
+    dict(name='session_time', parameter='test_session_time', description='Session', format='hhmmss'),
+    dict(name='session_time_s', parameter='test_session_time', description='Session s', format='hhmmss.s'),
+    dict(name='speed', parameter='test_speed', description='Speed'),
+]
+
+
+@pytest.fixture
+def ride_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    os.mkdir('log')
+    pm = pyplum.pyplum()
+    for name, raw_unit in (('test_session_time', 's'), ('test_speed', 'm/s')):
+        if name not in pm.parameters:
+            pm.register_parameter(name, value=None, raw_unit=raw_unit)
+    dl = data_log.data_log.__new__(data_log.data_log)
+    dl.log = logging.getLogger('system')
+    dl.pm = pm
+    dl.uc = helpers.unit_converter()
+    dl.running = False
+    dl.config_params = dict(columns=COLUMNS)
+    dl.init_log()
+    handlers = list(dl.data_logger.handlers)
+    yield dl
+    for handler in handlers:
+        dl.data_logger.removeHandler(handler)
+        handler.close()
+
+
+## Adds ride log entry and returns its columns
+def add_entry(dl, session_time, speed):
+    dl.pm.set_value('test_session_time', session_time)
+    dl.pm.set_value('test_speed', speed)
+    dl.add_entry()
+    log_file = os.path.join('log', os.listdir('log')[0])
+    with open(log_file) as f:
+        return [c.strip() for c in f.readlines()[-1].split(',')]
+
+
+def test_header(ride_log):
+    with open(os.path.join('log', os.listdir('log')[0])) as f:
+        assert [c.strip() for c in f.readline().split(',')] == ['Session', 'Session s', 'Speed']
+
+
+def test_hhmmss_truncated(ride_log):
+    assert add_entry(ride_log, 59.9, 1.25) == ['00:00:59', '00:00:59.9', '1.2']
+    assert add_entry(ride_log, 3599.99, 10.0) == ['00:59:59', '00:59:60.0', '10.0']
+    assert add_entry(ride_log, 3600.0, 0.0) == ['01:00:00', '01:00:0.0', '0.0']
+
+
+def test_not_numbers(ride_log):
+    assert add_entry(ride_log, float('nan'), None) == ['-', '-', 'None']
+    assert add_entry(ride_log, float('inf'), float('-inf')) == ['-', '-', '-']
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks helpers.formatter: time formats with finite, NaN and infinite values, % formatting of values that are not
+# numbers and results of a formatter remembering the last value against a compiled function called for each value.
+#
+# Run from any directory: python3 tests/test_formatter.py
+
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import helpers
+
+## @var NOT_FINITE
+# Values that are returned unchanged by time formats
+NOT_FINITE = (float('nan'), float('inf'), float('-inf'))
+## @var NOT_NUMBERS
+# Values that are not numbers, i.e. '-' set by sanitise or '' from an empty field
+NOT_NUMBERS = (None, '-', '', 'abc')
+
+
+## Returns True if formatted value is the same object or NaN for NaN
+def unchanged(result, value):
+    if value != value:
+        return result != result
+    return result is value
+
+
+def test_hhmmss():
+    f = helpers.formatter.compile('hhmmss')
+    assert f(0) == '00:00:00'
+    assert f(3725) == '01:02:05'
+    # Fractions of seconds are truncated, not rounded
+    assert f(59.9) == '00:00:59'
+    assert f(3599.99) == '00:59:59'
+    assert f(-0.0) == '00:00:00'
+    assert f(360000) == '100:00:00'
+    for value in NOT_FINITE + NOT_NUMBERS:
+        assert unchanged(f(value), value)
+
+
+def test_hhmmss_s():
+    f = helpers.formatter.compile('hhmmss.s')
+    assert f(0.0) == '00:00:0.0'
+    assert f(3725.97) == '01:02:6.0'
+    assert f(3735.25) == '01:02:15.2'
+    assert f(-0.0) == '-0:00:0.0'
+    for value in NOT_FINITE + NOT_NUMBERS:
+        assert unchanged(f(value), value)
+
+
+def test_time():
+    f = helpers.formatter.compile('time')
+    timestamp = datetime.datetime(2020, 5, 17, 13, 4, 5).timestamp()
+    assert f(timestamp) == '13:04:05'
+    assert f(timestamp + 0.9) == '13:04:05'
+    for value in NOT_FINITE + NOT_NUMBERS:
+        assert unchanged(f(value), value)
+
+
+def test_date():
+    f = helpers.formatter.compile('date')
+    timestamp = datetime.datetime(2020, 5, 17, 23, 59, 59).timestamp()
+    assert f(timestamp) == '2020-05-17'
+    for value in NOT_FINITE + NOT_NUMBERS:
+        assert unchanged(f(value), value)
+
+
+def test_printf():
+    f = helpers.formatter.compile('%.1f')
+    assert f(1.25) == '1.2'
+    assert f(3) == '3.0'
+    # Strings with numbers are formatted as numbers
+    assert f('2.56') == '2.6'
+    assert f(-0.0) == '-0.0'
+    assert f(float('nan')) == 'nan'
+    assert f(float('inf')) == 'inf'
+    assert f(float('-inf')) == '-inf'
+    # Values that are not numbers are converted to strings
+    assert f(None) == 'None'
+    assert f('-') == '-'
+    assert f('') == ''
+    assert f('abc') == 'abc'
+    assert f([1]) == '[1]'
+    # Integer formats can't format NaN and infinity
+    f = helpers.formatter.compile('%d')
+    assert f(2.7) == '2'
+    assert f(float('nan')) == 'nan'
+    assert f(float('inf')) == 'inf'
+
+
+def test_compiled_once():
+    assert helpers.formatter.compile('%.3f') is helpers.formatter.compile('%.3f')
+    assert helpers.formatter('hhmmss').function is helpers.formatter.compile('hhmmss')
+
+
+def test_memoised():
+    values = [1.0, 1.0, 1, 1, True, 2.5, 2.5, 0.0, -0.0, 0, -0.0, 0.0, float('nan'), float('nan'), float('inf'),
+              float('inf'), None, None, '-', '-', '', '', 3725.0, 3725]
+    for format_string in ('hhmmss', 'hhmmss.s', 'time', 'date', '%.1f', '%.0f', '%d'):
+        f = helpers.formatter(format_string)
+        for value in values + list(reversed(values)):
+            expected = helpers.formatter.compile(format_string)(value)
+            result = f(value)
+            assert result == expected or (result != result and expected != expected), (format_string, value)
+            assert type(result) is type(expected)
+
+
+if __name__ == '__main__':
+    for name, function in list(globals().items()):
+        if name.startswith('test_'):
+            function()
+    print("OK")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks frame handoff of frame_buffers: regions changed by published frames are copied to the next back buffer from
+# the latest one, the renderer gets the latest frame with merged damage and buffers used by the renderer are not drawn.
+# Cairo contexts of the buffers are replaced with contexts recording calls, so no pixels are compared. Requires pycairo
+# to create the buffers.
+#
+# Run with pytest from code/src directory: python3 -m pytest tests/test_frame_buffers.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+cairo = pytest.importorskip('cairo')
+
+import frame_buffers
+
+## @var WIDTH
+# Width of the buffers
+WIDTH = 240
+## @var HEIGHT
+# Height of the buffers
+HEIGHT = 320
+
+
+## Cairo context replacement recording calls as tuples (method name, arguments...)
+class recording_context():
+    def __init__(self):
+        self.calls = list()
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name,) + args)
+
+    ## Returns source surface and list with clip rectangles of a copy done since the last call, None if nothing was
+    #  copied. Rectangles are None if the whole buffer was copied.
+    def pop_copy(self):
+        calls = self.calls
+        self.calls = list()
+        if not calls:
+            return None
+        assert calls[0] == ('save',) and calls[-1] == ('restore',)
+        assert ('set_operator', cairo.OPERATOR_SOURCE) in calls
+        assert ('paint',) in calls
+        source = [c[1] for c in calls if c[0] == 'set_source_surface'][0]
+        rects = [c[1:] for c in calls if c[0] == 'rectangle']
+        if ('clip',) not in calls:
+            rects = None
+        return source, rects
+
+
+## render_scheduler replacement counting published frames
+class counting_scheduler():
+    def __init__(self):
+        self.frames = 0
+
+    def frame_ready(self):
+        self.frames += 1
+
+
+@pytest.fixture
+def buffers():
+    fb = frame_buffers.frame_buffers(cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT), WIDTH, HEIGHT, counting_scheduler())
+    fb.contexts = [recording_context() for i in range(fb.BUFFERS)]
+    return fb
+
+
+## Acquires back buffer, returns its index and the copy done by acquire, see recording_context.pop_copy
+def acquire(fb):
+    ctx = fb.acquire()
+    return fb.contexts.index(ctx), ctx.pop_copy()
+
+
+def test_no_frame(buffers):
+    assert buffers.take() == (None, [])
+    assert buffers.get_render_time() is None
+
+
+def test_stale_regions_copied(buffers):
+    fb = buffers
+    first, copy = acquire(fb)
+    # Nothing published yet, nothing to copy
+    assert copy is None
+    fb.publish([(0, 0, 10, 10)])
+    assert fb.scheduler.frames == 1
+
+    second, copy = acquire(fb)
+    assert second != first
+    # Region published in the first buffer is brought up to date
+    assert copy == (fb.surfaces[first], [(0, 0, 10, 10)])
+    fb.publish([(20, 20, 5, 5)])
+
+    # Without renderer two buffers are used, only regions published after the buffer was drawn are copied
+    back, copy = acquire(fb)
+    assert back == first
+    assert copy == (fb.surfaces[second], [(20, 20, 5, 5)])
+    fb.publish([(30, 30, 1, 1), (40, 40, 2, 2)])
+    back, copy = acquire(fb)
+    assert back == second
+    assert copy == (fb.surfaces[first], [(30, 30, 1, 1), (40, 40, 2, 2)])
+
+
+def test_acquire_twice(buffers):
+    fb = buffers
+    acquire(fb)
+    fb.publish([(0, 0, 10, 10)])
+    back, copy = acquire(fb)
+    assert copy is not None
+    # The same back buffer until publish, nothing is copied again
+    assert acquire(fb) == (back, None)
+
+
+def test_no_damage(buffers):
+    fb = buffers
+    acquire(fb)
+    fb.publish([])
+    back, copy = acquire(fb)
+    assert copy is None
+
+
+def test_full_damage(buffers):
+    fb = buffers
+    first, copy = acquire(fb)
+    fb.publish(None)
+    fb.take()
+    second, copy = acquire(fb)
+    # The whole buffer is copied without clipping
+    assert copy == (fb.surfaces[first], None)
+    fb.publish([])
+    # The renderer uses the first buffer, the third one is still out of date after a frame without changes
+    third, copy = acquire(fb)
+    assert third not in (first, second)
+    assert copy == (fb.surfaces[second], None)
+
+
+def test_take_and_release(buffers):
+    fb = buffers
+    first, copy = acquire(fb)
+    fb.publish([(0, 0, 1, 1)])
+    surface, damage = fb.take()
+    assert surface is fb.surfaces[first]
+    # The first frame after creating the buffers repaints the whole screen
+    assert damage is None
+    assert fb.get_render_time() >= 0.0
+
+    # The renderer copies the first buffer, layout draws three frames without using it
+    second, copy = acquire(fb)
+    assert copy == (fb.surfaces[first], [(0, 0, 1, 1)])
+    fb.publish([(1, 1, 1, 1)])
+    third, copy = acquire(fb)
+    assert first not in (second, third)
+    assert copy == (fb.surfaces[second], [(0, 0, 1, 1), (1, 1, 1, 1)])
+    fb.publish([(2, 2, 2, 2)])
+    back, copy = acquire(fb)
+    assert back == second
+    assert copy == (fb.surfaces[third], [(2, 2, 2, 2)])
+    fb.publish([(3, 3, 3, 3)])
+    fb.release()
+
+    surface, damage = fb.take()
+    assert surface is fb.surfaces[second]
+    # Damage of all frames published since the last take
+    assert damage == [(1, 1, 1, 1), (2, 2, 2, 2), (3, 3, 3, 3)]
+    fb.release()
+    # The released buffer is brought up to date with all frames published while the renderer used it
+    back, copy = acquire(fb)
+    assert back == first
+    assert copy == (fb.surfaces[second], [(1, 1, 1, 1), (2, 2, 2, 2), (3, 3, 3, 3)])
+
+
+def test_invalidate(buffers):
+    fb = buffers
+    acquire(fb)
+    fb.publish([(0, 0, 10, 10)])
+    fb.take()
+    fb.release()
+    fb.invalidate()
+    assert fb.scheduler.frames == 2
+    surface, damage = fb.take()
+    assert damage is None
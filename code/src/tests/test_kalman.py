@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks that batch Kalman filtering gives the same results as streaming: kalman.filter against
+# update_unfiltered_value and update called for each sample (estimates and the final filter state), kalman_bank with
+# fewer and more channels than VECTORISE_CHANNELS against independent filters and the steady state gain shortcut
+# against updating error and gain for every sample. Results have to be identical, not only close. Requires numpy.
+#
+# Run from any directory: python3 tests/test_kalman.py
+
+import copy
+import math
+import os
+import random
+import sys
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import helpers
+
+## @var FILTERS
+# Q and R of tested filters, steady state is reached after 12, 124 and 5058 samples
+FILTERS = ((0.5, 0.1), (0.02, 1.0), (1e-4, 10.0))
+## @var SAMPLES
+# Number of filtered samples, more than needed to reach steady state by all FILTERS
+SAMPLES = 6000
+## @var STATE
+# kalman attributes compared after filtering
+STATE = ('P', 'P_previous', 'K', 'steady', 'value_estimate', 'value_estimate_previous', 'value_unfiltered')
+## @var GAIN_STATE
+# Attributes of kalman filters of kalman_bank compared after filtering, estimates are kept by the bank
+GAIN_STATE = ('P', 'P_previous', 'K', 'steady', 'value_unfiltered')
+
+
+## Returns list with noisy measurements
+def make_measurements(samples, seed=0, offset=100.0):
+    random.seed(seed)
+    return [offset + 10.0 * math.sin(i / 50.0) + random.gauss(0.0, 1.0) for i in range(samples)]
+
+
+## Filters measurements one by one, returns list with estimates
+def stream(k, measurements):
+    estimates = list()
+    for z in measurements:
+        k.update_unfiltered_value(z)
+        k.update()
+        estimates.append(k.value_estimate)
+    return estimates
+
+
+## Returns kalman filter with the first estimate set
+def make_filter(Q, R, first_value):
+    k = helpers.kalman(Q=Q, R=R)
+    k.set_initial_value(first_value)
+    return k
+
+
+## Asserts that two filters have the same state
+def assert_same_state(k1, k2, state=STATE):
+    for name in state:
+        assert getattr(k1, name) == getattr(k2, name), (name, getattr(k1, name), getattr(k2, name))
+
+
+def test_filter():
+    measurements = make_measurements(SAMPLES)
+    for Q, R in FILTERS:
+        k_stream = make_filter(Q, R, measurements[0])
+        k_batch = make_filter(Q, R, measurements[0])
+        expected = stream(k_stream, measurements)
+        estimates = k_batch.filter(numpy.array(measurements))
+        assert estimates.tolist() == expected
+        assert k_batch.steady
+        assert_same_state(k_stream, k_batch)
+
+
+def test_filter_continued():
+    # Batch filtering in chunks shorter and longer than the transient, mixed with streaming
+    measurements = make_measurements(SAMPLES, seed=1)
+    for Q, R in FILTERS:
+        k_stream = make_filter(Q, R, measurements[0])
+        k_mixed = make_filter(Q, R, measurements[0])
+        expected = stream(k_stream, measurements)
+        estimates = list()
+        chunks = (1, 5, 7, 100, 3, 2000)
+        start = 0
+        for i, size in enumerate(chunks):
+            chunk = measurements[start:start + size]
+            if i % 2:
+                estimates += stream(k_mixed, chunk)
+            else:
+                estimates += k_mixed.filter(chunk).tolist()
+            start += size
+        estimates += k_mixed.filter(measurements[start:]).tolist()
+        assert estimates == expected
+        assert_same_state(k_stream, k_mixed)
+
+
+def test_filter_empty():
+    k = make_filter(0.02, 1.0, 5.0)
+    state = [getattr(k, name) for name in STATE]
+    assert len(k.filter([])) == 0
+    assert [getattr(k, name) for name in STATE] == state
+
+
+def test_steady_gain():
+    # Estimates with the steady state shortcut are the same as with error and gain updated for every sample
+    measurements = make_measurements(SAMPLES, seed=2)
+    for Q, R in FILTERS:
+        k = make_filter(Q, R, measurements[0])
+        estimates = stream(k, measurements)
+        assert k.steady
+        P, P_previous, K = 0.245657137142, 0.325657137142, 0.245657137142
+        value_estimate = measurements[0]
+        for z, estimate in zip(measurements, estimates):
+            P_previous = P + Q
+            K = P_previous / (P_previous + R)
+            P = (1 - K) * P_previous
+            value_estimate = value_estimate + K * (z - value_estimate)
+            assert estimate == value_estimate
+        assert (k.P, k.P_previous, k.K) == (P, P_previous, K)
+
+
+def check_bank(Q, R):
+    channels = len(Q)
+    samples = 3000
+    values = numpy.array([make_measurements(samples, seed=c, offset=10.0 * c) for c in range(channels)]).T
+    first = values[0]
+    filters = [make_filter(Q[c], R[c], first[c]) for c in range(channels)]
+    expected = numpy.array([stream(filters[c], values[:, c].tolist()) for c in range(channels)]).T
+    for method in ('filter', 'filter_channels'):
+        bank = helpers.kalman_bank(Q, R)
+        bank.set_initial_value(first)
+        estimates = getattr(bank, method)(values[:1000])
+        estimates = numpy.concatenate((estimates, getattr(bank, method)(values[1000:])))
+        assert numpy.array_equal(estimates, expected), method
+        assert bank.value_estimate.tolist() == [f.value_estimate for f in filters]
+        assert bank.value_estimate_previous.tolist() == [f.value_estimate_previous for f in filters]
+        for f_bank, f in zip(bank.filters, filters):
+            assert_same_state(f_bank, f, GAIN_STATE)
+        # Streaming can be continued, not all channels are in steady state
+        assert not all(f.steady for f in filters)
+        next_values = [f.value_estimate + 1.0 for f in filters]
+        next_filters = copy.deepcopy(filters)
+        assert bank.update(next_values).tolist() == [stream(f, [z])[0] for f, z in zip(next_filters, next_values)]
+
+
+def test_bank_few_channels():
+    assert 3 < helpers.kalman_bank.VECTORISE_CHANNELS
+    check_bank([0.02, 0.5, 1e-4], [1.0, 0.1, 10.0])
+
+
+def test_bank_many_channels():
+    channels = 2 * helpers.kalman_bank.VECTORISE_CHANNELS + 1
+    check_bank([FILTERS[c % 3][0] for c in range(channels)], [FILTERS[c % 3][1] * (1 + c) for c in range(channels)])
+
+
+if __name__ == '__main__':
+    for name, function in list(globals().items()):
+        if name.startswith('test_'):
+            function()
+    print("OK")
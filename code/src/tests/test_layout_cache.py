@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks layout cache of layout_loader: converted pages are read from the cache, a layout file with changed
+# modification time or size and a cache written by a different CACHE_VERSION are converted again and a corrupt cache
+# file doesn't break loading. Requires pycairo.
+#
+# Run with pytest from code/src directory: python3 -m pytest tests/test_layout_cache.py
+
+import os
+import pickle
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+pytest.importorskip('cairo')
+
+import layout_loader
+import pyplum
+
+## @var PAGE
+# Single page layout file
+PAGE = """id: {page_id}
+fields:
+  - parameter: speed
+    x: 10
+    y: 20
+"""
+
+
+## Writes page files to directory
+def write_pages(directory, page_ids):
+    for page_id in page_ids:
+        with open(os.path.join(directory, page_id + '.yaml'), 'w') as f:
+            f.write(PAGE.format(page_id=page_id))
+
+
+## Returns layout_loader for a layout directory, with all pages loaded and the layout cache written
+def load(directory):
+    pm = pyplum.pyplum()
+    for name, value in (('fonts_dir', 'fonts/'), ('layout_location', None)):
+        if name not in pm.parameters:
+            pm.register_parameter(name, value=value)
+    pm.set_value('layout_location', os.path.join(str(directory), ''))
+    ll = layout_loader.layout_loader()
+    for page_id in list(ll.page_files):
+        ll.get_page(page_id)
+    ll.flush_layout_cache()
+    return ll
+
+
+@pytest.fixture
+def converted(monkeypatch):
+    files = list()
+    load_layout_tree_from_file = layout_loader.layout_loader.load_layout_tree_from_file
+
+    def counting_load(self, layout_file):
+        files.append(os.path.basename(layout_file))
+        return load_layout_tree_from_file(self, layout_file)
+    monkeypatch.setattr(layout_loader.layout_loader, 'load_layout_tree_from_file', counting_load)
+    return files
+
+
+@pytest.fixture
+def layout_dir(tmp_path, converted):
+    write_pages(str(tmp_path), ('page_0', 'page_1'))
+    load(tmp_path)
+    assert sorted(converted) == ['page_0.yaml', 'page_1.yaml']
+    converted.clear()
+    return tmp_path
+
+
+def test_cache_used(layout_dir, converted):
+    ll = load(layout_dir)
+    assert converted == []
+    assert sorted(ll.pages) == ['page_0', 'page_1']
+    assert ll.get_page('page_0')['fields']['speed']['origin'] == (10, 20)
+
+
+def test_cache_written_on_flush(tmp_path, converted, monkeypatch):
+    write_pages(str(tmp_path), ('page_0', 'page_1'))
+    written = list()
+    write_layout_cache = layout_loader.layout_loader.write_layout_cache
+
+    def counting_write(self, cache_file, files):
+        written.append(sorted(os.path.basename(f) for f in files))
+        write_layout_cache(self, cache_file, files)
+    monkeypatch.setattr(layout_loader.layout_loader, 'write_layout_cache', counting_write)
+    ll = load(tmp_path)
+    # Single page files are converted on the first use, the cache is written by flush, not on each page switch
+    assert written == [['page_0.yaml', 'page_1.yaml']]
+    ll.flush_layout_cache()
+    assert len(written) == 1
+    converted.clear()
+    load(tmp_path)
+    assert converted == []
+    assert len(written) == 1
+
+
+def test_changed_mtime(layout_dir, converted):
+    path = os.path.join(str(layout_dir), 'page_1.yaml')
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    load(layout_dir)
+    assert converted == ['page_1.yaml']
+    # The updated cache is used by the next load
+    converted.clear()
+    load(layout_dir)
+    assert converted == []
+
+
+def test_changed_size(layout_dir, converted):
+    path = os.path.join(str(layout_dir), 'page_1.yaml')
+    st = os.stat(path)
+    with open(path, 'w') as f:
+        f.write(PAGE.format(page_id='page_1').replace('x: 10', 'x: 100'))
+    # Same modification time, only the size differs
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    ll = load(layout_dir)
+    assert converted == ['page_1.yaml']
+    assert ll.get_page('page_1')['fields']['speed']['origin'] == (100, 20)
+
+
+def test_cache_version(layout_dir, converted, monkeypatch):
+    monkeypatch.setattr(layout_loader.layout_loader, 'CACHE_VERSION', layout_loader.layout_loader.CACHE_VERSION + 1)
+    load(layout_dir)
+    assert sorted(converted) == ['page_0.yaml', 'page_1.yaml']
+
+
+@pytest.mark.parametrize('content', [
+    b'',
+    b'not a pickle',
+    pickle.dumps(dict(version=layout_loader.layout_loader.CACHE_VERSION, files={}))[:-5],
+    pickle.dumps(['not', 'a', 'dict']),
+    pickle.dumps(dict(version=layout_loader.layout_loader.CACHE_VERSION)),
+    # Class from a module that doesn't exist
+    b'cmissing_module\nmissing_class\n.',
+])
+def test_corrupt_cache(layout_dir, converted, content):
+    with open(os.path.join(str(layout_dir), layout_loader.layout_loader.CACHE_SUFFIX), 'wb') as f:
+        f.write(content)
+    ll = load(layout_dir)
+    assert sorted(converted) == ['page_0.yaml', 'page_1.yaml']
+    assert ll.get_page('page_0')['fields']['speed']['origin'] == (10, 20)
+    # The cache is written again
+    converted.clear()
+    load(layout_dir)
+    assert converted == []
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks that page background and buttons images are kept in the image cache of layout_loader: they count towards the
+# budget, images of pinned pages (the current one and its neighbours) are not evicted and images of other pages are.
+# Images are not read from files, every image is a 64x64 surface. Requires pycairo.
+#
+# Run with pytest from code/src directory: python3 -m pytest tests/test_layout_images.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+cairo = pytest.importorskip('cairo')
+
+import image_cache
+import layout_loader
+import pyplum
+
+## @var PAGE
+# Single page layout file
+PAGE = """id: page_{n}
+right: page_{next}
+background_image: bg_{n}.png
+buttons_image: buttons_{n}.png
+fields:
+  - parameter: speed
+    file: icon_{n}.png
+    x: 10
+    y: 20
+"""
+
+
+@pytest.fixture
+def ll(tmp_path, monkeypatch):
+    for n in range(3):
+        with open(os.path.join(str(tmp_path), 'page_{}.yaml'.format(n)), 'w') as f:
+            f.write(PAGE.format(n=n, next=(n + 1) % 3))
+    monkeypatch.setattr(layout_loader.layout_loader, 'png_to_cairo_surface',
+                        lambda self, image_path: cairo.ImageSurface(cairo.FORMAT_ARGB32, 64, 64))
+    pm = pyplum.pyplum()
+    for name, value in (('fonts_dir', 'fonts/'), ('layout_location', None)):
+        if name not in pm.parameters:
+            pm.register_parameter(name, value=value)
+    pm.set_value('layout_location', os.path.join(str(tmp_path), ''))
+    return layout_loader.layout_loader()
+
+
+def test_budget_parameter(ll):
+    assert pyplum.pyplum().parameters['image_cache_budget']['value'] == image_cache.image_cache.BUDGET
+    assert ll.images.budget == image_cache.image_cache.BUDGET
+
+
+def test_page_images_cached(ll):
+    page = ll.get_page('page_0')
+    assert 'background_image' not in page
+    assert 'bg_0.png' in ll.images
+    assert 'buttons_0.png' in ll.images
+    assert ll.get_page_images(page) == ['bg_0.png', 'buttons_0.png', 'icon_0.png']
+    # Background and buttons images count towards the budget
+    assert ll.images.size == ll.images.get_image_size(ll.get_image('bg_0.png')) * 2
+
+
+def test_pinned_pages(ll):
+    ll.get_page('page_0')
+    ll.pin_pages(['page_0', 'page_1', None])
+    # No memory for images that are not pinned
+    ll.images.budget = 0
+    # Prefetched neighbour is pinned before its images are loaded
+    ll.get_page('page_1')
+    assert 'bg_1.png' in ll.images
+    assert 'buttons_1.png' in ll.images
+    assert 'bg_0.png' in ll.images
+    ll.get_page('page_2')
+    ll.images.evict()
+    assert 'bg_2.png' not in ll.images
+    assert 'bg_0.png' in ll.images
+    # Switch to page_2, images of page_0 and page_1 can be evicted
+    ll.pin_pages(['page_2'])
+    assert 'bg_0.png' not in ll.images
+    assert 'bg_1.png' not in ll.images
+    assert ll.get_image('bg_2.png') is not None
+    assert ll.images.pinned == frozenset(['bg_2.png', 'buttons_2.png', 'icon_2.png'])
+
+
+def test_evicted_image_reloaded(ll):
+    ll.get_page('page_0')
+    ll.images.budget = 0
+    ll.pin_pages(['page_1'])
+    assert 'bg_0.png' not in ll.images
+    # The page doesn't hold the evicted image, it's loaded again on use
+    assert ll.get_image('bg_0.png') is not None
+    assert ll.images.misses == 3
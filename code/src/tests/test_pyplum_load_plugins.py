@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks parallel plugin loading by pyplum.load_plugins with plugins generated in a temporary directory: plugins are
+# initialised after plugins from their DEPENDS, kept in the requested order and an exception raised by a plugin
+# __init__ is re-raised after all plugins finished. Also checks that a singleton requested from many threads at once
+# is created only once.
+#
+# Run from any directory: python3 tests/test_pyplum_load_plugins.py
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyplum
+import singleton
+
+## @var PLUGINS
+# Source code of the generated plugins. Each plugin appends its name to events when its __init__ starts and finishes.
+PLUGINS = {
+    'slow_plugin': """
+import time
+events = []
+
+class slow_plugin():
+    DEPENDS = ()
+    def __init__(self):
+        events.append('slow_plugin start')
+        time.sleep(0.2)
+        events.append('slow_plugin end')
+""",
+    'dependent_plugin': """
+from . import slow_plugin
+
+class dependent_plugin():
+    DEPENDS = ('slow_plugin',)
+    def __init__(self):
+        slow_plugin.events.append('dependent_plugin start')
+""",
+    'independent_plugin': """
+from . import slow_plugin
+
+class independent_plugin():
+    DEPENDS = ('missing_plugin',)
+    def __init__(self):
+        slow_plugin.events.append('independent_plugin start')
+""",
+    'failing_plugin': """
+class failing_plugin():
+    DEPENDS = ('slow_plugin',)
+    def __init__(self):
+        raise ValueError('failing_plugin init failed')
+""",
+}
+
+
+## Writes the plugins to a package in a temporary directory and returns the package name
+def make_plugins_package():
+    directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, directory, True)
+    package = 'test_plugins_{}'.format(os.getpid())
+    os.mkdir(os.path.join(directory, package))
+    with open(os.path.join(directory, package, '__init__.py'), 'w') as f:
+        f.write("__all__ = {}\n".format(list(PLUGINS)))
+    for name, source in PLUGINS.items():
+        with open(os.path.join(directory, package, name + '.py'), 'w') as f:
+            f.write(source)
+    sys.path.insert(0, directory)
+    return package
+
+
+## Loads plugins and returns the exception re-raised by load_plugins and events recorded by plugins
+def load(package, plugins_list):
+    pm = pyplum.pyplum()
+    error = None
+    try:
+        pm.load_plugins(package, plugins_list)
+    except Exception as e:
+        error = e
+    events = list(sys.modules[package + '.slow_plugin'].events)
+    sys.modules[package + '.slow_plugin'].events.clear()
+    return pm, error, events
+
+
+## Removes loaded plugins from pyplum
+def unload(pm, plugins_list):
+    for name in plugins_list:
+        pm.plugins.pop(name, None)
+        pm.startup_times.pop(name, None)
+
+
+PACKAGE = make_plugins_package()
+
+
+def test_depends():
+    plugins_list = ['dependent_plugin', 'independent_plugin', 'slow_plugin']
+    pm, error, events = load(PACKAGE, plugins_list)
+    try:
+        assert error is None
+        # Plugin without dependency on slow_plugin doesn't wait for it
+        assert events.index('independent_plugin start') < events.index('slow_plugin end')
+        assert events.index('dependent_plugin start') > events.index('slow_plugin end')
+        assert [name for name in pm.plugins if name in plugins_list] == plugins_list
+        assert pm.startup_times['dependent_plugin']['wait_time'] >= 0.1
+    finally:
+        unload(pm, plugins_list)
+
+
+def test_init_error():
+    plugins_list = ['failing_plugin', 'slow_plugin', 'independent_plugin']
+    pm, error, events = load(PACKAGE, plugins_list)
+    try:
+        assert isinstance(error, ValueError)
+        assert str(error) == 'failing_plugin init failed'
+        # The other plugins are loaded before the error is raised
+        assert 'slow_plugin end' in events
+        assert 'failing_plugin' not in pm.plugins
+        assert 'slow_plugin' in pm.plugins
+        assert 'independent_plugin' in pm.plugins
+    finally:
+        unload(pm, plugins_list)
+
+
+def test_missing_plugin():
+    plugins_list = ['no_such_plugin', 'independent_plugin']
+    pm, error, events = load(PACKAGE, plugins_list)
+    try:
+        assert isinstance(error, ImportError)
+        assert 'independent_plugin' in pm.plugins
+    finally:
+        unload(pm, plugins_list)
+
+
+def test_singleton_parallel_creation():
+    class slow_singleton(metaclass=singleton.singleton):
+        created = 0
+
+        def __init__(self):
+            time.sleep(0.05)
+            slow_singleton.created += 1
+
+    instances = list()
+    threads = [threading.Thread(target=lambda: instances.append(slow_singleton())) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert slow_singleton.created == 1
+    assert all(instance is instances[0] for instance in instances)
+
+
+if __name__ == '__main__':
+    for name, function in list(globals().items()):
+        if name.startswith('test_'):
+            function()
+    print("OK")
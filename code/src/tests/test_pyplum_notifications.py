@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks notification delivery by pyplum.notification_worker with a dummy plugin: coalescing of notifications sent
+# while the plugin is busy, detection of a plugin stuck in notification and notification statistics.
+#
+# Run from any directory: python3 tests/test_pyplum_notifications.py
+
+import math
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyplum
+
+## @var TIMEOUT
+# Maximum time in seconds the tests wait for a worker
+TIMEOUT = 5.0
+
+
+## Plugin blocking in notification until released
+class dummy_plugin():
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def notification(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(TIMEOUT)
+        if self.fail:
+            raise ValueError("dummy failure")
+
+
+## Waits until worker delivered count notifications
+def wait_for_count(worker, count):
+    end = time.time() + TIMEOUT
+    while worker.count < count and time.time() < end:
+        time.sleep(0.01)
+    assert worker.count == count
+
+
+def test_coalescing():
+    plugin = dummy_plugin()
+    worker = pyplum.notification_worker('dummy', plugin)
+    worker.start()
+    try:
+        worker.notify()
+        assert plugin.started.wait(TIMEOUT)
+        # The plugin is busy, the first notification is pending, the others are merged with it
+        first_change = time.time() - 10.0
+        worker.notify()
+        worker.notify(first_change)
+        worker.notify()
+        worker.notify()
+        assert worker.coalesced == 3
+        plugin.release.set()
+        wait_for_count(worker, 2)
+        assert plugin.calls == 2
+        # Latency of the merged notification is counted from the earliest change
+        assert worker.latencies[-1] >= 10.0
+        assert not worker.pending.is_set()
+    finally:
+        plugin.release.set()
+        worker.stop()
+        worker.join(TIMEOUT)
+    assert not worker.is_alive()
+
+
+def test_failing_plugin():
+    plugin = dummy_plugin(fail=True)
+    plugin.release.set()
+    worker = pyplum.notification_worker('dummy', plugin)
+    worker.start()
+    try:
+        worker.notify()
+        wait_for_count(worker, 1)
+        # The worker keeps delivering notifications after an exception in the plugin
+        worker.notify()
+        wait_for_count(worker, 2)
+    finally:
+        worker.stop()
+        worker.join(TIMEOUT)
+
+
+def test_stuck_plugin():
+    pm = pyplum.pyplum()
+    plugin = dummy_plugin()
+    pm.plugins['dummy'] = plugin
+    pm.STUCK_TIME = 0.05
+    try:
+        pm.notify_plugin('dummy')
+        worker = pm.notification_workers['dummy']
+        assert plugin.started.wait(TIMEOUT)
+        pm.check_notification_workers()
+        assert not worker.stuck_reported
+        time.sleep(0.1)
+        assert worker.busy_time() > 0.05
+        pm.check_notification_workers()
+        assert worker.stuck_reported
+        plugin.release.set()
+        wait_for_count(worker, 1)
+        assert not worker.stuck_reported
+        assert worker.busy_time() == 0.0
+    finally:
+        plugin.release.set()
+        del pm.STUCK_TIME
+        del pm.plugins['dummy']
+        worker = pm.notification_workers.pop('dummy')
+        worker.stop()
+        worker.join(TIMEOUT)
+
+
+def test_notify_unknown_plugin():
+    pm = pyplum.pyplum()
+    pm.notify_plugin('missing_plugin')
+    assert 'missing_plugin' not in pm.notification_workers
+
+
+def test_stats():
+    worker = pyplum.notification_worker('dummy', dummy_plugin())
+    stats = worker.get_stats()
+    assert stats['count'] == 0
+    assert math.isnan(stats['duration_p50'])
+    assert math.isnan(stats['latency_max'])
+    # Shuffled 1..100 ms, nearest rank percentiles
+    for i in range(100):
+        worker.durations.append(((i * 37) % 100 + 1) / 1000.0)
+        worker.latencies.append(((i * 53) % 100 + 1) / 10000.0)
+    worker.max_duration = 0.1
+    worker.count = 100
+    worker.coalesced = 7
+    stats = worker.get_stats()
+    assert stats['count'] == 100
+    assert stats['coalesced'] == 7
+    assert stats['duration_p50'] == 0.05
+    assert stats['duration_p95'] == 0.095
+    assert stats['duration_max'] == 0.1
+    assert stats['latency_p50'] == 0.005
+    assert stats['latency_p95'] == 0.0095
+    assert stats['latency_max'] == 0.01
+
+
+def test_stats_sample_window():
+    worker = pyplum.notification_worker('dummy', dummy_plugin())
+    for i in range(worker.SAMPLES + 100):
+        worker.durations.append(1.0 if i < 100 else 0.001)
+    # Only the most recent SAMPLES durations are used
+    assert worker.get_stats()['duration_p95'] == 0.001
+
+
+def test_notification_stats():
+    pm = pyplum.pyplum()
+    if 'test_notification_rate' not in pm.parameters:
+        pm.register_parameter('test_notification_rate', value=0.0)
+    total = pm.get_notification_stats()['parameters'].get('test_notification_rate', dict(updates=0))['updates']
+    for i in range(1, 11):
+        pm.set_value('test_notification_rate', float(i))
+    # Equal value is not an update
+    pm.set_value('test_notification_rate', 10.0)
+    worker = pyplum.notification_worker('dummy', dummy_plugin())
+    worker.durations.append(0.2)
+    worker.max_duration = 0.2
+    pm.notification_workers['dummy'] = worker
+    try:
+        stats = pm.get_notification_stats()
+        assert stats['parameters']['test_notification_rate']['updates'] == total + 10
+        assert stats['parameters']['test_notification_rate']['rate'] > 0.0
+        assert stats['plugins']['dummy'] == worker.get_stats()
+        pm.update_notification_stats()
+        assert pm.parameters['notification_duration_max'].value >= 0.2
+    finally:
+        del pm.notification_workers['dummy']
+
+
+if __name__ == '__main__':
+    for name, function in list(globals().items()):
+        if name.startswith('test_'):
+            function()
+    print("OK")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks notifications and dict style access of pyplum.parameter.
+#
+# Run from any directory: python3 tests/test_pyplum_parameter.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyplum
+
+
+## Returns parameter and lists with names passed to on_change and on_field_change
+def make_parameter(value=1.0):
+    changes = list()
+    field_changes = list()
+    p = pyplum.parameter('cadence', on_change=changes.append, on_field_change=field_changes.append,
+                         value=value, raw_unit='RPM')
+    return p, changes, field_changes
+
+
+def test_constructor_does_not_notify():
+    p, changes, field_changes = make_parameter()
+    assert changes == []
+    assert field_changes == []
+
+
+def test_value_write_notifies_once():
+    p, changes, field_changes = make_parameter()
+    p.value = 2.0
+    assert changes == ['cadence']
+    assert field_changes == []
+    p['value'] = 3.0
+    assert changes == ['cadence', 'cadence']
+    assert p.value == 3.0
+
+
+def test_equal_value_does_not_notify():
+    p, changes, field_changes = make_parameter()
+    p.value = 1.0
+    p['value'] = 1.0
+    assert changes == []
+
+
+def test_nan_to_nan_does_not_notify():
+    p, changes, field_changes = make_parameter(float('nan'))
+    p.value = float('nan')
+    assert changes == []
+    p.value = 1.0
+    assert changes == ['cadence']
+
+
+def test_tracked_field_write_notifies():
+    p, changes, field_changes = make_parameter()
+    p.value_max = 99.0
+    p.value_min = 1.0
+    p.value_avg = 50.0
+    p.time_stamp = 1500000000.0
+    p.reset = True
+    assert field_changes == ['cadence'] * 5
+    assert changes == []
+    assert (p.value_min, p.value_avg, p.value_max, p.time_stamp, p.reset) == (1.0, 50.0, 99.0, 1500000000.0, True)
+
+
+def test_dict_access():
+    p, changes, field_changes = make_parameter()
+    p['value_max'] = 99.0
+    p['unit'] = 'RPM'
+    assert field_changes == ['cadence'] * 2
+    assert p['value_max'] == p.value_max == 99.0
+    assert p['raw_unit'] == 'RPM'
+    assert 'value_max' in p
+    assert 'name' not in p
+    assert p.get('name', 'missing') == 'missing'
+    assert list(p) == list(p.keys()) == list(pyplum.parameter.FIELDS)
+    assert dict(p.items()) == p.as_dict()
+    try:
+        p['name']
+        assert False, "KeyError expected"
+    except KeyError:
+        pass
+    try:
+        p['_value'] = 1.0
+        assert False, "KeyError expected"
+    except KeyError:
+        pass
+
+
+def test_update():
+    p, changes, field_changes = make_parameter()
+    p.update(dict(value=5.0, value_max=99.0, unit='RPM', unknown_field=True))
+    assert changes == ['cadence']
+    assert field_changes == ['cadence']
+    assert p.value == 5.0
+    assert p.value_max == 99.0
+
+
+if __name__ == '__main__':
+    for name, function in list(globals().items()):
+        if name.startswith('test_'):
+            function()
+    print("OK")
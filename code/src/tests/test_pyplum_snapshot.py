@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks pyplum.snapshot: the cached snapshot is returned while no parameter changes, only changed parameters are
+# rebuilt and writes to fields other than value, i.e. value_max written by plugins and resets of min/avg/max from the
+# display, are visible.
+#
+# Run from any directory: python3 tests/test_pyplum_snapshot.py
+
+import math
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyplum
+
+
+def get_pm():
+    pm = pyplum.pyplum()
+    if 'test_cadence' not in pm.parameters:
+        pm.register_parameter('test_cadence', value=0.0, raw_unit='RPM')
+    if 'test_speed' not in pm.parameters:
+        pm.register_parameter('test_speed', value=0.0, raw_unit='m/s')
+    return pm
+
+
+def test_cached():
+    pm = get_pm()
+    frame = pm.snapshot()
+    assert pm.snapshot() is frame
+    # Equal value doesn't change the parameter
+    pm.set_value('test_cadence', frame['test_cadence']['value'])
+    assert pm.snapshot() is frame
+
+
+def test_value_change():
+    pm = get_pm()
+    pm.set_value('test_cadence', 80.0)
+    frame = pm.snapshot()
+    pm.set_value('test_cadence', 90.0)
+    new_frame = pm.snapshot()
+    assert new_frame is not frame
+    assert new_frame['test_cadence']['value'] == 90.0
+    # The previous snapshot is not modified
+    assert frame['test_cadence']['value'] == 80.0
+    # Dicts of parameters that didn't change are shared
+    assert new_frame['test_speed'] is frame['test_speed']
+    assert new_frame['test_cadence'] is not frame['test_cadence']
+    assert new_frame.keys() == frame.keys()
+
+
+def test_register():
+    pm = get_pm()
+    frame = pm.snapshot()
+    name = 'test_registered_{}'.format(len(pm.parameters))
+    pm.register_parameter(name, value=1.0)
+    new_frame = pm.snapshot()
+    assert new_frame[name]['value'] == 1.0
+    assert name not in frame
+    assert new_frame['test_speed'] == frame['test_speed']
+
+
+def test_unregistered_notification():
+    pm = get_pm()
+    pm.force_notification('test_not_registered')
+    assert 'test_not_registered' not in pm.snapshot()
+
+
+def test_concurrent_writes():
+    pm = get_pm()
+    names = ('test_cadence', 'test_speed')
+
+    def write(name):
+        for i in range(2000):
+            pm.set_value(name, float(i))
+            pm.parameters[name]['value_max'] = float(i)
+    threads = [threading.Thread(target=write, args=(name,)) for name in names]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        frame = pm.snapshot()
+        for name in names:
+            assert frame[name]['value_max'] <= 1999.0
+    for t in threads:
+        t.join()
+    frame = pm.snapshot()
+    for name in names:
+        assert frame[name]['value'] == 1999.0
+        assert frame[name]['value_max'] == 1999.0
+
+
+def test_field_write():
+    pm = get_pm()
+    pm.snapshot()
+    pm.parameters['test_cadence'].value_max = 99.0
+    assert pm.snapshot()['test_cadence']['value_max'] == 99.0
+    pm.parameters['test_cadence'].value_min = 12.0
+    pm.parameters['test_cadence'].value_avg = 55.0
+    frame = pm.snapshot()
+    assert frame['test_cadence']['value_min'] == 12.0
+    assert frame['test_cadence']['value_avg'] == 55.0
+
+
+def test_parameter_reset():
+    pm = get_pm()
+    pm.parameters['test_cadence'].value_max = 99.0
+    pm.parameters['test_cadence'].value_avg = 55.0
+    assert pm.snapshot()['test_cadence']['value_max'] == 99.0
+    pm.parameter_reset('test_cadence', ['max', 'avg'])
+    frame = pm.snapshot()
+    assert frame['test_cadence']['value_max'] == float('-inf')
+    assert math.isnan(frame['test_cadence']['value_avg'])
+    assert frame['test_cadence']['reset']
+
+
+if __name__ == '__main__':
+    for name, function in list(globals().items()):
+        if name.startswith('test_'):
+            function()
+    print("OK")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks that batch conversion gives the same results as converting values one by one: unit_converter.convert_column
+# and convert_array against unit_converter.convert, num.to_array against num.to_float and num.sanitise_array against
+# num.sanitise. Values include not-a-number, infinity, None and markers of missing values ('-', '').
+# Requires numpy.
+#
+# Run from any directory: python3 tests/test_unit_conversion_array.py
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from helpers import num
+import helpers
+
+## @var NUMBERS
+# Numbers, including values that are not finite
+NUMBERS = [0.0, -0.0, 1.0, -1.0, 12.5, 101325.0, 1e-9, 1e12, float('nan'), float('inf'), float('-inf')]
+## @var LOG_VALUES
+# Column values as read from a ride log: strings with numbers, markers of missing values, numbers and None
+LOG_VALUES = ['25.3    ', '-', '  -0.0', '', ' ', '1e3', 'nan', 'inf', '-inf', None, 7, 2.5, float('nan')]
+## @var UNITS
+# Pairs of units: convertible ones, the same units, units that can't be converted and a missing unit
+UNITS = list(helpers.unit_converter().transforms) + [("m", "m"), ("m", "kg"), (None, "m")]
+
+
+## Returns True if values are equal, both are not-a-number or both are zeros with the same sign
+def same(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        if math.isnan(a) or math.isnan(b):
+            return math.isnan(a) and math.isnan(b)
+        return a == b and math.copysign(1.0, a) == math.copysign(1.0, b)
+    return type(a) is type(b) and a == b
+
+
+## Scalar reference: value converted with convert, None means not-a-number in an array
+def convert_value(uc, value, source_unit, target_unit):
+    result = uc.convert(value, source_unit, target_unit)
+    if result is None:
+        return num.NAN
+    return result
+
+
+def test_to_array():
+    values = num.to_array(LOG_VALUES)
+    assert values.dtype == float
+    assert len(values) == len(LOG_VALUES)
+    for value, result in zip(LOG_VALUES, values):
+        assert same(float(result), num.to_float(value)), (value, result)
+    # Numbers only
+    values = num.to_array(NUMBERS)
+    for value, result in zip(NUMBERS, values):
+        assert same(float(result), value)
+
+
+def test_to_array_not_a_number():
+    for values in (['1.0', 'abc'], [1.0, 'x']):
+        try:
+            num.to_array(values)
+            assert False, "ValueError expected"
+        except ValueError:
+            pass
+
+
+def test_convert_column():
+    uc = helpers.unit_converter()
+    for source_unit, target_unit in UNITS:
+        converted = uc.convert_column(NUMBERS, source_unit, target_unit)
+        assert len(converted) == len(NUMBERS)
+        for value, result in zip(NUMBERS, converted):
+            expected = convert_value(uc, value, source_unit, target_unit)
+            assert same(float(result), float(expected)), (value, source_unit, target_unit, result, expected)
+
+
+def test_convert_column_none():
+    uc = helpers.unit_converter()
+    for source_unit, target_unit in UNITS:
+        converted = uc.convert_column([None, 1.0], source_unit, target_unit)
+        # Scalar convert returns None, the array has not-a-number
+        assert uc.convert(None, source_unit, target_unit) is None
+        assert math.isnan(converted[0])
+        assert same(float(converted[1]), float(convert_value(uc, 1.0, source_unit, target_unit)))
+
+
+def test_convert_array():
+    uc = helpers.unit_converter()
+    for source_unit, target_unit in UNITS:
+        converted = uc.convert_array(LOG_VALUES, source_unit, target_unit)
+        for value, result in zip(LOG_VALUES, converted):
+            expected = convert_value(uc, num.to_float(value), source_unit, target_unit)
+            assert same(float(result), float(expected)), (value, source_unit, target_unit, result, expected)
+
+
+def test_sanitise_array():
+    sanitised = num.sanitise_array(NUMBERS)
+    assert len(sanitised) == len(NUMBERS)
+    for value, result in zip(NUMBERS, sanitised):
+        assert same(result, num.sanitise(value)), (value, result)
+
+
+def test_ride_log_column():
+    # Batch conversion of a ride log column gives the same strings as converting and sanitising value by value
+    uc = helpers.unit_converter()
+    for source_unit, target_unit in (("km/h", "mi/h"), ("C", "F"), ("m/m", "%"), ("m", "kg")):
+        batch = num.sanitise_array(uc.convert_array(LOG_VALUES, source_unit, target_unit))
+        values = [num.sanitise(convert_value(uc, num.to_float(v), source_unit, target_unit)) for v in LOG_VALUES]
+        assert len(batch) == len(values)
+        for result, expected in zip(batch, values):
+            assert same(result, expected), (source_unit, target_unit, result, expected)
+
+
+if __name__ == '__main__':
+    for name, function in list(globals().items()):
+        if name.startswith('test_'):
+            function()
+    print("OK")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Checks all pairs of units of helpers.unit_converter against known equivalent values, i.e. 1 mi = 5280 ft or
+# 100 C = 212 F, and that units from different groups are not converted.
+#
+# Run from any directory: python3 tests/test_unit_converter.py
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import helpers
+
+## @var EQUIVALENTS
+# List of dicts with units as keys and values equal to each other, conversions between all units of a dict are checked
+EQUIVALENTS = [
+    {"m": 1609.344, "km": 1.609344, "mi": 1.0, "yd": 1760.0, "ft": 5280.0, "in": 63360.0, "cm": 160934.4,
+     "mm": 1609344.0},
+    {"m": 0.3048, "km": 0.0003048, "mi": 1 / 5280, "yd": 1 / 3, "ft": 1.0, "in": 12.0, "cm": 30.48, "mm": 304.8},
+    {"m/s": 10.0, "km/h": 36.0, "mi/h": 22.369362920544},
+    {"m/s": 0.44704, "km/h": 1.609344, "mi/h": 1.0},
+    {"kg": 6.35029318, "st": 1.0, "lb": 14.0},
+    {"kg": 1.0, "st": 0.15747304, "lb": 2.20462262},
+    {"Pa": 101325.0, "hPa": 1013.25, "kPa": 101.325, "mmHg": 760.0, "inHg": 29.9212524},
+    {"C": 100.0, "F": 212.0},
+    {"C": 0.0, "F": 32.0},
+    {"C": -40.0, "F": -40.0},
+    {"C": 37.0, "F": 98.6},
+    {"m/m": 0.013, "%": 1.3},
+    {"m/m": -0.1, "%": -10.0},
+    {"m/m": 0.0, "%": 0.0},
+]
+## @var REL_TOL
+# Relative tolerance, factors in the table are rounded, i.e. km/h and mmHg
+REL_TOL = 1e-5
+
+
+def test_all_pairs():
+    uc = helpers.unit_converter()
+    checked = set()
+    for values in EQUIVALENTS:
+        for source_unit, value in values.items():
+            for target_unit, expected in values.items():
+                result = uc.convert(value, source_unit, target_unit)
+                assert math.isclose(result, expected, rel_tol=REL_TOL, abs_tol=1e-12), \
+                    (value, source_unit, target_unit, result, expected)
+                checked.add((source_unit, target_unit))
+    # Every pair in the table is checked
+    assert set(uc.transforms) <= checked
+
+
+def test_identity():
+    uc = helpers.unit_converter()
+    for source_unit, target_unit in uc.transforms:
+        value = uc.convert(12.5, source_unit, source_unit)
+        assert value == 12.5
+
+
+def test_not_convertible():
+    uc = helpers.unit_converter()
+    assert uc.convert(1.0, "m", "kg") is None
+    assert uc.convert(1.0, "C", "%") is None
+    assert uc.convert(1.0, None, "m") is None
+    assert uc.convert(1.0, "m", None) is None
+    assert uc.convert(1.0, "unknown", "m") is None
+
+
+def test_missing_values():
+    uc = helpers.unit_converter()
+    assert uc.convert(None, "m", "km") is None
+    assert uc.convert(None, "C", "F") is None
+    assert math.isnan(uc.convert(float('nan'), "m", "km"))
+    assert math.isnan(uc.convert(float('nan'), "F", "C"))
+    assert uc.convert(float('inf'), "m/s", "km/h") == float('inf')
+
+
+def test_conversion_cached():
+    uc = helpers.unit_converter()
+    assert uc.get_conversion("m", "km") is uc.get_conversion("m", "km")
+    assert uc.get_converter("C", "F")(100.0) == 212.0
+
+
+if __name__ == '__main__':
+    for name, function in list(globals().items()):
+        if name.startswith('test_'):
+            function()
+    print("OK")